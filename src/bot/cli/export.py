@@ -0,0 +1,74 @@
+"""Export operations or channel statistics to gzip CSV / Parquet.
+
+Usage: pnlbot-export operations [-f csv|parquet] [--from 2024-01-01] [--to 2024-12-31]
+                                [--channel ID] [-o operations.csv.gz]
+Datasets: operations, post_snapshots, channel_daily_snapshots, channel_daily_churn.
+The database comes from --database-url, DATABASE_URL or the bot's DB_* settings.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from datetime import date
+
+from bot.db.base import init_engine
+from bot.services.exporter import (
+    DATASET_ALIASES,
+    EXPORT_FORMATS,
+    FILE_SUFFIXES,
+    FORMAT_CSV,
+    ExportError,
+    export_dataset,
+)
+from bot.services.history import HistoryFilter
+
+
+def _database_url(explicit: str | None) -> str:
+    if explicit:
+        return explicit
+    try:
+        from dotenv import load_dotenv  # type: ignore
+
+        load_dotenv()
+    except Exception:
+        pass
+    url = os.environ.get("DATABASE_URL", "").strip()
+    if url:
+        return url
+    from bot.settings import Settings
+
+    return Settings.load().database_url
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dataset", choices=sorted(DATASET_ALIASES), help="what to export")
+    parser.add_argument("-f", "--format", default=FORMAT_CSV, choices=EXPORT_FORMATS)
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="first day, YYYY-MM-DD (MSK)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="last day, YYYY-MM-DD (MSK)")
+    parser.add_argument("--channel", type=int, help="channel id (finance.channels.id)")
+    parser.add_argument("-o", "--output", help="output file, '-' for stdout (default: <dataset><suffix>)")
+    parser.add_argument("--database-url", help="SQLAlchemy URL, e.g. postgresql+psycopg://...")
+    args = parser.parse_args(argv)
+
+    init_engine(_database_url(args.database_url))
+    flt = HistoryFilter(channel_id=args.channel, date_from=args.date_from, date_to=args.date_to)
+    output = args.output or DATASET_ALIASES[args.dataset] + FILE_SUFFIXES[args.format]
+    try:
+        if output == "-":
+            rows = export_dataset(args.dataset, sys.stdout.buffer, args.format, flt)
+        else:
+            with open(output, "wb") as out:
+                rows = export_dataset(args.dataset, out, args.format, flt)
+    except ExportError as e:
+        if output != "-":
+            os.unlink(output)
+        print(str(e), file=sys.stderr)
+        return 2
+    print(f"{rows} rows -> {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
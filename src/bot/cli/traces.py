@@ -0,0 +1,152 @@
+"""Print the slowest traces from a span file written by ``bot.services.tracing``.
+
+Usage: pnlbot-traces traces.jsonl [--top 5] [--name update] [--min-ms 100]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+
+@dataclass
+class SpanRecord:
+    trace_id: str
+    span_id: str
+    parent_id: str
+    name: str
+    start_ns: int
+    end_ns: int
+    error: str | None = None
+    children: list["SpanRecord"] = field(default_factory=list)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def self_ms(self) -> float:
+        # Duration not covered by any child (children may overlap)
+        covered = 0
+        cursor = self.start_ns
+        for child in sorted(self.children, key=lambda c: c.start_ns):
+            start = max(child.start_ns, cursor)
+            end = min(child.end_ns, self.end_ns)
+            if end > start:
+                covered += end - start
+                cursor = end
+        return max(0, (self.end_ns - self.start_ns) - covered) / 1e6
+
+
+def _parse_record(raw: dict) -> SpanRecord:
+    status = raw.get("status") or {}
+    return SpanRecord(
+        trace_id=raw["traceId"],
+        span_id=raw["spanId"],
+        parent_id=raw.get("parentSpanId") or "",
+        name=raw.get("name", "?"),
+        start_ns=int(raw["startTimeUnixNano"]),
+        end_ns=int(raw["endTimeUnixNano"]),
+        error=status.get("message") if status.get("code") == "STATUS_CODE_ERROR" else None,
+    )
+
+
+def read_spans(paths: Iterable[str]) -> Iterator[SpanRecord]:
+    """Read flat JSON lines and OTLP/JSON envelopes alike."""
+    for path in paths:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    raw = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "resourceSpans" in raw:
+                    for rs in raw["resourceSpans"]:
+                        for ss in rs.get("scopeSpans", []):
+                            for sp in ss.get("spans", []):
+                                yield _parse_record(sp)
+                else:
+                    yield _parse_record(raw)
+
+
+def build_traces(spans: Iterable[SpanRecord]) -> list[SpanRecord]:
+    """Link spans into trees and return the root span of every trace."""
+    by_trace: dict[str, dict[str, SpanRecord]] = defaultdict(dict)
+    for s in spans:
+        by_trace[s.trace_id][s.span_id] = s
+    roots: list[SpanRecord] = []
+    for trace in by_trace.values():
+        for s in trace.values():
+            parent = trace.get(s.parent_id) if s.parent_id else None
+            if parent is not None:
+                parent.children.append(s)
+            else:
+                roots.append(s)
+    return roots
+
+
+def critical_path(root: SpanRecord) -> list[tuple[int, SpanRecord]]:
+    """Spans that determined the end time of ``root``, as (depth, span) in start order.
+
+    Walk backwards from the end of the span: take the child that finished last, then the
+    latest child that finished before it started, and so on; recurse into each.
+    """
+    result: list[tuple[int, SpanRecord]] = []
+
+    def _walk(s: SpanRecord, depth: int) -> None:
+        result.append((depth, s))
+        chain: list[SpanRecord] = []
+        cursor = s.end_ns
+        for child in sorted(s.children, key=lambda c: c.end_ns, reverse=True):
+            if child.end_ns <= cursor:
+                chain.append(child)
+                cursor = child.start_ns
+        for child in reversed(chain):
+            _walk(child, depth + 1)
+
+    _walk(root, 0)
+    return result
+
+
+def _count(s: SpanRecord) -> tuple[int, int]:
+    total, errors = 1, 1 if s.error else 0
+    for c in s.children:
+        t, e = _count(c)
+        total += t
+        errors += e
+    return total, errors
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="span files (TRACE_FILE)")
+    parser.add_argument("--top", type=int, default=5, help="number of traces to show")
+    parser.add_argument("--name", default="", help="only roots whose name contains this text")
+    parser.add_argument("--min-ms", type=float, default=0.0, help="hide critical-path spans shorter than this")
+    args = parser.parse_args(argv)
+
+    roots = [r for r in build_traces(read_spans(args.files)) if args.name in r.name]
+    roots.sort(key=lambda r: r.duration_ms, reverse=True)
+    if not roots:
+        print("no traces found")
+        return 1
+    for root in roots[: args.top]:
+        total, errors = _count(root)
+        print(f"trace {root.trace_id} {root.name} {root.duration_ms:.1f}ms spans={total} errors={errors}")
+        for depth, s in critical_path(root):
+            if depth and s.duration_ms < args.min_ms:
+                continue
+            err = f"  ERROR {s.error}" if s.error else ""
+            print(f"  {'  ' * depth}{s.duration_ms:9.1f}ms self={s.self_ms:8.1f}ms  {s.name}{err}")
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
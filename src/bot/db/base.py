@@ -1,23 +1,64 @@
 from __future__ import annotations
 
 import logging
+import time
 from contextlib import contextmanager
+from contextvars import ContextVar
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
 
+from bot.db.instrumentation import install_query_hooks
+from bot.services.tracing import span
+
 logger = logging.getLogger()
 
 _engine: Engine | None = None
 _SessionLocal: sessionmaker[Session] | None = None
 
-
-def init_engine(database_url: str) -> None:
-    global _engine, _SessionLocal
+# Optional read replica for reporting queries
+_ro_engine: Engine | None = None
+_ReadSessionLocal: sessionmaker[Session] | None = None
+_replica_max_lag_seconds: float = 30.0
+_replica_fresh: bool = False
+_replica_checked_at: float | None = None
+_REPLICA_CHECK_INTERVAL_SECONDS = 5.0
+
+# 0 on a primary or a fully caught-up standby, otherwise seconds since the last replayed commit
+_REPLICA_LAG_SQL = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+
+
+def init_engine(
+    database_url: str,
+    slow_query_ms: float = 0.0,
+    read_only_url: str | None = None,
+    replica_max_lag_seconds: float = 30.0,
+) -> None:
+    global _engine, _SessionLocal, _ro_engine, _ReadSessionLocal, _replica_max_lag_seconds
+    global _replica_fresh, _replica_checked_at
     _engine = create_engine(database_url, pool_pre_ping=True, future=True)
+    install_query_hooks(_engine, slow_query_ms=slow_query_ms)
     _SessionLocal = sessionmaker(bind=_engine, autoflush=False, autocommit=False, future=True)
 
+    _ro_engine = None
+    _ReadSessionLocal = None
+    _replica_fresh = False
+    _replica_checked_at = None
+    _replica_max_lag_seconds = replica_max_lag_seconds
+    if read_only_url:
+        _ro_engine = create_engine(read_only_url, pool_pre_ping=True, future=True)
+        install_query_hooks(_ro_engine, slow_query_ms=slow_query_ms)
+        _ReadSessionLocal = sessionmaker(bind=_ro_engine, autoflush=False, autocommit=False, future=True)
+
 
 def get_engine() -> Engine:
     if _engine is None:
@@ -31,13 +72,60 @@ def get_sessionmaker() -> sessionmaker[Session]:
     return _SessionLocal
 
 
+def _replica_is_fresh() -> bool:
+    """Check replica lag against the staleness budget (cached for a few seconds)."""
+    global _replica_fresh, _replica_checked_at
+    if _ro_engine is None:
+        return False
+    now = time.monotonic()
+    if _replica_checked_at is not None and now - _replica_checked_at < _REPLICA_CHECK_INTERVAL_SECONDS:
+        return _replica_fresh
+    _replica_checked_at = now
+    try:
+        with _ro_engine.connect() as conn:
+            lag = conn.execute(_REPLICA_LAG_SQL).scalar()
+        fresh = lag is not None and float(lag) <= _replica_max_lag_seconds
+        if not fresh:
+            logger.warning(
+                "Read replica lag %ss exceeds budget %ss, routing reads to primary",
+                lag,
+                _replica_max_lag_seconds,
+            )
+    except Exception:
+        logger.exception("Failed to check read replica lag, routing reads to primary")
+        fresh = False
+    _replica_fresh = fresh
+    return fresh
+
+
+def get_read_sessionmaker() -> sessionmaker[Session]:
+    """Route read-only work to the replica when configured and fresh, else to the primary."""
+    if _ReadSessionLocal is not None and _replica_is_fresh():
+        return _ReadSessionLocal
+    return get_sessionmaker()
+
+
+@contextmanager
+def read_session_scope() -> Session:
+    """Session for read-only report/service queries. Never commits."""
+    sm = get_read_sessionmaker()
+    session = sm()
+    try:
+        with span("db.read_session"):
+            yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
 @contextmanager
 def session_scope() -> Session:
     sm = get_sessionmaker()
     session = sm()
     try:
-        yield session
-        session.commit()
+        with span("db.session"):
+            yield session
+            session.commit()
     except Exception:
         session.rollback()
         raise
@@ -45,6 +133,97 @@ def session_scope() -> Session:
         session.close()
 
 
+# Set once the session's current transaction has written anything (flush or DML)
+_HAS_WRITES = "has_writes"
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session: Session, flush_context) -> None:  # type: ignore[no-untyped-def]
+    session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml(state) -> None:  # type: ignore[no-untyped-def]
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_writes(session: Session, transaction) -> None:  # type: ignore[no-untyped-def]
+    # Only the outermost transaction: releasing a savepoint (begin_nested) also counts as
+    # a "commit", but its writes stay pending until the whole transaction ends
+    if transaction.parent is None:
+        session.info.pop(_HAS_WRITES, None)
+
+
+class UnitOfWork:
+    """One session per update, opened lazily on first use.
+
+    The owner (``DbSessionMiddleware``) commits or rolls back once at the end.
+    """
+
+    def __init__(self) -> None:
+        self._session: Session | None = None
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            # Objects stay usable after an intermediate commit within the same update
+            self._session = get_sessionmaker()(expire_on_commit=False)
+        return self._session
+
+    @property
+    def is_open(self) -> bool:
+        return self._session is not None
+
+    def commit(self) -> None:
+        if self._session is not None:
+            self._session.commit()
+
+    @property
+    def has_writes(self) -> bool:
+        s = self._session
+        return s is not None and bool(s.info.get(_HAS_WRITES) or s.new or s.dirty or s.deleted)
+
+    def release(self) -> bool:
+        """Return the connection to the pool before network I/O, if that is safe.
+
+        Only a read-only transaction is ended (committing it changes nothing). With writes
+        pending the transaction is kept, so the update still commits or rolls back as a
+        whole, and False is returned.
+        """
+        if self._session is None or not self._session.in_transaction():
+            return True
+        if self.has_writes:
+            return False
+        self._session.commit()
+        return True
+
+    def rollback(self) -> None:
+        if self._session is not None:
+            self._session.rollback()
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+_current_uow: ContextVar[UnitOfWork | None] = ContextVar("current_uow", default=None)
+
+
+def current_unit_of_work() -> UnitOfWork | None:
+    return _current_uow.get()
+
+
+def set_current_unit_of_work(uow: UnitOfWork | None):  # type: ignore[no-untyped-def]
+    return _current_uow.set(uow)
+
+
+def reset_current_unit_of_work(token) -> None:  # type: ignore[no-untyped-def]
+    _current_uow.reset(token)
+
+
 def ensure_schema(schema: str = "finance") -> None:
     eng = get_engine()
     with eng.connect() as conn:
@@ -56,6 +235,12 @@ __all__ = [
     "init_engine",
     "get_engine",
     "get_sessionmaker",
+    "get_read_sessionmaker",
     "session_scope",
+    "read_session_scope",
+    "UnitOfWork",
+    "current_unit_of_work",
+    "set_current_unit_of_work",
+    "reset_current_unit_of_work",
     "ensure_schema",
 ]
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from bot.db.base import session_scope
+from bot.db.models import FsmState
+
+logger = logging.getLogger()
+
+
+@dataclass
+class _Entry:
+    state: str | None = None
+    data: dict[str, Any] = field(default_factory=dict)
+    dirty: bool = False
+    # Being written by flush(); the row in the table is older than this entry until then
+    flushing: bool = False
+    touched_at: float = 0.0
+
+    @property
+    def pinned(self) -> bool:
+        return self.dirty or self.flushing
+
+
+class PostgresStorage(BaseStorage):
+    """FSM storage persisted in ``finance.fsm_states`` with an in-process write-back cache.
+
+    - Reads are served from the cache; a miss loads the row once.
+    - Writes only mark the entry dirty; dirty entries are flushed together after
+      ``flush_delay`` seconds, so the ``set_state`` + several ``update_data`` calls of one
+      step become a single UPSERT.
+    - Rows expire ``ttl`` after the last write and are deleted in bulk by a cleanup loop.
+
+    With ``cache_seconds=0`` (``FSM_CACHE_SECONDS``, the default for webhook mode) every update
+    re-reads its row and the storage is write-through: ``FsmFlushMiddleware`` flushes before
+    the update finishes, so another replica sees the new state once the previous update of
+    that user is done. Updates of one user handled by two replicas at the same time are
+    still not serialized.
+    """
+
+    def __init__(
+        self,
+        ttl: timedelta = timedelta(hours=72),
+        flush_delay: float = 0.5,
+        cache_seconds: float = 600.0,
+        cleanup_interval: float = 3600.0,
+        key_builder: KeyBuilder | None = None,
+    ) -> None:
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self.cache_seconds = cache_seconds
+        self.cleanup_interval = cleanup_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache: dict[str, _Entry] = {}
+        self._flush_task: asyncio.Task | None = None
+        self._cleanup_task: asyncio.Task | None = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def write_through(self) -> bool:
+        """No local cache: writes must reach the table before the update ends."""
+        return self.cache_seconds <= 0
+
+    # --- BaseStorage API ------------------------------------------------------------------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(entry)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._entry(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry.data = copy.deepcopy(dict(data))
+        self._mark_dirty(entry)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return copy.deepcopy((await self._entry(key)).data)
+
+    async def close(self) -> None:
+        for task in (self._flush_task, self._cleanup_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._flush_task = None
+        self._cleanup_task = None
+        await self.flush()
+
+    # --- Cache ----------------------------------------------------------------------------
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        storage_key = self.key_builder.build(key)
+        now = time.monotonic()
+        entry = self._cache.get(storage_key)
+        if entry is not None and (entry.pinned or now - entry.touched_at < self.cache_seconds):
+            entry.touched_at = now
+            return entry
+        state, data = await asyncio.to_thread(self._load, storage_key)
+        entry = self._cache.get(storage_key)
+        if entry is not None and entry.pinned:
+            # Written locally while we were loading
+            return entry
+        entry = _Entry(state=state, data=data, touched_at=now)
+        self._cache[storage_key] = entry
+        self._evict(now)
+        return entry
+
+    def _evict(self, now: float) -> None:
+        if len(self._cache) < 1024:
+            return
+        stale = [k for k, e in self._cache.items() if not e.pinned and now - e.touched_at >= self.cache_seconds]
+        for k in stale:
+            del self._cache[k]
+
+    def _mark_dirty(self, entry: _Entry) -> None:
+        entry.dirty = True
+        entry.touched_at = time.monotonic()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+        if self._cleanup_task is None and self.cleanup_interval > 0:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("FSM storage flush failed")
+            # Keep entries dirty and retry later
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def flush(self) -> int:
+        """Write all dirty entries in one transaction; return the number of keys written."""
+        async with self._flush_lock:
+            dirty = {k: e for k, e in self._cache.items() if e.dirty}
+            if not dirty:
+                return 0
+            batch = {k: (e.state, copy.deepcopy(e.data)) for k, e in dirty.items()}
+            # Clear before the write so changes made meanwhile schedule another flush; keep
+            # the entries pinned until the write lands, or a read would reload the old row
+            for e in dirty.values():
+                e.dirty = False
+                e.flushing = True
+            try:
+                await asyncio.to_thread(self._store, batch)
+            except Exception:
+                for k, e in dirty.items():
+                    if self._cache.get(k) is e:
+                        e.dirty = True
+                raise
+            finally:
+                for e in dirty.values():
+                    e.flushing = False
+            return len(batch)
+
+    # --- DB (runs in a worker thread) -----------------------------------------------------
+
+    def _load(self, storage_key: str) -> tuple[str | None, dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        with session_scope() as s:
+            row = s.execute(
+                select(FsmState.state, FsmState.data).where(
+                    FsmState.key == storage_key, FsmState.expires_at > now
+                )
+            ).one_or_none()
+        if row is None:
+            return None, {}
+        return row.state, dict(row.data or {})
+
+    def _store(self, batch: dict[str, tuple[str | None, dict[str, Any]]]) -> None:
+        now = datetime.now(timezone.utc)
+        expires_at = now + self.ttl
+        empty = [k for k, (state, data) in batch.items() if state is None and not data]
+        rows = [
+            {"key": k, "state": state, "data": data, "updated_at": now, "expires_at": expires_at}
+            for k, (state, data) in batch.items()
+            if state is not None or data
+        ]
+        with session_scope() as s:
+            if empty:
+                s.execute(delete(FsmState).where(FsmState.key.in_(empty)))
+            if rows:
+                stmt = pg_insert(FsmState)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[FsmState.key],
+                    set_={
+                        "state": stmt.excluded.state,
+                        "data": stmt.excluded.data,
+                        "updated_at": stmt.excluded.updated_at,
+                        "expires_at": stmt.excluded.expires_at,
+                    },
+                )
+                s.execute(stmt, rows)
+
+    def delete_expired(self) -> int:
+        with session_scope() as s:
+            result = s.execute(delete(FsmState).where(FsmState.expires_at <= datetime.now(timezone.utc)))
+            return int(result.rowcount or 0)
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            try:
+                deleted = await asyncio.to_thread(self.delete_expired)
+                if deleted:
+                    logger.info("FSM storage: deleted %s expired states", deleted)
+            except Exception:
+                logger.exception("FSM storage cleanup failed")
+            await asyncio.sleep(self.cleanup_interval)
+
+
+__all__ = ["PostgresStorage"]
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import asyncio
+import collections.abc
+import logging
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from bot.services.metrics import DB_QUERY_SECONDS, query_kind
+from bot.services.tracing import end_span, start_span, tracing_enabled
+
+logger = logging.getLogger()
+
+# Tag of the unit of work currently running (e.g. "update:123" or "job:daily_collect")
+_query_tag: ContextVar[str | None] = ContextVar("db_query_tag", default=None)
+_query_stats: ContextVar["QueryStats | None"] = ContextVar("db_query_stats", default=None)
+# Name of the handler processing the current update (for diagnostics)
+_current_handler: ContextVar[str | None] = ContextVar("db_current_handler", default=None)
+
+# Pool connections currently checked out, per asyncio task
+_held_connections: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+
+
+@dataclass
+class QueryStats:
+    tag: str
+    count: int = 0
+    total_ms: float = 0.0
+    checkouts: int = 0
+
+
+@contextmanager
+def track_queries(tag: str) -> Iterator[QueryStats]:
+    """Aggregate query count/time for everything executed inside the block under ``tag``."""
+    stats = QueryStats(tag=tag)
+    tag_token = _query_tag.set(tag)
+    stats_token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(stats_token)
+        _query_tag.reset(tag_token)
+
+
+def current_query_tag() -> str | None:
+    return _query_tag.get()
+
+
+def current_query_stats() -> QueryStats | None:
+    return _query_stats.get()
+
+
+def set_current_handler(name: str | None):  # type: ignore[no-untyped-def]
+    return _current_handler.set(name)
+
+
+def reset_current_handler(token) -> None:  # type: ignore[no-untyped-def]
+    _current_handler.reset(token)
+
+
+def current_handler() -> str | None:
+    return _current_handler.get()
+
+
+def _current_task() -> asyncio.Task | None:
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+def held_connections(task: asyncio.Task | None = None) -> int:
+    """Number of pool connections checked out by ``task`` (current task by default)."""
+    task = task or _current_task()
+    if task is None:
+        return 0
+    return _held_connections.get(task, 0)
+
+
+def _sql_label() -> str | None:
+    # Handler or job name only: a per-update id would make every statement text unique
+    # and defeat statement-level stats (pg_stat_statements) and prepared statement caching
+    handler = _current_handler.get()
+    if handler:
+        return handler
+    tag = _query_tag.get()
+    if tag and tag.startswith("update:"):
+        return "update"
+    return tag
+
+
+def _sql_comment(label: str) -> str:
+    # Keep the comment safe to append to any statement
+    return " /* " + label.replace("*/", "").replace("/*", "") + " */"
+
+
+def install_query_hooks(engine: Engine, slow_query_ms: float = 0.0) -> None:
+    """Register cursor and pool event hooks on ``engine``.
+
+    - Every statement is tagged with the current handler / job name as a SQL comment,
+      so it is visible in ``pg_stat_activity`` and in slow query logs on the server side
+    - Statements slower than ``slow_query_ms`` are logged with their bound parameters
+    - Query count/time and connection checkouts are aggregated into the active ``QueryStats``
+    """
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+        if tracing_enabled():
+            conn.info.setdefault("query_spans", []).append(
+                start_span("db.query", kind=query_kind(statement), statement=" ".join(statement.split())[:300])
+            )
+        label = _sql_label()
+        if label:
+            statement = statement + _sql_comment(label)
+        return statement, parameters
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        starts = conn.info.get("query_start_time")
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000.0
+        spans = conn.info.get("query_spans")
+        if spans:
+            end_span(spans.pop())
+        DB_QUERY_SECONDS.observe(elapsed_ms / 1000.0, kind=query_kind(statement))
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+        if slow_query_ms > 0 and elapsed_ms >= slow_query_ms:
+            logger.warning(
+                "slow query %.1fms tag=%s executemany=%s statement=%s params=%r",
+                elapsed_ms,
+                _query_tag.get(),
+                executemany,
+                " ".join(statement.split()),
+                parameters,
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):  # type: ignore[no-untyped-def]
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+        if conn is not None and conn.info.get("query_spans"):
+            end_span(conn.info["query_spans"].pop(), exception_context.original_exception)
+
+    @event.listens_for(engine.pool, "checkout")
+    def _on_checkout(dbapi_conn, conn_record, conn_proxy):  # type: ignore[no-untyped-def]
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.checkouts += 1
+        task = _current_task()
+        if task is not None:
+            conn_record.info["checked_out_by"] = task
+            _held_connections[task] = _held_connections.get(task, 0) + 1
+
+    @event.listens_for(engine.pool, "checkin")
+    def _on_checkin(dbapi_conn, conn_record):  # type: ignore[no-untyped-def]
+        task = conn_record.info.pop("checked_out_by", None) if conn_record is not None else None
+        if task is None:
+            return
+        remaining = _held_connections.get(task, 0) - 1
+        if remaining > 0:
+            _held_connections[task] = remaining
+        else:
+            _held_connections.pop(task, None)
+
+
+class _SuspendWatch(collections.abc.Coroutine):
+    """Coroutine proxy that checks for held DB connections every time the task suspends."""
+
+    __slots__ = ("_coro", "_reported")
+
+    def __init__(self, coro: collections.abc.Coroutine) -> None:
+        self._coro = coro
+        self._reported = False
+
+    def _check(self) -> None:
+        if self._reported:
+            return
+        held = held_connections()
+        if held:
+            self._reported = True
+            logger.warning(
+                "DB connection held across await: handler=%s tag=%s connections=%s coro=%s",
+                _current_handler.get(),
+                _query_tag.get(),
+                held,
+                getattr(self._coro, "__qualname__", repr(self._coro)),
+            )
+
+    def send(self, value: Any) -> Any:
+        result = self._coro.send(value)
+        self._check()
+        return result
+
+    def throw(self, *args: Any) -> Any:
+        result = self._coro.throw(*args)
+        self._check()
+        return result
+
+    def close(self) -> None:
+        self._coro.close()
+
+    def __await__(self):  # type: ignore[no-untyped-def]
+        return self
+
+    def __iter__(self):  # type: ignore[no-untyped-def]
+        return self
+
+    def __next__(self) -> Any:
+        return self.send(None)
+
+
+def install_await_detector(loop: asyncio.AbstractEventLoop) -> None:
+    """Debug aid: warn when a task suspends while holding a pooled DB connection.
+
+    Applies to tasks created after the call (aiogram creates one task per update).
+    """
+    previous_factory = loop.get_task_factory()
+
+    def _factory(loop_: asyncio.AbstractEventLoop, coro, **kwargs):  # type: ignore[no-untyped-def]
+        watched = _SuspendWatch(coro)
+        if previous_factory is not None:
+            return previous_factory(loop_, watched, **kwargs)
+        return asyncio.Task(watched, loop=loop_, **kwargs)
+
+    loop.set_task_factory(_factory)
+    logger.warning("DB await detector enabled (debug mode)")
+
+
+def pool_status(engine: Engine) -> dict[str, Any]:
+    """Return pool saturation gauges (QueuePool only reports all of them)."""
+    pool = engine.pool
+    result: dict[str, Any] = {}
+    for name in ("size", "checkedout", "overflow", "checkedin"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            try:
+                result[name] = int(fn())
+            except Exception:
+                continue
+    max_overflow = getattr(pool, "_max_overflow", None)
+    if "size" in result and isinstance(max_overflow, int) and max_overflow >= 0:
+        result["capacity"] = result["size"] + max_overflow
+    return result
+
+
+def format_pool_status(engine: Engine) -> str:
+    status = pool_status(engine)
+    if not status:
+        return "-"
+    checked_out = status.get("checkedout", 0)
+    capacity = status.get("capacity") or status.get("size")
+    return f"{checked_out}/{capacity if capacity is not None else '?'} overflow={status.get('overflow', 0)}"
+
+
+__all__ = [
+    "QueryStats",
+    "track_queries",
+    "current_query_tag",
+    "current_query_stats",
+    "install_query_hooks",
+    "install_await_detector",
+    "held_connections",
+    "set_current_handler",
+    "current_handler",
+    "reset_current_handler",
+    "pool_status",
+    "format_pool_status",
+]
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0008_fsm_states'
+down_revision = '0007_cats_income_expense'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'fsm_states',
+        sa.Column('key', sa.Text(), primary_key=True),
+        sa.Column('state', sa.Text(), nullable=True),
+        sa.Column('data', postgresql.JSONB(), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        schema='finance',
+    )
+    op.create_index('ix_fsm_states_expires_at', 'fsm_states', ['expires_at'], schema='finance')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fsm_states_expires_at', table_name='fsm_states', schema='finance')
+    op.drop_table('fsm_states', schema='finance')
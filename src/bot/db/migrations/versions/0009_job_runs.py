@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0009_job_runs'
+down_revision = '0008_fsm_states'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'job_runs',
+        sa.Column('job_id', sa.Text(), primary_key=True),
+        sa.Column('run_key', sa.Text(), primary_key=True),
+        sa.Column('instance', sa.Text(), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        schema='finance',
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_runs', schema='finance')
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from alembic import op
+
+revision = '0010_operations_history_idx'
+down_revision = '0009_job_runs'
+branch_labels = None
+depends_on = None
+
+_INDEXES = [
+    ('ix_operations_created_at_id', 'operations', ['created_at', 'id']),
+    ('ix_operations_op_type_created_at_id', 'operations', ['op_type', 'created_at', 'id']),
+    ('ix_operations_category_created_at_id', 'operations', ['category_id', 'created_at', 'id']),
+    ('ix_operations_user_created_at_id', 'operations', ['created_by_user_id', 'created_at', 'id']),
+    ('ix_operation_channels_channel_id_operation_id', 'operation_channels', ['channel_id', 'operation_id']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction; do not block inserts on a large table
+    with op.get_context().autocommit_block():
+        for name, table, columns in _INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                schema='finance',
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _columns in reversed(_INDEXES):
+            op.drop_index(name, table_name=table, schema='finance', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from alembic import op
+
+revision = '0011_operations_search_trgm'
+down_revision = '0010_operations_history_idx'
+branch_labels = None
+depends_on = None
+
+# Keep in sync with bot.services.search.SEARCH_DOCUMENT
+_DOCUMENT = (
+    "(coalesce(comment, '') || ' ' || "
+    "coalesce(free_text_reason, '') || ' ' || "
+    "coalesce(receipt_url, ''))"
+)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_operations_search_trgm "
+            f"ON finance.operations USING gin ({_DOCUMENT} gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS finance.ix_operations_search_trgm")
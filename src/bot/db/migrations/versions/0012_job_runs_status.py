@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0012_job_runs_status'
+down_revision = '0011_operations_search_trgm'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'job_runs',
+        sa.Column('status', sa.Text(), nullable=False, server_default='done'),
+        schema='finance',
+    )
+    op.add_column('job_runs', sa.Column('error', sa.Text(), nullable=True), schema='finance')
+
+
+def downgrade() -> None:
+    op.drop_column('job_runs', 'error', schema='finance')
+    op.drop_column('job_runs', 'status', schema='finance')
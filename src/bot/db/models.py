@@ -9,11 +9,14 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
+    JSON,
     SmallInteger,
     Text,
     Table,
     UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base, Mapped, mapped_column
 
 Base = declarative_base()
@@ -61,6 +64,11 @@ class Operation(Base):
     __tablename__ = "operations"
     __table_args__ = (
         UniqueConstraint("dedup_hash", name="uq_operations_dedup_hash"),
+        # Keyset pagination of the history on (created_at, id), optionally narrowed by a filter
+        Index("ix_operations_created_at_id", "created_at", "id"),
+        Index("ix_operations_op_type_created_at_id", "op_type", "created_at", "id"),
+        Index("ix_operations_category_created_at_id", "category_id", "created_at", "id"),
+        Index("ix_operations_user_created_at_id", "created_by_user_id", "created_at", "id"),
         {"schema": "finance"},
     )
 
@@ -83,6 +91,8 @@ OperationChannel = Table(
     Base.metadata,
     Column("operation_id", BigInteger, ForeignKey("finance.operations.id"), primary_key=True, nullable=False),
     Column("channel_id", BigInteger, ForeignKey("finance.channels.id"), primary_key=True, nullable=False),
+    # The primary key leads with operation_id; the history's channel filter looks up by channel
+    Index("ix_operation_channels_channel_id_operation_id", "channel_id", "operation_id"),
     schema="finance",
 )
 
@@ -154,3 +164,39 @@ class ChannelDailyChurn(Base):
 
 
 __all__ += ["ChannelDailyChurn"]
+
+
+class FsmState(Base):
+    __tablename__ = "fsm_states"
+    __table_args__ = (
+        Index("ix_fsm_states_expires_at", "expires_at"),
+        {"schema": "finance"},
+    )
+
+    # aiogram storage key: fsm:<bot_id>:<chat_id>:<user_id>:<destiny>
+    key: Mapped[str] = mapped_column(Text, primary_key=True)
+    state: Mapped[str | None] = mapped_column(Text)
+    data: Mapped[dict] = mapped_column(JSON().with_variant(JSONB(), "postgresql"), nullable=False, default=dict)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+__all__ += ["FsmState"]
+
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    __table_args__ = {"schema": "finance"}
+
+    # One row per scheduled run (e.g. job_id="daily_collect", run_key="2025-01-31")
+    job_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    run_key: Mapped[str] = mapped_column(Text, primary_key=True)
+    instance: Mapped[str] = mapped_column(Text, nullable=False)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    # "done" or "failed"; a finished run is not repeated by other instances either way
+    status: Mapped[str] = mapped_column(Text, nullable=False, server_default="done")
+    error: Mapped[str | None] = mapped_column(Text)
+
+
+__all__ += ["JobRun"]
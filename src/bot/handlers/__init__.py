@@ -1,3 +1,5 @@
 from .commands import router as commands  # noqa: F401
 from .flow_add_operation import router as flow_add_operation  # noqa: F401
 from .channels import router as channels  # noqa: F401
+from .admin import router as admin  # noqa: F401
+from .data_io import router as data_io  # noqa: F401
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import logging
+
+from aiogram import Router
+from aiogram.filters import BaseFilter, Command, CommandObject
+from aiogram.types import BufferedInputFile, Message, CallbackQuery
+
+from bot.services.error_aggregator import get_error_aggregator
+from bot.services.profiling import (
+    MODE_CPROFILE,
+    MODE_SAMPLE,
+    TARGETS,
+    arm_profile,
+    memory_diff,
+    stop_memory_tracing,
+)
+from bot.settings import Settings
+
+logger = logging.getLogger()
+router = Router()
+
+DEBUG_USAGE = (
+    "Использование:\n"
+    "/debug profile collect|stats [sample] — профилировать следующий сбор статистики или /stats\n"
+    "/debug mem — снимок памяти (tracemalloc) и разница с предыдущим\n"
+    "/debug mem stop — выключить tracemalloc"
+)
+
+
+class AdminFilter(BaseFilter):
+    """Pass only users from ``ADMIN_USER_IDS`` (settings come from dispatcher workflow data)."""
+
+    async def __call__(self, event: Message | CallbackQuery, settings: Settings) -> bool:
+        user = event.from_user
+        return user is not None and user.id in settings.admin_user_ids
+
+
+router.message.filter(AdminFilter())
+router.callback_query.filter(AdminFilter())
+
+
+@router.message(Command("errors"))
+async def cmd_errors(message: Message) -> None:
+    await message.answer(get_error_aggregator().format_top(10), parse_mode="HTML")
+
+
+@router.message(Command("debug"))
+async def cmd_debug(message: Message, command: CommandObject) -> None:
+    args = (command.args or "").split()
+    if len(args) >= 2 and args[0] == "profile" and args[1] in TARGETS:
+        mode = MODE_SAMPLE if len(args) > 2 and args[2] == "sample" else MODE_CPROFILE
+
+        async def _deliver(files: list[tuple[str, bytes]], caption: str) -> None:
+            for i, (name, content) in enumerate(files):
+                await message.answer_document(
+                    BufferedInputFile(content, filename=name), caption=caption if i == 0 else None
+                )
+
+        arm_profile(args[1], mode, _deliver)
+        hint = "запустите /collect_now или дождитесь планового сбора" if args[1] == "collect" else "вызовите /stats"
+        await message.answer(f"Профилирование ({mode}) включено для следующего вызова: {hint}.")
+        return
+
+    if args and args[0] == "mem":
+        if len(args) > 1 and args[1] == "stop":
+            stop_memory_tracing()
+            await message.answer("tracemalloc выключен.")
+            return
+        summary, report = await memory_diff()
+        if report is None:
+            await message.answer(summary)
+        else:
+            await message.answer_document(BufferedInputFile(report, filename="memory-diff.txt"), caption=summary)
+        return
+
+    await message.answer(DEBUG_USAGE)
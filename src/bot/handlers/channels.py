@@ -3,13 +3,39 @@ from __future__ import annotations
 import logging
 
 from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
+from sqlalchemy import func
 
-from bot.db.base import session_scope
-from bot.db.models import Channel, User, Operation, Category, OperationChannel
-from bot.keyboards.channels import channels_main_menu_kb, channel_actions_kb, channels_inline_menu_kb
-from bot.keyboards.common import back_to_main_menu_kb
+from bot.db.base import read_session_scope, session_scope
+from bot.db.models import Channel
+from bot.keyboards.channels import (
+    CHANNEL_LIST_FILTERS,
+    HISTORY_OP_TYPE_BUTTONS,
+    channel_actions_kb,
+    channel_list_kb,
+    channels_inline_menu_kb,
+    channels_main_menu_kb,
+    operations_history_kb,
+    search_results_kb,
+)
+from bot.services.catalog import CatalogSnapshot, catalog_snapshot, invalidate_catalog
+from bot.services.history import (
+    HISTORY_USAGE,
+    HistoryFilter,
+    HistoryFilterError,
+    fetch_history_page,
+    fetch_operation_channels,
+    parse_history_args,
+)
+from bot.services.search import (
+    MIN_QUERY_LENGTH,
+    SEARCH_PAGE_SIZE,
+    normalize_query,
+    query_id,
+    search_operations,
+)
 from bot.services.time import now_msk
 from bot.services.channel_stats import collect_for_channel
 from bot.types.enums import OperationType
@@ -18,6 +44,90 @@ logger = logging.getLogger()
 
 router = Router()
 
+CHANNEL_LIST_PAGE_SIZE = 8
+DELETED_BY_USER = "deleted_by_user"
+
+
+def _channel_filter(flt: str):  # type: ignore[no-untyped-def]
+    if flt == "active":
+        return Channel.is_active.is_(True)
+    if flt == "paused":
+        return Channel.is_active.is_(False)
+    if flt == "failing":
+        return Channel.is_active.is_(True) & Channel.last_error.is_not(None)
+    return None
+
+
+def _render_channel_list(flt: str, cursor: str) -> tuple[str, InlineKeyboardMarkup]:
+    """One page of the channel list, newest first, addressed by a keyset cursor.
+
+    ``cursor`` is empty for the first page, ``a<id>`` for channels older than ``id`` and
+    ``b<id>`` for the page right before ``id``.
+    """
+    if flt not in CHANNEL_LIST_FILTERS:
+        flt = "all"
+    cond = _channel_filter(flt)
+    size = CHANNEL_LIST_PAGE_SIZE
+    cols = (
+        Channel.id,
+        Channel.title,
+        Channel.username,
+        Channel.tg_chat_id,
+        Channel.is_active,
+        Channel.last_error,
+        Channel.last_success_at,
+    )
+    with session_scope() as s:
+
+        def _query():  # type: ignore[no-untyped-def]
+            q = s.query(*cols)
+            return q.filter(cond) if cond is not None else q
+
+        count_q = s.query(func.count(Channel.id))
+        total = (count_q.filter(cond) if cond is not None else count_q).scalar()
+        rows: list = []
+        has_prev = has_next = False
+        if cursor[1:].isdigit() and cursor[0] == "b":
+            older = _query().filter(Channel.id > int(cursor[1:])).order_by(Channel.id.asc()).limit(size + 1).all()
+            if len(older) > size:
+                rows = list(reversed(older[:size]))
+                has_prev = has_next = True
+        elif cursor[1:].isdigit() and cursor[0] == "a":
+            rows = _query().filter(Channel.id < int(cursor[1:])).order_by(Channel.id.desc()).limit(size + 1).all()
+            has_prev = bool(rows)
+        if not rows:
+            # First page, or the requested page emptied out
+            rows = _query().order_by(Channel.id.desc()).limit(size + 1).all()
+            has_prev = False
+        if len(rows) > size:
+            rows = rows[:size]
+            has_next = True
+
+    title = f"Каналы ({CHANNEL_LIST_FILTERS[flt].lower()}): {total}"
+    lines = [title, ""]
+    for n, r in enumerate(rows, start=1):
+        name = r.title or r.username or str(r.tg_chat_id)
+        if not r.is_active:
+            status = "удалён" if r.last_error == DELETED_BY_USER else "на паузе"
+        elif r.last_error:
+            status = f"ошибка сбора: {r.last_error}"
+        else:
+            status = "активен"
+        line = f"{n}. {name} — {status}"
+        if r.is_active and r.last_success_at:
+            line += f" · сбор {r.last_success_at.strftime('%d.%m %H:%M')}"
+        lines.append(line)
+    if not rows:
+        lines.append("Список каналов пуст. Нажмите ‘Добавить канал’." if flt == "all" else "Нет каналов.")
+    kb = channel_list_kb(
+        [(int(r.id), bool(r.is_active)) for r in rows],
+        flt,
+        cursor,
+        prev_cursor=f"b{rows[0].id}" if has_prev else None,
+        next_cursor=f"a{rows[-1].id}" if has_next else None,
+    )
+    return "\n".join(lines), kb
+
 
 @router.message(Command("channels"))
 async def cmd_channels(message: Message) -> None:
@@ -34,7 +144,7 @@ async def ask_forward(message: Message) -> None:
 
 
 @router.message(F.forward_from_chat)
-async def handle_forwarded_post(message: Message) -> None:
+async def handle_forwarded_post(message: Message, db_user_id: int | None = None) -> None:
     fwd = message.forward_from_chat
     if fwd is None:
         return
@@ -42,7 +152,6 @@ async def handle_forwarded_post(message: Message) -> None:
     title = fwd.title
     username = fwd.username
 
-    added_by_user_id = message.from_user.id if message.from_user else None
     with session_scope() as s:
         existing = s.query(Channel).filter(Channel.tg_chat_id == tg_chat_id).one_or_none()
         if existing:
@@ -62,16 +171,12 @@ async def handle_forwarded_post(message: Message) -> None:
                 is_active=True,
                 last_success_at=None,
                 last_error=None,
-                added_by_user_id=None,
+                added_by_user_id=db_user_id,
             )
-            # Resolve added_by_user_id to DB user
-            if added_by_user_id is not None:
-                user = s.query(User).filter(User.tg_user_id == added_by_user_id).one_or_none()
-                if user is not None:
-                    ch.added_by_user_id = user.id
             s.add(ch)
             s.flush()
             ch_id = ch.id
+        invalidate_catalog(s)
 
     # Trigger immediate stats collection for this channel
     try:
@@ -96,19 +201,9 @@ async def handle_forwarded_post(message: Message) -> None:
 
 @router.message(F.text == "📋 Список каналов")
 async def list_channels(message: Message) -> None:
-    with session_scope() as s:
-        rows = (
-            s.query(Channel.id, Channel.title, Channel.username, Channel.tg_chat_id, Channel.is_active)
-            .order_by(Channel.id.desc())
-            .limit(20)
-            .all()
-        )
-    if not rows:
-        await message.answer("Список каналов пуст. Нажмите ‘Добавить канал’.")
-        return
-    for ch_id, title, username, tg_chat_id, is_active in rows:
-        text = f"{title or username or tg_chat_id} — {'активен' if is_active else 'на паузе'}"
-        await message.answer(text, reply_markup=channel_actions_kb(ch_id))
+    # One message; pages and filters are switched by editing it
+    text, kb = _render_channel_list("all", "")
+    await message.answer(text, reply_markup=kb)
 
 
 # Inline callbacks from start inline menu
@@ -124,99 +219,201 @@ async def inline_add_channel(cb: CallbackQuery) -> None:
 
 @router.callback_query(F.data == "channels:list")
 async def inline_list_channels(cb: CallbackQuery) -> None:
-    with session_scope() as s:
-        rows = (
-            s.query(Channel.id, Channel.title, Channel.username, Channel.tg_chat_id, Channel.is_active)
-            .order_by(Channel.id.desc())
-            .limit(20)
-            .all()
-        )
-    if not rows:
-        await cb.message.answer("Список каналов пуст. Нажмите ‘Добавить канал’.")
+    text, kb = _render_channel_list("all", "")
+    await cb.message.edit_text(text, reply_markup=kb)
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("chl:"))
+async def channel_list_page(cb: CallbackQuery) -> None:
+    _, flt, cursor = (cb.data.split(":", 2) + [""])[:3]
+    text, kb = _render_channel_list(flt, cursor)
+    if text == cb.message.text and kb == cb.message.reply_markup:
+        # Same filter pressed again: nothing to edit
         await cb.answer()
         return
-    for ch_id, title, username, tg_chat_id, is_active in rows:
-        text = f"{title or username or tg_chat_id} — {'активен' if is_active else 'на паузе'}"
-        await cb.message.answer(text, reply_markup=channel_actions_kb(ch_id))
+    await cb.message.edit_text(text, reply_markup=kb)
     await cb.answer()
 
 
+@router.callback_query(F.data.startswith("chl_t:") | F.data.startswith("chl_d:"))
+async def channel_list_action(cb: CallbackQuery) -> None:
+    action, id_str, flt, cursor = (cb.data.split(":", 3) + ["", ""])[:4]
+    if not id_str.isdigit():
+        await cb.answer("Некорректный канал")
+        return
+    found = False
+    with session_scope() as s:
+        ch = s.query(Channel).filter(Channel.id == int(id_str)).one_or_none()
+        if ch:
+            if action == "chl_d":
+                ch.is_active = False
+                ch.last_error = DELETED_BY_USER
+            else:
+                ch.is_active = not ch.is_active
+                if ch.is_active and ch.last_error == DELETED_BY_USER:
+                    ch.last_error = None
+            s.flush()
+            invalidate_catalog(s)
+            found = True
+    if not found:
+        await cb.answer("Канал не найден", show_alert=True)
+        return
+    await cb.answer("Удалено" if action == "chl_d" else "Готово")
+    text, kb = _render_channel_list(flt, cursor)
+    await cb.message.edit_text(text, reply_markup=kb)
+
+
+def _operation_lines(r, catalog: CatalogSnapshot, ch_map: dict[int, list[int]]) -> list[str]:  # type: ignore[no-untyped-def]
+    if r.op_type == OperationType.INCOME.value:
+        op_type_txt = "Доход"
+    elif r.op_type == OperationType.PERSONAL_INVEST.value:
+        op_type_txt = "Личные вложения"
+    else:
+        op_type_txt = "Расход"
+    cat = catalog.categories_by_id.get(r.category_id)
+    cat_name = cat.name if cat else str(r.category_id)
+    rub = int(r.amount_kop) // 100
+    if r.is_general:
+        channels_txt = "общая"
+    else:
+        ch_ids = ch_map.get(r.id, [])
+        if ch_ids:
+            names = [
+                catalog.channels_by_id[cid].display_name if cid in catalog.channels_by_id else str(cid)
+                for cid in ch_ids
+            ]
+            channels_txt = ", ".join(names)
+        else:
+            channels_txt = "—"
+    dt = r.created_at
+    try:
+        dt_txt = dt.strftime("%d.%m.%Y %H:%M")
+    except Exception:
+        dt_txt = str(dt)
+    lines = [f"{dt_txt} · {op_type_txt} · {cat_name} · {rub} RUB · {channels_txt}"]
+    if r.free_text_reason:
+        lines.append(f"  Пояснение: {r.free_text_reason}")
+    if r.receipt_url:
+        lines.append(f"  Чек: {r.receipt_url}")
+    if r.comment:
+        lines.append(f"  Комментарий: {r.comment}")
+    lines.append("")
+    return lines
+
+
+def _render_history(flt: HistoryFilter, cursor: str, catalog: CatalogSnapshot) -> tuple[str, InlineKeyboardMarkup]:
+    after_id = int(cursor[1:]) if cursor[:1] == "a" and cursor[1:].isdigit() else None
+    before_id = int(cursor[1:]) if cursor[:1] == "b" and cursor[1:].isdigit() else None
+    with read_session_scope() as s:
+        page = fetch_history_page(s, flt, after_id=after_id, before_id=before_id)
+        ch_map = fetch_operation_channels(s, [int(r.id) for r in page.rows])
+
+    filter_parts: list[str] = []
+    if flt.category_id is not None:
+        cat = catalog.categories_by_id.get(flt.category_id)
+        filter_parts.append(f"категория {cat.name if cat else flt.category_id}")
+    if flt.channel_id is not None:
+        ch = catalog.channels_by_id.get(flt.channel_id)
+        filter_parts.append(f"канал {ch.display_name if ch else flt.channel_id}")
+    if flt.user_id is not None:
+        filter_parts.append("мои")
+    if flt.date_from or flt.date_to:
+        date_from = flt.date_from.strftime("%d.%m.%Y") if flt.date_from else "…"
+        date_to = flt.date_to.strftime("%d.%m.%Y") if flt.date_to else "…"
+        filter_parts.append(f"{date_from}–{date_to}")
+    lines: list[str] = ["История транзакций" + (f" ({', '.join(filter_parts)})" if filter_parts else "") + ":"]
+    for r in page.rows:
+        lines.extend(_operation_lines(r, catalog, ch_map))
+
+    if not page.rows:
+        lines.append("Пока нет операций." if flt == HistoryFilter() else "Нет операций по фильтру.")
+    type_filters = [
+        (("• " if flt.op_type == op_type else "") + text, flt.with_op_type(op_type).encode())
+        for op_type, text in HISTORY_OP_TYPE_BUTTONS
+    ]
+    kb = operations_history_kb(
+        type_filters,
+        flt.encode(),
+        prev_cursor=f"b{page.prev_before_id}" if page.prev_before_id is not None else None,
+        next_cursor=f"a{page.next_after_id}" if page.next_after_id is not None else None,
+    )
+    return "\n".join(lines).rstrip(), kb
+
+
 @router.callback_query(F.data == "operations:history")
 async def inline_operations_history(cb: CallbackQuery) -> None:
-    with session_scope() as s:
-        # fetch last 20 operations globally
-        rows = (
-            s.query(
-                Operation.id,
-                Operation.created_at,
-                Operation.op_type,
-                Operation.category_id,
-                Operation.amount_kop,
-                Operation.is_general,
-                Operation.receipt_url,
-                Operation.comment,
-            )
-            .order_by(Operation.id.desc())
-            .limit(20)
-            .all()
+    text, kb = _render_history(HistoryFilter(), "", await catalog_snapshot())
+    await cb.message.edit_text(text, reply_markup=kb)
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("oh:"))
+async def operations_history_page(cb: CallbackQuery) -> None:
+    _, cursor, encoded = (cb.data.split(":", 2) + ["", ""])[:3]
+    text, kb = _render_history(HistoryFilter.decode(encoded), cursor, await catalog_snapshot())
+    if text == cb.message.text and kb == cb.message.reply_markup:
+        await cb.answer()
+        return
+    await cb.message.edit_text(text, reply_markup=kb)
+    await cb.answer()
+
+
+@router.message(Command("history"))
+async def cmd_history(message: Message, command: CommandObject, db_user_id: int | None = None) -> None:
+    catalog = await catalog_snapshot()
+    try:
+        flt = parse_history_args(command.args, catalog, db_user_id)
+    except HistoryFilterError as e:
+        await message.answer(f"{e}\n\n{HISTORY_USAGE}")
+        return
+    text, kb = _render_history(flt, "", catalog)
+    await message.answer(text, reply_markup=kb)
+
+
+def _render_search(query: str, offset: int, catalog: CatalogSnapshot) -> tuple[str, InlineKeyboardMarkup]:
+    with read_session_scope() as s:
+        page = search_operations(s, query, offset=offset)
+        ch_map = fetch_operation_channels(s, [int(r.id) for r in page.rows])
+    if page.rows:
+        lines = [f"Поиск «{query}»: {offset + 1}–{offset + len(page.rows)}", ""]
+    else:
+        lines = [f"Поиск «{query}»: ничего не найдено."]
+    for r in page.rows:
+        lines.extend(_operation_lines(r, catalog, ch_map))
+    kb = search_results_kb(
+        query_id(query),
+        prev_offset=max(0, offset - SEARCH_PAGE_SIZE) if offset > 0 else None,
+        next_offset=offset + SEARCH_PAGE_SIZE if page.has_more else None,
+    )
+    return "\n".join(lines).rstrip(), kb
+
+
+@router.message(Command("find"))
+async def cmd_find(message: Message, command: CommandObject, state: FSMContext) -> None:
+    query = normalize_query(command.args or "")
+    if len(query) < MIN_QUERY_LENGTH:
+        await message.answer(
+            f"Использование: /find <текст> — поиск по комментариям, пояснениям и ссылкам на чеки "
+            f"(минимум {MIN_QUERY_LENGTH} символа)."
         )
-        cat_by_id = {c.id: c for c in s.query(Category).all()}
-        # build map of operation_id -> channel ids
-        op_ids = [r.id for r in rows]
-        ch_map: dict[int, list[int]] = {}
-        if op_ids:
-            res = s.execute(
-                OperationChannel.select().where(OperationChannel.c.operation_id.in_(op_ids))
-            )
-            for op_id, ch_id in res:
-                ch_map.setdefault(int(op_id), []).append(int(ch_id))
-        # fetch channel titles for all involved ids
-        all_ch_ids = {cid for ids in ch_map.values() for cid in ids}
-        ch_title_by_id: dict[int, str] = {}
-        if all_ch_ids:
-            ch_rows = (
-                s.query(Channel.id, Channel.title, Channel.username, Channel.tg_chat_id)
-                .filter(Channel.id.in_(list(all_ch_ids)))
-                .all()
-            )
-            ch_title_by_id = {
-                row.id: (row.title or row.username or str(row.tg_chat_id)) for row in ch_rows
-            }
-        # prepare text
-        lines: list[str] = ["Последние 20 транзакций:"]
-        for r in rows:
-            if r.op_type == OperationType.INCOME.value:
-                op_type_txt = "Доход"
-            elif r.op_type == OperationType.PERSONAL_INVEST.value:
-                op_type_txt = "Личные вложения"
-            else:
-                op_type_txt = "Расход"
-            cat_name = cat_by_id.get(r.category_id).name if cat_by_id.get(r.category_id) else str(r.category_id)
-            rub = int(r.amount_kop) // 100
-            if r.is_general:
-                channels_txt = "общая"
-            else:
-                ch_ids = ch_map.get(r.id, [])
-                if ch_ids:
-                    names = [ch_title_by_id.get(cid, str(cid)) for cid in ch_ids]
-                    channels_txt = ", ".join(names)
-                else:
-                    channels_txt = "—"
-            dt = r.created_at
-            try:
-                dt_txt = dt.strftime("%d.%m.%Y %H:%M")
-            except Exception:
-                dt_txt = str(dt)
-            lines.append(f"{dt_txt} · {op_type_txt} · {cat_name} · {rub} RUB · {channels_txt}")
-            if r.receipt_url:
-                lines.append(f"  Чек: {r.receipt_url}")
-            if r.comment:
-                lines.append(f"  Комментарий: {r.comment}")
-            lines.append("")
-
-    if len(lines) == 1:
-        lines.append("Пока нет операций.")
-    await cb.message.edit_text("\n".join(lines), reply_markup=back_to_main_menu_kb())
+        return
+    # Pages are switched by callbacks; the query itself is too long for callback data, so
+    # it stays in FSM and the buttons carry its id (older result messages then go stale)
+    await state.update_data(find_query=query)
+    text, kb = _render_search(query, 0, await catalog_snapshot())
+    await message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(F.data.startswith("find:"))
+async def find_page(cb: CallbackQuery, state: FSMContext) -> None:
+    _, qid, offset_str = (cb.data.split(":", 2) + ["", ""])[:3]
+    query = (await state.get_data()).get("find_query")
+    if not query or qid != query_id(query) or not offset_str.isdigit():
+        await cb.answer("Поиск устарел, повторите /find", show_alert=True)
+        return
+    text, kb = _render_search(query, int(offset_str), await catalog_snapshot())
+    await cb.message.edit_text(text, reply_markup=kb)
     await cb.answer()
 
 
@@ -253,31 +450,36 @@ async def inline_main_menu(cb: CallbackQuery) -> None:
 @router.callback_query(F.data.startswith("ch_toggle:"))
 async def toggle_channel(cb: CallbackQuery) -> None:
     channel_id = int(cb.data.split(":", 1)[1])
+    # Finish the DB work first: no Telegram calls while the transaction is open
+    text: str | None = None
     with session_scope() as s:
         ch = s.query(Channel).filter(Channel.id == channel_id).one_or_none()
-        if not ch:
-            await cb.answer("Канал не найден", show_alert=True)
-            return
-        ch.is_active = not ch.is_active
-        s.flush()
-        await cb.answer("Готово")
-        await cb.message.edit_text(
-            f"{ch.title or ch.username or ch.tg_chat_id} — {'активен' if ch.is_active else 'на паузе'}"
-        )
+        if ch:
+            ch.is_active = not ch.is_active
+            s.flush()
+            invalidate_catalog(s)
+            text = f"{ch.title or ch.username or ch.tg_chat_id} — {'активен' if ch.is_active else 'на паузе'}"
+    if text is None:
+        await cb.answer("Канал не найден", show_alert=True)
+        return
+    await cb.answer("Готово")
+    await cb.message.edit_text(text)
 
 
 @router.callback_query(F.data.startswith("ch_delete:"))
 async def delete_channel(cb: CallbackQuery) -> None:
     channel_id = int(cb.data.split(":", 1)[1])
+    found = False
     with session_scope() as s:
         ch = s.query(Channel).filter(Channel.id == channel_id).one_or_none()
-        if not ch:
-            await cb.answer("Канал не найден", show_alert=True)
-            return
-        ch.is_active = False
-        ch.last_error = "deleted_by_user"
-        s.flush()
+        if ch:
+            ch.is_active = False
+            ch.last_error = DELETED_BY_USER
+            s.flush()
+            invalidate_catalog(s)
+            found = True
+    if not found:
+        await cb.answer("Канал не найден", show_alert=True)
+        return
     await cb.answer("Удалено")
     await cb.message.edit_text("Канал удалён/деактивирован")
-
-
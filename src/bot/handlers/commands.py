@@ -11,7 +11,7 @@ from bot.keyboards.common import options_menu_kb
 from bot.db.models import User
 from bot.services.time import now_msk
 from bot.services.channel_stats import collect_daily_for_all_channels
-from bot.db.base import session_scope
+from bot.db.base import UnitOfWork, read_session_scope
 from bot.db.models import Channel
 from sqlalchemy import func
 from bot.services.alerts import build_stats_report_text
@@ -32,7 +32,9 @@ async def cmd_start(message: Message) -> None:
             "<b>⚡ Быстрый старт</b>\n"
             "• <b>/in</b> — добавить доход (сразу к выбору категории)\n"
             "• <b>/out</b> — добавить расход (сразу к выбору категории)\n"
-            "• <b>/invest</b> — добавить личные вложения (сразу выбор категории)\n\n"
+            "• <b>/invest</b> — добавить личные вложения (сразу выбор категории)\n"
+            "• <b>/out 1200 ad_purchase @канал #комментарий</b> — сразу одной строкой; "
+            "несколько строк — несколько операций с одним подтверждением\n\n"
             "<b>🧭 Полный сценарий</b>\n"
             "• <b>/add</b> — добавить операцию пошагово\n"
             "• <b>/cancel</b> — отменить текущую операцию\n"
@@ -42,7 +44,11 @@ async def cmd_start(message: Message) -> None:
             "<b>📊 Статистика</b>\n"
             "• <b>/stats</b> — охваты за 24/48/72ч, средние просмотры и ER\n\n"
             "<b>💵 Финансы</b>\n"
-            "• <b>/cashflow</b> — доходы/расходы за неделю и месяц, CPS (с вычетом отписок)\n\n"
+            "• <b>/cashflow</b> — доходы/расходы за неделю и месяц, CPS (с вычетом отписок)\n"
+            "• <b>/history</b> — история операций с фильтрами (in/out/invest, cat:, ch:, me, from:, to:)\n"
+            "• <b>/find</b> — поиск операций по комментариям, пояснениям и чекам\n"
+            "• <b>/import</b> — загрузить историю операций из CSV\n"
+            "• <b>/export</b> — выгрузить операции или статистику каналов (CSV/Parquet)\n\n"
             "<b>💡 Подсказки</b>\n"
             "• На шаге каналов — мультивыбор.\n"
             "• Сумму вводите с копейками (напр.: 1200.50 или 1 200,50).\n"
@@ -61,32 +67,30 @@ async def cmd_help(message: Message) -> None:
 
 
 @router.callback_query(lambda c: c.data == "options:menu")
-async def options_menu(cb):
+async def options_menu(cb, uow: UnitOfWork):
     uid = cb.from_user.id if cb.from_user else None
     if uid is None:
         await cb.answer("Техническая ошибка", show_alert=True)
         return
-    with session_scope() as s:
-        user = s.query(User).filter(User.tg_user_id == uid).one_or_none()
-        notify = bool(getattr(user, "notify_daily_stats", False)) if user else False
+    user = uow.session.query(User).filter(User.tg_user_id == uid).one_or_none()
+    notify = bool(getattr(user, "notify_daily_stats", False)) if user else False
     await cb.message.edit_text("Опции:", reply_markup=options_menu_kb(notify_on=notify))
     await cb.answer()
 
 
 @router.callback_query(lambda c: c.data == "options:toggle_notify")
-async def options_toggle_notify(cb):
+async def options_toggle_notify(cb, uow: UnitOfWork):
     uid = cb.from_user.id if cb.from_user else None
     if uid is None:
         await cb.answer("Техническая ошибка", show_alert=True)
         return
-    with session_scope() as s:
-        user = s.query(User).filter(User.tg_user_id == uid).one_or_none()
-        if user is None:
-            await cb.answer("Пользователь не найден", show_alert=True)
-            return
-        user.notify_daily_stats = not bool(user.notify_daily_stats)
-        s.flush()
-        new_state = bool(user.notify_daily_stats)
+    user = uow.session.query(User).filter(User.tg_user_id == uid).one_or_none()
+    if user is None:
+        await cb.answer("Пользователь не найден", show_alert=True)
+        return
+    new_state = not bool(user.notify_daily_stats)
+    user.notify_daily_stats = new_state
+    uow.commit()
     await cb.message.edit_reply_markup(reply_markup=options_menu_kb(notify_on=new_state))
     await cb.answer("Оповещение: " + ("включено" if new_state else "выключено"))
 
@@ -177,7 +181,7 @@ async def cmd_cashflow(message: Message) -> None:
         return int(ch_total or 0) + int(gen_total or 0)
 
     def build_period(fin_start, fin_end, header: str) -> str:
-        with session_scope() as s:
+        with read_session_scope() as s:
             channels = (
                 s.query(Channel)
                 .filter(Channel.is_active.is_(True))
@@ -205,7 +209,7 @@ async def cmd_cashflow(message: Message) -> None:
             return "\n".join(lines)
 
     def build_overall() -> str:
-        with session_scope() as s:
+        with read_session_scope() as s:
             channels = (
                 s.query(Channel)
                 .filter(Channel.is_active.is_(True))
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+import tempfile
+from contextlib import suppress
+
+from aiogram import Bot, F, Router
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Document, FSInputFile, Message
+
+from bot.services.catalog import catalog_snapshot
+from bot.services.exporter import (
+    DATASET_ALIASES,
+    EXPORT_FORMATS,
+    FILE_SUFFIXES,
+    FORMAT_CSV,
+    ExportError,
+    export_dataset,
+)
+from bot.services.history import HistoryFilterError, parse_history_args
+from bot.services.importer import (
+    IMPORT_USAGE,
+    MAX_IMPORT_BYTES,
+    ImportFileError,
+    ImportProgress,
+    ImportReport,
+    import_operations,
+)
+from bot.services.time import now_msk
+
+logger = logging.getLogger()
+router = Router()
+
+PROGRESS_INTERVAL_SECONDS = 3.0
+# Files up to this size are buffered in memory, bigger ones spill to disk
+SPOOL_MAX_BYTES = 1024 * 1024
+# Bot API limit for documents sent by bots
+MAX_EXPORT_BYTES = 50 * 1024 * 1024
+
+EXPORT_USAGE = (
+    "Экспорт: /export [набор] [csv|parquet] [фильтры]\n"
+    "Наборы: operations (по умолчанию), posts, subscribers, churn\n"
+    "Фильтры: from:ДД.ММ.ГГГГ to:ДД.ММ.ГГГГ ch:<канал>; для operations также in/out/invest, cat:, me\n"
+    "Большие выгрузки — командой pnlbot-export на сервере."
+)
+
+# Imports run as background tasks so a long file neither blocks the user's update queue
+# nor gets cancelled with the update; one import per user at a time.
+_running_imports: set[int] = set()
+_background_tasks: set[asyncio.Task] = set()
+
+
+class ImportStates(StatesGroup):
+    waiting_file = State()
+
+
+def _format_report(report: ImportReport) -> str:
+    lines = [
+        "Импорт завершён.",
+        f"Строк в файле: {report.rows}",
+        f"Добавлено операций: {report.inserted}",
+        f"Пропущено дубликатов: {report.duplicates}",
+        f"Строк с ошибками: {report.error_count}",
+    ]
+    if report.errors:
+        lines.append("")
+        lines.extend(report.errors)
+        if report.error_count > len(report.errors):
+            lines.append(f"… и ещё {report.error_count - len(report.errors)}")
+    if report.collisions:
+        lines.append("")
+        lines.append("Совпадают внутри файла (пропущены; если это разные операции, укажите время):")
+        lines.extend(report.collisions)
+        if report.collision_count > len(report.collisions):
+            lines.append(f"… и ещё {report.collision_count - len(report.collisions)}")
+    return "\n".join(lines)
+
+
+async def _run_import(bot: Bot, document: Document, status: Message, tg_user_id: int, db_user_id: int | None) -> None:
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as buf:
+            await bot.download(document, destination=buf)
+            buf.seek(0)
+            progress = ImportProgress()
+            catalog = await catalog_snapshot()
+            job = asyncio.ensure_future(
+                asyncio.to_thread(import_operations, buf, catalog, tg_user_id, db_user_id, progress)
+            )
+            shown = status.text
+            while True:
+                done, _ = await asyncio.wait({job}, timeout=PROGRESS_INTERVAL_SECONDS)
+                if done:
+                    break
+                text = f"Импорт: обработано строк {progress.rows} ({progress.stage})…"
+                if text != shown:
+                    with suppress(TelegramBadRequest):
+                        await status.edit_text(text)
+                    shown = text
+            report = job.result()
+    except ImportFileError as e:
+        await status.edit_text(f"Импорт не выполнен: {e}")
+    except Exception:
+        logger.exception("Import failed for user %s", tg_user_id)
+        await status.edit_text("Импорт не удался, данные не изменены.")
+    else:
+        await status.edit_text(_format_report(report))
+    finally:
+        _running_imports.discard(tg_user_id)
+
+
+async def _start_import(message: Message, bot: Bot, db_user_id: int | None) -> None:
+    document = message.document
+    user = message.from_user
+    if document is None or user is None:
+        return
+    name = (document.file_name or "").lower()
+    if not name.endswith(".csv") and document.mime_type not in ("text/csv", "text/plain"):
+        await message.answer("Нужен CSV-файл.\n\n" + IMPORT_USAGE)
+        return
+    if (document.file_size or 0) > MAX_IMPORT_BYTES:
+        await message.answer(f"Файл слишком большой, максимум {MAX_IMPORT_BYTES // (1024 * 1024)} МБ")
+        return
+    if user.id in _running_imports:
+        await message.answer("Предыдущий импорт ещё выполняется, дождитесь его завершения.")
+        return
+    _running_imports.add(user.id)
+    status = await message.answer("Импорт: загружаю файл…")
+    # Fresh context: the import outlives the update and must not reuse its DB session
+    task = asyncio.create_task(
+        _run_import(bot, document, status, user.id, db_user_id), context=contextvars.Context()
+    )
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@router.message(Command("import"), F.document)
+async def cmd_import_with_file(message: Message, state: FSMContext, bot: Bot, db_user_id: int | None = None) -> None:
+    await state.clear()
+    await _start_import(message, bot, db_user_id)
+
+
+@router.message(Command("import"))
+async def cmd_import(message: Message, state: FSMContext) -> None:
+    await state.clear()
+    await state.set_state(ImportStates.waiting_file)
+    await message.answer(IMPORT_USAGE)
+
+
+@router.message(ImportStates.waiting_file, F.document)
+async def import_file(message: Message, state: FSMContext, bot: Bot, db_user_id: int | None = None) -> None:
+    await state.clear()
+    await _start_import(message, bot, db_user_id)
+
+
+@router.message(ImportStates.waiting_file, ~F.text.startswith("/"))
+async def import_waiting_hint(message: Message) -> None:
+    await message.answer("Жду CSV-файл документом. /cancel — отмена.")
+
+
+def _export_to_file(dataset: str, fmt: str, flt) -> tuple[str, int]:  # type: ignore[no-untyped-def]
+    fd, path = tempfile.mkstemp(suffix=FILE_SUFFIXES[fmt])
+    try:
+        with os.fdopen(fd, "wb") as out:
+            rows = export_dataset(dataset, out, fmt, flt)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, rows
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject, db_user_id: int | None = None) -> None:
+    dataset, fmt, filters = "operations", FORMAT_CSV, []
+    for token in (command.args or "").split():
+        if token.lower() in DATASET_ALIASES:
+            dataset = DATASET_ALIASES[token.lower()]
+        elif token.lower() in EXPORT_FORMATS:
+            fmt = token.lower()
+        else:
+            filters.append(token)
+    try:
+        flt = parse_history_args(" ".join(filters), await catalog_snapshot(), db_user_id)
+    except HistoryFilterError as e:
+        await message.answer(f"{e}\n\n{EXPORT_USAGE}")
+        return
+    status = await message.answer("Готовлю выгрузку…")
+    try:
+        path, rows = await asyncio.to_thread(_export_to_file, dataset, fmt, flt)
+    except ExportError as e:
+        await status.edit_text(f"{e}\n\n{EXPORT_USAGE}")
+        return
+    try:
+        if os.path.getsize(path) > MAX_EXPORT_BYTES:
+            await status.edit_text("Файл больше 50 МБ — сузьте фильтры или используйте pnlbot-export.")
+            return
+        filename = f"{dataset}_{now_msk():%Y%m%d_%H%M}{FILE_SUFFIXES[fmt]}"
+        await message.answer_document(FSInputFile(path, filename=filename), caption=f"{dataset}: {rows} строк")
+        await status.delete()
+    finally:
+        os.unlink(path)
@@ -5,19 +5,28 @@ from dataclasses import dataclass
 from typing import List
 
 from aiogram import Router, F
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from sqlalchemy.exc import IntegrityError
 
 from bot.keyboards.common import operation_type_kb, yes_no_kb, categories_kb, channels_kb, skip_kb, back_to_main_menu_kb
-from bot.types.enums import OperationType, INCOME_CATEGORY_CODES, EXPENSE_CATEGORY_CODES, INVEST_CATEGORY_CODES
+from bot.types.enums import OperationType
 from bot.services.parsing import parse_amount_rub_to_kop, AmountParseError
 from bot.services.time import now_msk
 from bot.services.dedup import build_dedup_hash
-from bot.db.base import session_scope
-from bot.db.models import Category, Channel, Operation, OperationChannel, User
+from bot.services.catalog import CatalogSnapshot, catalog_snapshot
+from bot.services.message_edits import get_edit_debouncer
+from bot.services.quick_entry import (
+    QUICK_ENTRY_USAGE,
+    QuickOperation,
+    batch_collisions,
+    insert_operations,
+    parse_quick_entry,
+)
+from bot.db.base import UnitOfWork
+from bot.db.models import Operation, OperationChannel, User
 
 logger = logging.getLogger()
 
@@ -33,6 +42,7 @@ class AddOpStates(StatesGroup):
     entering_receipt = State()
     entering_comment = State()
     confirming = State()
+    confirming_batch = State()
 
 
 @dataclass
@@ -47,23 +57,43 @@ class AddOpData:
     comment: str | None = None
     amount_kop: int | None = None
 
-def _format_channel_titles(channel_ids: list[int]) -> str:
-    if not channel_ids:
-        return "—"
-    with session_scope() as s:
-        q = s.query(Channel).filter(Channel.id.in_(channel_ids)).all()
-        by_id: dict[int, str] = {ch.id: (ch.title or str(ch.id)) for ch in q}
-    titles = [by_id.get(cid, str(cid)) for cid in channel_ids]
-    return ", ".join(titles)
+def _channels_prompt(catalog: CatalogSnapshot, selected: list[int], query: str = "", empty: bool = False) -> str:
+    lines = ["Выберите каналы (мультивыбор), затем нажмите Готово:"]
+    if query:
+        lines.append(f"Поиск: «{query}»" + (" — ничего не найдено" if empty else ""))
+    if selected:
+        lines.append(f"Выбрано: {catalog.channel_titles(selected)}")
+    return "\n".join(lines)
 
 
-def _channels_prompt(selected: list[int]) -> str:
-    if selected:
-        return (
-            "Выберите каналы (мультивыбор), затем нажмите Готово:\n"
-            f"Выбрано: {_format_channel_titles(selected)}"
-        )
-    return "Выберите каналы (мультивыбор), затем нажмите Готово:"
+async def _channels_view(state: FSMContext) -> tuple[str, InlineKeyboardMarkup]:
+    """Render the channel picker from FSM data (selection, page cursor, filters) and the catalog."""
+    data = await state.get_data()
+    selected = [int(cid) for cid in (data.get("channel_ids") or [])]
+    query = data.get("ch_query") or ""
+    selected_only = bool(data.get("ch_selected_only"))
+    catalog = await catalog_snapshot()
+    page = catalog.channel_page(
+        after_id=data.get("ch_after"),
+        prefix=query,
+        only_ids=selected if selected_only else None,
+    )
+    kb = channels_kb(
+        [(ch.id, ch.title) for ch in page.items],
+        selected_ids=selected,
+        page=page.number,
+        pages=page.pages,
+        prev_cursor=page.items[0].id if page.has_prev else None,
+        next_cursor=page.items[-1].id if page.has_next else None,
+        query=query,
+        selected_only=selected_only,
+    )
+    return _channels_prompt(catalog, selected, query, empty=not page.items), kb
+
+
+async def _refresh_channels(callback: CallbackQuery, state: FSMContext) -> None:
+    text, kb = await _channels_view(state)
+    get_edit_debouncer().edit(callback.message, text, reply_markup=kb)
 
 
 async def _show_confirmation(target, state: FSMContext) -> None:
@@ -75,17 +105,17 @@ async def _show_confirmation(target, state: FSMContext) -> None:
     else:
         op_type = "Расход"
     channels = data.get("channel_ids") or []
+    catalog = await catalog_snapshot()
     cat_name = data.get("category_name")
     if not cat_name:
-        with session_scope() as s:
-            cat_row = s.query(Category).filter(Category.id == data.get("category_id")).one_or_none()
-            cat_name = cat_row.name if cat_row else data.get("category_code")
+        cat_row = catalog.categories_by_id.get(data.get("category_id"))
+        cat_name = cat_row.name if cat_row else data.get("category_code")
     amount_kop = int(data.get("amount_kop") or 0)
     rub = amount_kop // 100
     is_general = data.get("is_general")
     lines = [
         f"Тип: {op_type}",
-        f"Каналы: {'общая' if is_general else _format_channel_titles(channels)}",
+        f"Каналы: {'общая' if is_general else catalog.channel_titles(channels)}",
         f"Категория: {cat_name}",
         f"Сумма: {rub} RUB",
     ]
@@ -104,6 +134,42 @@ async def _show_confirmation(target, state: FSMContext) -> None:
         await target.edit_text("\n".join(lines), reply_markup=yes_no_kb())
 
 
+def _batch_preview(ops: list[QuickOperation], catalog: CatalogSnapshot, repeats: dict[int, int]) -> str:
+    total_kop = sum(op.amount_kop for op in ops)
+    lines = [f"Операций: {len(ops)}, сумма: {total_kop // 100} RUB. Сохранить?"]
+    if repeats:
+        lines.append(
+            f"⚠️ Повторов: {len(repeats)} — такие строки совпадают с более ранней и не будут сохранены. "
+            "Если это разные операции, измените сумму, категорию или каналы."
+        )
+    lines.append("")
+    for i, op in enumerate(ops):
+        cat = catalog.categories_by_id.get(op.category_id)
+        channels = "общая" if op.is_general else catalog.channel_titles(list(op.channel_ids))
+        line = f"{i + 1}. {op.amount_kop // 100} RUB · {cat.name if cat else op.category_code} · {channels}"
+        note = op.free_text_reason or op.comment
+        if note:
+            line += f" · {note}"
+        if i in repeats:
+            line += f" ⚠️ повтор строки {repeats[i] + 1}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+async def _start_quick_entry(message: Message, state: FSMContext, op_type: int, args: str) -> None:
+    """One-shot entry: parse every line of the command, then a single confirmation for all of them."""
+    catalog = await catalog_snapshot()
+    ops, errors = parse_quick_entry(args, op_type, catalog)
+    if errors or not ops:
+        await message.answer("\n".join(errors[:20] + ["", QUICK_ENTRY_USAGE]).strip())
+        return
+    await state.set_state(AddOpStates.confirming_batch)
+    tg_user_id = message.from_user.id if message.from_user else 0
+    repeats = batch_collisions(ops, tg_user_id, now_msk())
+    await state.update_data(batch=[op.to_dict() for op in ops])
+    await message.answer(_batch_preview(ops, catalog, repeats), reply_markup=yes_no_kb())
+
+
 @router.message(Command("add"))
 async def cmd_add(message: Message, state: FSMContext) -> None:
     await state.clear()
@@ -112,55 +178,37 @@ async def cmd_add(message: Message, state: FSMContext) -> None:
 
 
 @router.message(Command("in"))
-async def cmd_in(message: Message, state: FSMContext) -> None:
+async def cmd_in(message: Message, state: FSMContext, command: CommandObject | None = None) -> None:
     await state.clear()
+    if command is not None and command.args:
+        await _start_quick_entry(message, state, OperationType.INCOME.value, command.args)
+        return
     await state.update_data(op_type=OperationType.INCOME.value)
-    with session_scope() as s:
-        cats = (
-            s.query(Category)
-            .filter(Category.is_active.is_(True))
-            .order_by(Category.name)
-            .all()
-        )
-        items: list[tuple[int, str, str]] = [
-            (c.id, c.name, c.code) for c in cats if c.code in INCOME_CATEGORY_CODES
-        ]
+    items = (await catalog_snapshot()).categories_for(OperationType.INCOME.value)
     await state.set_state(AddOpStates.choosing_category)
     await message.answer("Выберите категорию дохода:", reply_markup=categories_kb(items))
 
 
 @router.message(Command("out"))
-async def cmd_out(message: Message, state: FSMContext) -> None:
+async def cmd_out(message: Message, state: FSMContext, command: CommandObject | None = None) -> None:
     await state.clear()
+    if command is not None and command.args:
+        await _start_quick_entry(message, state, OperationType.EXPENSE.value, command.args)
+        return
     await state.update_data(op_type=OperationType.EXPENSE.value)
-    with session_scope() as s:
-        cats = (
-            s.query(Category)
-            .filter(Category.is_active.is_(True))
-            .order_by(Category.name)
-            .all()
-        )
-        items: list[tuple[int, str, str]] = [
-            (c.id, c.name, c.code) for c in cats if c.code in EXPENSE_CATEGORY_CODES
-        ]
+    items = (await catalog_snapshot()).categories_for(OperationType.EXPENSE.value)
     await state.set_state(AddOpStates.choosing_category)
     await message.answer("Выберите категорию расхода:", reply_markup=categories_kb(items))
 
 
 @router.message(Command("invest"))
-async def cmd_invest(message: Message, state: FSMContext) -> None:
+async def cmd_invest(message: Message, state: FSMContext, command: CommandObject | None = None) -> None:
     await state.clear()
+    if command is not None and command.args:
+        await _start_quick_entry(message, state, OperationType.PERSONAL_INVEST.value, command.args)
+        return
     await state.update_data(op_type=OperationType.PERSONAL_INVEST.value)
-    with session_scope() as s:
-        cats = (
-            s.query(Category)
-            .filter(Category.is_active.is_(True))
-            .order_by(Category.name)
-            .all()
-        )
-        items: list[tuple[int, str, str]] = [
-            (c.id, c.name, c.code) for c in cats if c.code in INVEST_CATEGORY_CODES
-        ]
+    items = (await catalog_snapshot()).categories_for(OperationType.PERSONAL_INVEST.value)
     await state.set_state(AddOpStates.choosing_category)
     await message.answer("Выберите категорию личных вложений:", reply_markup=categories_kb(items))
 
@@ -169,31 +217,20 @@ async def cmd_invest(message: Message, state: FSMContext) -> None:
 async def choose_type(callback: CallbackQuery, state: FSMContext) -> None:
     action = callback.data.split(":", 1)[1]
     if action == "income":
-        await state.update_data(op_type=OperationType.INCOME.value)
-        filter_codes = INCOME_CATEGORY_CODES
+        op_type = OperationType.INCOME
         title = "Выберите категорию дохода:"
     elif action == "expense":
-        await state.update_data(op_type=OperationType.EXPENSE.value)
-        filter_codes = EXPENSE_CATEGORY_CODES
+        op_type = OperationType.EXPENSE
         title = "Выберите категорию расхода:"
     elif action == "invest":
-        await state.update_data(op_type=OperationType.PERSONAL_INVEST.value)
-        filter_codes = INVEST_CATEGORY_CODES
+        op_type = OperationType.PERSONAL_INVEST
         title = "Выберите категорию личных вложений:"
     else:
         await callback.answer("Неизвестный тип", show_alert=True)
         return
 
-    with session_scope() as s:
-        cats = (
-            s.query(Category)
-            .filter(Category.is_active.is_(True))
-            .order_by(Category.name)
-            .all()
-        )
-        items: list[tuple[int, str, str]] = [
-            (c.id, c.name, c.code) for c in cats if c.code in filter_codes
-        ]
+    await state.update_data(op_type=op_type.value)
+    items = (await catalog_snapshot()).categories_for(op_type.value)
     await state.set_state(AddOpStates.choosing_category)
     await callback.message.edit_text(title, reply_markup=categories_kb(items))
     await callback.answer()
@@ -215,33 +252,22 @@ async def choose_category(callback: CallbackQuery, state: FSMContext) -> None:
         await callback.answer("Некорректная категория")
         return
     cat_id = int(id_str)
-    with session_scope() as s:
-        cat = s.query(Category).filter(Category.id == cat_id).one_or_none()
-        if not cat:
-            await callback.answer("Нет такой категории")
-            return
-        cat_code = cat.code
-        await state.update_data(category_id=cat.id, category_code=cat_code, category_name=cat.name)
+    catalog = await catalog_snapshot()
+    cat = catalog.categories_by_id.get(cat_id)
+    if not cat:
+        await callback.answer("Нет такой категории")
+        return
+    cat_code = cat.code
+    await state.update_data(category_id=cat.id, category_code=cat_code, category_name=cat.name)
 
     if cat_code == "custom":
         await state.set_state(AddOpStates.entering_reason)
         await callback.message.edit_text("Опишите назначение операции (свободный текст):")
     else:
         await state.set_state(AddOpStates.choosing_channels)
-        with session_scope() as s:
-            q = (
-                s.query(Channel)
-                .filter(Channel.is_active.is_(True))
-                .order_by(Channel.created_at.desc())
-                .limit(25)
-            )
-            ch_items = [(ch.id, ch.title) for ch in q.all()]
-        data = await state.get_data()
-        selected = list(data.get("channel_ids") or [])
-        await callback.message.edit_text(
-            _channels_prompt(selected),
-            reply_markup=channels_kb(ch_items, selected_ids=selected),
-        )
+        await state.update_data(ch_after=None, ch_query=None, ch_selected_only=False)
+        text, kb = await _channels_view(state)
+        await callback.message.edit_text(text, reply_markup=kb)
     await callback.answer()
 
 
@@ -254,6 +280,7 @@ async def choose_category_any(callback: CallbackQuery, state: FSMContext) -> Non
 
 @router.callback_query(F.data == "ch_general", AddOpStates.choosing_channels)
 async def choose_general(callback: CallbackQuery, state: FSMContext) -> None:
+    await get_edit_debouncer().cancel(callback.message)
     await state.update_data(is_general=True, channel_ids=[])
     await state.set_state(AddOpStates.entering_amount)
     await callback.message.edit_text("Введите сумму, например: 1200, 1200.50 или 1 200,50:")
@@ -274,27 +301,68 @@ async def toggle_channel(callback: CallbackQuery, state: FSMContext) -> None:
     else:
         selected.append(ch_id)
     await state.update_data(channel_ids=selected, is_general=False)
-    with session_scope() as s:
-        q = (
-            s.query(Channel)
-            .filter(Channel.is_active.is_(True))
-            .order_by(Channel.created_at.desc())
-            .limit(25)
-        )
-        ch_items = [(ch.id, ch.title) for ch in q.all()]
-    await callback.message.edit_text(
-        _channels_prompt(selected),
-        reply_markup=channels_kb(ch_items, selected_ids=selected),
-    )
+    # Rapid taps collapse into one edit; tapping a channel twice ends up with no edit at all
+    await _refresh_channels(callback, state)
     await callback.answer("Готово")
 
 
+@router.callback_query(F.data.startswith("ch_pg:"), AddOpStates.choosing_channels)
+async def channels_page(callback: CallbackQuery, state: FSMContext) -> None:
+    parts = callback.data.split(":")
+    if len(parts) != 3 or parts[1] not in ("n", "p") or not parts[2].isdigit():
+        # Page counter button
+        await callback.answer()
+        return
+    cursor = int(parts[2])
+    data = await state.get_data()
+    selected = [int(cid) for cid in (data.get("channel_ids") or [])]
+    page = (await catalog_snapshot()).channel_page(
+        after_id=cursor if parts[1] == "n" else None,
+        before_id=cursor if parts[1] == "p" else None,
+        prefix=data.get("ch_query") or "",
+        only_ids=selected if data.get("ch_selected_only") else None,
+    )
+    await state.update_data(ch_after=page.after_id)
+    await _refresh_channels(callback, state)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("ch_view:"), AddOpStates.choosing_channels)
+async def channels_view_mode(callback: CallbackQuery, state: FSMContext) -> None:
+    await state.update_data(ch_selected_only=callback.data == "ch_view:selected", ch_after=None)
+    await _refresh_channels(callback, state)
+    await callback.answer()
+
+
+@router.callback_query(F.data == "ch_search", AddOpStates.choosing_channels)
+async def channels_search_hint(callback: CallbackQuery) -> None:
+    await callback.answer("Отправьте сообщением начало названия канала", show_alert=True)
+
+
+@router.callback_query(F.data == "ch_search:clear", AddOpStates.choosing_channels)
+async def channels_search_clear(callback: CallbackQuery, state: FSMContext) -> None:
+    await state.update_data(ch_query=None, ch_after=None)
+    await _refresh_channels(callback, state)
+    await callback.answer()
+
+
+@router.message(
+    AddOpStates.choosing_channels, F.text, ~F.text.startswith("/"), ~F.forward_from_chat
+)
+async def channels_search(message: Message, state: FSMContext) -> None:
+    query = (message.text or "").strip()[:32]
+    await state.update_data(ch_query=query or None, ch_after=None, ch_selected_only=False)
+    text, kb = await _channels_view(state)
+    await message.answer(text, reply_markup=kb)
+
+
 @router.callback_query(F.data == "ch_done", AddOpStates.choosing_channels)
 async def channels_done(callback: CallbackQuery, state: FSMContext) -> None:
     data = await state.get_data()
     if not data.get("is_general") and not data.get("channel_ids"):
         await callback.answer("Выберите хотя бы один канал или 'Без канала'", show_alert=True)
         return
+    await get_edit_debouncer().cancel(callback.message)
     await state.set_state(AddOpStates.entering_amount)
     await callback.message.edit_text("Введите сумму, например: 1200, 1200.50 или 1 200,50:")
     await callback.answer()
@@ -306,20 +374,10 @@ async def enter_reason(message: Message, state: FSMContext) -> None:
     if not text:
         await message.answer("Пояснение обязательно. Введите текст:")
         return
-    await state.update_data(free_text_reason=text)
+    await state.update_data(free_text_reason=text, ch_after=None, ch_query=None, ch_selected_only=False)
     await state.set_state(AddOpStates.choosing_channels)
-    with session_scope() as s:
-        q = (
-            s.query(Channel)
-            .filter(Channel.is_active.is_(True))
-            .order_by(Channel.created_at.desc())
-            .limit(25)
-        )
-        ch_items = [(ch.id, ch.title) for ch in q.all()]
-    await message.answer(
-        "Выберите каналы (мультивыбор), затем нажмите Готово:",
-        reply_markup=channels_kb(ch_items),
-    )
+    prompt, kb = await _channels_view(state)
+    await message.answer(prompt, reply_markup=kb)
 
 
 @router.message(AddOpStates.entering_amount)
@@ -378,72 +436,132 @@ async def cancel(callback: CallbackQuery, state: FSMContext) -> None:
     await callback.answer()
 
 
+def _is_dedup_conflict(e: IntegrityError) -> bool:
+    # psycopg names the violated constraint; other drivers only have the message
+    constraint = getattr(getattr(e.orig, "diag", None), "constraint_name", None)
+    if constraint:
+        return constraint == "uq_operations_dedup_hash"
+    return "dedup_hash" in str(e.orig)
+
+
 @router.callback_query(F.data == "confirm", AddOpStates.confirming)
-async def confirm(callback: CallbackQuery, state: FSMContext) -> None:
+async def confirm(
+    callback: CallbackQuery,
+    state: FSMContext,
+    uow: UnitOfWork,
+    db_user_id: int | None = None,
+) -> None:
     user = callback.from_user
     if not user:
         await callback.answer("Техническая ошибка")
         return
     data = await state.get_data()
-    with session_scope() as s:
-        cat = s.query(Category).filter(Category.id == data["category_id"]).one()
-        db_user = s.query(User).filter(User.tg_user_id == user.id).one()
-        created_at = now_msk()
-        dedup = build_dedup_hash(
-            tg_user_id=user.id,
-            op_type=int(data["op_type"]),
-            category_code=cat.code,
-            amount_kop=int(data["amount_kop"]),
-            channel_ids=[int(cid) for cid in (data.get("channel_ids") or [])],
-            is_general=bool(data.get("is_general")),
-            created_at=created_at,
-        )
-        op = Operation(
-            created_at=created_at,
-            op_type=int(data["op_type"]),
-            category_id=cat.id,
-            amount_kop=int(data["amount_kop"]),
-            currency="RUB",
-            free_text_reason=(data.get("free_text_reason") or None),
-            receipt_url=(data.get("receipt_url") or None),
-            comment=(data.get("comment") or None),
-            created_by_user_id=db_user.id,
-            is_general=bool(data.get("is_general")),
-            dedup_hash=dedup,
-        )
-        try:
+    cat = (await catalog_snapshot()).categories_by_id.get(int(data["category_id"]))
+    if cat is None:
+        await callback.answer("Нет такой категории", show_alert=True)
+        return
+    s = uow.session
+    if db_user_id is None:
+        db_user_id = s.query(User.id).filter(User.tg_user_id == user.id).scalar()
+    created_at = now_msk()
+    dedup = build_dedup_hash(
+        tg_user_id=user.id,
+        op_type=int(data["op_type"]),
+        category_code=cat.code,
+        amount_kop=int(data["amount_kop"]),
+        channel_ids=[int(cid) for cid in (data.get("channel_ids") or [])],
+        is_general=bool(data.get("is_general")),
+        created_at=created_at,
+    )
+    op = Operation(
+        created_at=created_at,
+        op_type=int(data["op_type"]),
+        category_id=cat.id,
+        amount_kop=int(data["amount_kop"]),
+        currency="RUB",
+        free_text_reason=(data.get("free_text_reason") or None),
+        receipt_url=(data.get("receipt_url") or None),
+        comment=(data.get("comment") or None),
+        created_by_user_id=db_user_id,
+        is_general=bool(data.get("is_general")),
+        dedup_hash=dedup,
+    )
+    try:
+        # Savepoint: a duplicate must only undo this insert, not the whole update
+        with s.begin_nested():
             s.add(op)
             s.flush()
-            for ch_id in (data.get("channel_ids") or []):
-                s.execute(OperationChannel.insert().values(operation_id=op.id, channel_id=int(ch_id)))
-            s.flush()
-        except IntegrityError:
-            s.rollback()
-            existing = s.query(Operation).filter(Operation.dedup_hash == dedup).one_or_none()
-            if existing:
-                res = s.execute(
-                    OperationChannel.select().where(OperationChannel.c.operation_id == existing.id)
-                )
-                channels_count = len(list(res))
-                if existing.op_type == OperationType.INCOME.value:
-                    op_type_txt = "Доход"
-                elif existing.op_type == OperationType.PERSONAL_INVEST.value:
-                    op_type_txt = "Личные вложения"
-                else:
-                    op_type_txt = "Расход"
-                rub = existing.amount_kop // 100
-                await callback.message.edit_text(
-                    f"Дубликат: уже есть операция #{existing.id}\n"
-                    f"Тип: {op_type_txt}\nКатегория: {cat.name}\n"
-                    f"Сумма: {rub} RUB\nОбщая: {'да' if existing.is_general else 'нет'}\n"
-                    f"Каналов: {channels_count}"
+            ch_ids = [int(ch_id) for ch_id in (data.get("channel_ids") or [])]
+            if ch_ids:
+                # Single executemany instead of one INSERT per selected channel
+                s.execute(
+                    OperationChannel.insert(),
+                    [{"operation_id": op.id, "channel_id": ch_id} for ch_id in ch_ids],
                 )
+        duplicate_text: str | None = None
+    except IntegrityError as e:
+        if not _is_dedup_conflict(e):
+            raise
+        existing = s.query(Operation).filter(Operation.dedup_hash == dedup).one_or_none()
+        if existing:
+            res = s.execute(
+                OperationChannel.select().where(OperationChannel.c.operation_id == existing.id)
+            )
+            channels_count = len(list(res))
+            if existing.op_type == OperationType.INCOME.value:
+                op_type_txt = "Доход"
+            elif existing.op_type == OperationType.PERSONAL_INVEST.value:
+                op_type_txt = "Личные вложения"
             else:
-                await callback.message.edit_text("Похоже, такая операция уже была сохранена (дубликат).")
-            await state.clear()
-            await callback.answer()
-            return
+                op_type_txt = "Расход"
+            rub = existing.amount_kop // 100
+            duplicate_text = (
+                f"Дубликат: уже есть операция #{existing.id}\n"
+                f"Тип: {op_type_txt}\nКатегория: {cat.name}\n"
+                f"Сумма: {rub} RUB\nОбщая: {'да' if existing.is_general else 'нет'}\n"
+                f"Каналов: {channels_count}"
+            )
+        else:
+            duplicate_text = "Похоже, такая операция уже была сохранена (дубликат)."
+    # Make sure the operation is durable and the connection is released before talking to Telegram
+    uow.commit()
+
+    await state.clear()
+    if duplicate_text is not None:
+        await callback.message.edit_text(duplicate_text)
+    else:
+        await callback.message.edit_text("Операция сохранена.", reply_markup=back_to_main_menu_kb())
+    await callback.answer()
+
+
+@router.callback_query(F.data == "cancel", AddOpStates.confirming_batch)
+async def cancel_batch(callback: CallbackQuery, state: FSMContext) -> None:
+    await state.clear()
+    await callback.message.edit_text("Операции не сохранены.")
+    await callback.answer()
+
+
+@router.callback_query(F.data == "confirm", AddOpStates.confirming_batch)
+async def confirm_batch(
+    callback: CallbackQuery,
+    state: FSMContext,
+    uow: UnitOfWork,
+    db_user_id: int | None = None,
+) -> None:
+    user = callback.from_user
+    if not user:
+        await callback.answer("Техническая ошибка")
+        return
+    ops = [QuickOperation.from_dict(item) for item in (await state.get_data()).get("batch") or []]
+    s = uow.session
+    if db_user_id is None:
+        db_user_id = s.query(User.id).filter(User.tg_user_id == user.id).scalar()
+    inserted, duplicates = insert_operations(s, ops, tg_user_id=user.id, db_user_id=db_user_id, created_at=now_msk())
+    uow.commit()
 
     await state.clear()
-    await callback.message.edit_text("Операция сохранена.", reply_markup=back_to_main_menu_kb())
+    text = f"Сохранено операций: {inserted}."
+    if duplicates:
+        text += f"\nПропущено дубликатов: {duplicates}."
+    await callback.message.edit_text(text, reply_markup=back_to_main_menu_kb())
     await callback.answer()
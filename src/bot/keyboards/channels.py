@@ -35,3 +35,89 @@ def channels_inline_menu_kb() -> InlineKeyboardMarkup:
     )
 
 
+CHANNEL_LIST_FILTERS = {
+    "all": "Все",
+    "active": "Активные",
+    "paused": "На паузе",
+    "failing": "Ошибки",
+}
+
+
+def channel_list_kb(
+    rows: list[tuple[int, bool]],
+    flt: str,
+    cursor: str,
+    prev_cursor: str | None = None,
+    next_cursor: str | None = None,
+) -> InlineKeyboardMarkup:
+    # rows: (channel id, is_active) in the order they are numbered in the message text
+    buttons: list[list[InlineKeyboardButton]] = []
+    for n, (ch_id, is_active) in enumerate(rows, start=1):
+        buttons.append(
+            [
+                InlineKeyboardButton(
+                    text=f"{n}. {'⏸ Пауза' if is_active else '▶️ Включить'}",
+                    callback_data=f"chl_t:{ch_id}:{flt}:{cursor}",
+                ),
+                InlineKeyboardButton(text=f"{n}. 🗑", callback_data=f"chl_d:{ch_id}:{flt}:{cursor}"),
+            ]
+        )
+    nav: list[InlineKeyboardButton] = []
+    if prev_cursor is not None:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"chl:{flt}:{prev_cursor}"))
+    if next_cursor is not None:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"chl:{flt}:{next_cursor}"))
+    if nav:
+        buttons.append(nav)
+    buttons.append(
+        [
+            InlineKeyboardButton(text=f"{'• ' if key == flt else ''}{title}", callback_data=f"chl:{key}:")
+            for key, title in CHANNEL_LIST_FILTERS.items()
+        ]
+    )
+    buttons.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="channels:menu")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+HISTORY_OP_TYPE_BUTTONS = (
+    (None, "Все"),
+    (1, "Доходы"),
+    (2, "Расходы"),
+    (3, "Вложения"),
+)
+
+
+def operations_history_kb(
+    filters_by_op_type: list[tuple[str, str]],
+    flt: str,
+    prev_cursor: str | None = None,
+    next_cursor: str | None = None,
+) -> InlineKeyboardMarkup:
+    # filters_by_op_type: (button text, encoded filter); cursors: "a<id>" / "b<id>"
+    buttons: list[list[InlineKeyboardButton]] = []
+    nav: list[InlineKeyboardButton] = []
+    if prev_cursor is not None:
+        nav.append(InlineKeyboardButton(text="◀️ Новее", callback_data=f"oh:{prev_cursor}:{flt}"))
+    if next_cursor is not None:
+        nav.append(InlineKeyboardButton(text="Старее ▶️", callback_data=f"oh:{next_cursor}:{flt}"))
+    if nav:
+        buttons.append(nav)
+    buttons.append(
+        [InlineKeyboardButton(text=text, callback_data=f"oh::{encoded}") for text, encoded in filters_by_op_type]
+    )
+    buttons.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="channels:menu")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def search_results_kb(
+    query_id: str, prev_offset: int | None = None, next_offset: int | None = None
+) -> InlineKeyboardMarkup:
+    nav: list[InlineKeyboardButton] = []
+    if prev_offset is not None:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"find:{query_id}:{prev_offset}"))
+    if next_offset is not None:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"find:{query_id}:{next_offset}"))
+    buttons = [nav] if nav else []
+    buttons.append([InlineKeyboardButton(text="🏠 Главное меню", callback_data="channels:menu")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
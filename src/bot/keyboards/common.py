@@ -39,8 +39,13 @@ def channels_kb(
     channels: Iterable[tuple[int, str | None]],
     selected_ids: _Iterable[int] | None = None,
     page: int = 1,
+    pages: int = 1,
+    prev_cursor: int | None = None,
+    next_cursor: int | None = None,
+    query: str | None = None,
+    selected_only: bool = False,
 ) -> InlineKeyboardMarkup:
-    # channels: (id, title)
+    # channels: (id, title) of the current page; cursors are channel ids for keyset paging
     selected_set = set(selected_ids or [])
     rows: list[list[InlineKeyboardButton]] = []
     for ch_id, title in channels:
@@ -48,6 +53,26 @@ def channels_kb(
         if ch_id in selected_set:
             text = f"✅ {text}"
         rows.append([InlineKeyboardButton(text=text, callback_data=f"ch:{ch_id}")])
+    if pages > 1:
+        nav: list[InlineKeyboardButton] = []
+        if prev_cursor is not None:
+            nav.append(InlineKeyboardButton(text="◀️", callback_data=f"ch_pg:p:{prev_cursor}"))
+        nav.append(InlineKeyboardButton(text=f"{page}/{pages}", callback_data="ch_pg:noop"))
+        if next_cursor is not None:
+            nav.append(InlineKeyboardButton(text="▶️", callback_data=f"ch_pg:n:{next_cursor}"))
+        rows.append(nav)
+    filters: list[InlineKeyboardButton] = []
+    if query:
+        filters.append(InlineKeyboardButton(text=f"✖️ «{query}»", callback_data="ch_search:clear"))
+    else:
+        filters.append(InlineKeyboardButton(text="🔎 Поиск", callback_data="ch_search"))
+    if selected_only:
+        filters.append(InlineKeyboardButton(text="Все каналы", callback_data="ch_view:all"))
+    else:
+        filters.append(
+            InlineKeyboardButton(text=f"Выбранные ({len(selected_set)})", callback_data="ch_view:selected")
+        )
+    rows.append(filters)
     rows.append([InlineKeyboardButton(text="Без канала (общая)", callback_data="ch_general")])
     rows.append([InlineKeyboardButton(text="Готово", callback_data="ch_done")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -5,6 +5,7 @@ import logging
 import os
 import signal
 from contextlib import suppress
+from datetime import timedelta
 
 # Load .env if present
 try:
@@ -14,24 +15,49 @@ except Exception:
     pass
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from bot.settings import Settings, setup_logging
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from bot.settings import Settings, setup_logging, stop_logging
 from bot.services.mtproto_client import init_telethon, shutdown_telethon
-from bot.services.scheduler import add_daily_job, shutdown_scheduler
+from bot.services.scheduler import add_daily_job, add_error_summary_job, shutdown_scheduler
+from bot.services.error_aggregator import flush_error_summaries
+from bot.services.http_server import get_http_app, shutdown_http_server, start_http_server
+from bot.services.tracing import init_tracing, shutdown_tracing
 from bot.middlewares import (
+    DbSessionMiddleware,
     ErrorLoggingMiddleware,
+    FsmFlushMiddleware,
+    HandlerMetricsMiddleware,
+    KeyedSerializerMiddleware,
+    ReleaseDbSessionRequestMiddleware,
     LoggingMiddleware,
     RateLimitMiddleware,
+    TimedMiddleware,
     WhitelistMiddleware,
 )
+from bot.handlers import admin as admin_handlers
 from bot.handlers import commands as commands_handlers
 from bot.handlers import flow_add_operation as flow_handlers
 from bot.handlers import channels as channels_handlers
+from bot.handlers import data_io as data_io_handlers
 from bot.db.base import init_engine, ensure_schema, session_scope
+from bot.db.fsm_storage import PostgresStorage
+from bot.db.instrumentation import install_await_detector
 from bot.types.enums import DEFAULT_CATEGORY_SEED
 from bot.db.models import Category, Channel
 from bot.services.time import now_msk
+from bot.services.user_cache import warm_known_users
+from bot.services.catalog import (
+    invalidate_catalog,
+    start_catalog_listener,
+    stop_catalog_listener,
+    warm_catalog,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +67,9 @@ async def on_startup(dp: Dispatcher, settings: Settings) -> None:
     run_migrations(settings)
     seed_categories()
     deactivate_legacy_seeded_channels()
+    warm_known_users()
+    warm_catalog()
+    start_catalog_listener()
     # Initialize Telethon client
     await init_telethon(settings)
     logger.info("Bot is ready")
@@ -69,6 +98,7 @@ def seed_categories() -> None:
         for code, name in DEFAULT_CATEGORY_SEED:
             s.add(Category(code=code, name=name, is_active=True))
         s.flush()
+        invalidate_catalog(s)
 
 
 def deactivate_legacy_seeded_channels() -> None:
@@ -85,6 +115,7 @@ def deactivate_legacy_seeded_channels() -> None:
             ch.is_active = False
             changed += 1
         if changed:
+            invalidate_catalog(s)
             logger.info("Deactivated %s legacy channels (no added_by_user_id)", changed)
 
 
@@ -93,39 +124,86 @@ async def main() -> None:
     setup_logging(settings.log_level)
     logger.info("Starting bot with tz=%s", settings.tz)
 
-    init_engine(settings.database_url)
+    init_engine(
+        settings.database_url,
+        slow_query_ms=settings.db_slow_query_ms,
+        read_only_url=settings.database_url_ro,
+        replica_max_lag_seconds=settings.db_replica_max_lag_seconds,
+    )
+
+    if settings.trace_file:
+        init_tracing(settings.trace_file, settings.trace_format)
+
+    if settings.debug_db_awaits:
+        install_await_detector(asyncio.get_running_loop())
+
+    if settings.fsm_storage == "postgres":
+        # Survives restarts; flushed on dispatcher shutdown
+        storage: BaseStorage = PostgresStorage(
+            ttl=timedelta(hours=settings.fsm_state_ttl_hours),
+            cache_seconds=settings.fsm_cache_seconds,
+        )
+    else:
+        storage = MemoryStorage()
+    session = None
+    if settings.bot_api_base_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.bot_api_base_url))
+    bot = Bot(token=settings.bot_token, session=session)
+    # Never hold a DB connection while waiting on the Bot API
+    bot.session.middleware(ReleaseDbSessionRequestMiddleware(strict=settings.debug_db_awaits))
+    # Settings are available to handlers and filters as the ``settings`` argument
+    dp = Dispatcher(storage=storage, settings=settings)
+
+    # Outermost: updates of one chat/user run one at a time and in order, others concurrently
+    dp.update.outer_middleware(
+        KeyedSerializerMiddleware(
+            max_concurrent=settings.update_concurrency,
+            max_per_key=settings.update_queue_per_user,
+        )
+    )
 
-    storage = MemoryStorage()
-    bot = Bot(token=settings.bot_token)
-    dp = Dispatcher(storage=storage)
+    if isinstance(storage, PostgresStorage) and storage.write_through:
+        # Inside the serializer: the user's next update starts only after the flush
+        dp.update.outer_middleware(FsmFlushMiddleware(storage))
 
-    # Middlewares order: error logging -> logging -> rate limit -> whitelist
-    # Update-level middlewares to ensure we log every incoming update
+    # Middlewares order: error logging -> logging (update level, once per update)
+    # -> handler metrics -> rate limit -> db session -> whitelist (message/callback level)
     dp.update.middleware(ErrorLoggingMiddleware())
-    dp.update.middleware(LoggingMiddleware())
+    dp.update.middleware(TimedMiddleware(LoggingMiddleware()))
 
     # Fallback errors handler at dispatcher level (logs any unhandled exceptions)
     async def _errors_handler(event, exception):  # type: ignore[no-redef]
-        logging.getLogger(__name__).exception("Unhandled error: %s", exception)
-        logging.getLogger().exception("Unhandled error (root): %s", exception)
+        logger.exception("Unhandled error: %s", exception)
         return True
 
-
     dp.errors.register(_errors_handler)  # type: ignore[attr-defined]
 
+    # One limiter for both event types so that budgets are shared
+    rate_limiter = TimedMiddleware(
+        RateLimitMiddleware(
+            user_rate=settings.rate_limit_user_rate,
+            user_burst=settings.rate_limit_burst,
+            chat_rate=settings.rate_limit_chat_rate,
+            chat_burst=settings.rate_limit_burst,
+            global_rate=settings.rate_limit_global_rate,
+            global_burst=max(settings.rate_limit_burst, int(settings.rate_limit_global_rate)),
+            policy=settings.rate_limit_policy,
+        )
+    )
+    handler_metrics = HandlerMetricsMiddleware()
+    db_session = TimedMiddleware(DbSessionMiddleware())
+    whitelist = TimedMiddleware(WhitelistMiddleware(settings))
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(handler_metrics)
+        observer.middleware(rate_limiter)
+        observer.middleware(db_session)
+        observer.middleware(whitelist)
 
-    dp.message.middleware(ErrorLoggingMiddleware())
-    dp.callback_query.middleware(ErrorLoggingMiddleware())
-    dp.message.middleware(LoggingMiddleware())
-    dp.callback_query.middleware(LoggingMiddleware())
-    dp.message.middleware(RateLimitMiddleware())
-    dp.callback_query.middleware(RateLimitMiddleware())
-    dp.message.middleware(WhitelistMiddleware(settings))
-    dp.callback_query.middleware(WhitelistMiddleware(settings))
-
+    dp.include_router(admin_handlers)
     dp.include_router(commands_handlers)
     dp.include_router(flow_handlers)
     dp.include_router(channels_handlers)
+    dp.include_router(data_io_handlers)
 
     # Graceful shutdown on Ctrl+C / SIGTERM
     stop_event = asyncio.Event()
@@ -141,20 +219,52 @@ async def main() -> None:
     except Exception:
         pass
 
+    # Only ask Telegram for update types some router actually handles
+    allowed_updates = dp.resolve_used_update_types()
+
     try:
-        # Ensure no webhook blocks polling
-        with suppress(Exception):
-            await bot.delete_webhook(drop_pending_updates=False)
+        if settings.bot_mode == "polling":
+            # Ensure no webhook blocks polling
+            with suppress(Exception):
+                await bot.delete_webhook(drop_pending_updates=False)
         await on_startup(dp, settings)
         # Re-apply logging configuration after migrations in case Alembic altered handlers
         setup_logging(settings.log_level)
         # Schedule daily job
         add_daily_job(bot)
-        # Run polling synchronously so stdout/file logging flushes in-order
-        await dp.start_polling(bot)
+        add_error_summary_job()
+        if settings.bot_mode == "webhook":
+            app = get_http_app()
+            SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=settings.webhook_secret).register(
+                app, path=settings.webhook_path
+            )
+            # Dispatcher startup/shutdown (incl. FSM storage flush) follow the HTTP app lifecycle
+            setup_application(app, dp, bot=bot)
+            await start_http_server(settings.http_host, settings.http_port)
+            await bot.set_webhook(
+                url=f"{settings.webhook_url}{settings.webhook_path}",
+                secret_token=settings.webhook_secret,
+                allowed_updates=allowed_updates,
+                drop_pending_updates=False,
+            )
+            logger.info(
+                "Webhook mode: %s%s allowed_updates=%s",
+                settings.webhook_url,
+                settings.webhook_path,
+                allowed_updates,
+            )
+            # The webhook is kept on shutdown so Telegram buffers updates during restarts
+            await stop_event.wait()
+        else:
+            if settings.http_port:
+                await start_http_server(settings.http_host, settings.http_port)
+            await dp.start_polling(bot, allowed_updates=allowed_updates)
     except KeyboardInterrupt:
         logger.info("Interrupted, shutting down...")
     finally:
+        # Stop accepting webhook updates first
+        with suppress(Exception):
+            await shutdown_http_server()
         with suppress(Exception):
             await bot.session.close()
         # Shutdown Telethon
@@ -163,6 +273,12 @@ async def main() -> None:
         # Shutdown scheduler
         with suppress(Exception):
             shutdown_scheduler()
+        with suppress(Exception):
+            await asyncio.to_thread(stop_catalog_listener)
+        shutdown_tracing()
+        # Repeat counts still pending would be lost with the process
+        flush_error_summaries(force=True)
+        stop_logging()
 
 
 if __name__ == "__main__":
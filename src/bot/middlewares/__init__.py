@@ -2,3 +2,7 @@ from .error_logging import ErrorLoggingMiddleware  # noqa: F401
 from .logging import LoggingMiddleware  # noqa: F401
 from .whitelist import WhitelistMiddleware  # noqa: F401
 from .rate_limit import RateLimitMiddleware  # noqa: F401
+from .db_session import DbSessionMiddleware, ReleaseDbSessionRequestMiddleware  # noqa: F401
+from .metrics import HandlerMetricsMiddleware, TimedMiddleware  # noqa: F401
+from .serializer import KeyedSerializerMiddleware  # noqa: F401
+from .fsm_flush import FsmFlushMiddleware  # noqa: F401
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject
+
+from bot.db.base import (
+    UnitOfWork,
+    current_unit_of_work,
+    reset_current_unit_of_work,
+    set_current_unit_of_work,
+)
+from bot.db.instrumentation import current_handler, reset_current_handler, set_current_handler
+
+logger = logging.getLogger()
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Provide a lazily opened unit of work to handlers as ``uow``.
+
+    Middlewares and handlers of the same update share one session and one transaction
+    instead of opening a separate ``session_scope()`` per lookup.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        uow = UnitOfWork()
+        data["uow"] = uow
+        handler_obj = data.get("handler")
+        callback = getattr(handler_obj, "callback", None)
+        handler_token = set_current_handler(getattr(callback, "__qualname__", None))
+        uow_token = set_current_unit_of_work(uow)
+        try:
+            result = await handler(event, data)
+            uow.commit()
+            return result
+        except Exception:
+            uow.rollback()
+            raise
+        finally:
+            uow.close()
+            reset_current_unit_of_work(uow_token)
+            reset_current_handler(handler_token)
+
+
+class ReleaseDbSessionRequestMiddleware(BaseRequestMiddleware):
+    """Bot API request middleware: hand a read-only update's connection back before any API call.
+
+    Keeps pool connections from being held while waiting on Telegram. A transaction with
+    writes is never committed here (the update must stay all-or-nothing); handlers should
+    commit their writes before talking to Telegram. Such calls are logged, or raise with
+    ``strict`` (``DEBUG_DB_AWAITS``).
+    """
+
+    def __init__(self, strict: bool = False) -> None:
+        self.strict = strict
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        uow = current_unit_of_work()
+        if uow is not None and not uow.release():
+            where = current_handler() or "?"
+            if self.strict:
+                raise RuntimeError(f"{where}: Bot API call {type(method).__name__} with uncommitted writes")
+            logger.warning(
+                "Bot API call %s with uncommitted writes in %s; connection held until the update ends",
+                type(method).__name__,
+                where,
+            )
+        return await make_request(bot, method)
@@ -1,17 +1,17 @@
 from __future__ import annotations
 
-import logging
 from typing import Any, Awaitable, Callable
 
 from aiogram import BaseMiddleware
-from aiogram.fsm.context import FSMContext
-from aiogram.types import TelegramObject, Message, CallbackQuery
+from aiogram.types import TelegramObject, Message, CallbackQuery, Update
 
-
-logger = logging.getLogger()
+from bot.middlewares.logging import fsm_state_name, update_meta
+from bot.services.error_aggregator import report_error
 
 
 class ErrorLoggingMiddleware(BaseMiddleware):
+    """Update-level middleware: log handler errors once and notify the user."""
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
@@ -21,60 +21,26 @@ class ErrorLoggingMiddleware(BaseMiddleware):
         try:
             return await handler(event, data)
         except Exception as exc:
-            # Log exception with full traceback using module logger and root logger
-            user_id: int | None = None
-            chat_id: int | None = None
-            payload: str | None = None
-
-            if isinstance(event, Message):
-                user_id = event.from_user.id if event.from_user else None
-                chat_id = event.chat.id if event.chat else None
-                payload = event.text or event.caption
-            elif isinstance(event, CallbackQuery):
-                user_id = event.from_user.id if event.from_user else None
-                chat_id = event.message.chat.id if event.message and event.message.chat else None
-                payload = event.data
-
-            state: FSMContext | None = data.get("state")
-            state_name: str | None = None
-            if state is not None:
-                try:
-                    state_name = await state.get_state()
-                except Exception:
-                    state_name = None
-
-            logger.exception(
-                "handler error user_id=%s chat_id=%s state=%s payload=%s",
-                user_id,
-                chat_id,
-                state_name,
-                (payload or ""),
-            )
-            # Duplicate to root logger to avoid misconfiguration issues
-            import logging as _logging
-            _logging.getLogger().exception(
-                "handler error (root) user_id=%s chat_id=%s state=%s payload=%s",
-                user_id,
-                chat_id,
-                state_name,
-                (payload or ""),
+            meta = update_meta(event, data) if isinstance(event, Update) else {}
+            # Full traceback only for the first occurrence of each distinct failure
+            report_error(
+                exc,
+                "handler error update_id=%s user_id=%s chat_id=%s state=%s payload=%s",
+                meta.get("update_id"),
+                meta.get("user_id"),
+                meta.get("chat_id"),
+                await fsm_state_name(data),
+                meta.get("payload", ""),
             )
-            # Force flush all handlers
-            for _h in _logging.getLogger().handlers:
-                try:
-                    _h.flush()
-                except Exception:
-                    pass
 
             # Best-effort user notification, but do not raise further
+            target = event.event if isinstance(event, Update) else event
             try:
-                if isinstance(event, CallbackQuery):
-                    await event.answer("Произошла ошибка. Попробуйте ещё раз.", show_alert=True)
-                elif isinstance(event, Message):
-                    await event.answer("Произошла ошибка. Попробуйте ещё раз.")
+                if isinstance(target, CallbackQuery):
+                    await target.answer("Произошла ошибка. Попробуйте ещё раз.", show_alert=True)
+                elif isinstance(target, Message):
+                    await target.answer("Произошла ошибка. Попробуйте ещё раз.")
             except Exception:
                 pass
 
             return None
-
-
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.db.fsm_storage import PostgresStorage
+
+logger = logging.getLogger()
+
+
+class FsmFlushMiddleware(BaseMiddleware):
+    """Update-level middleware: write FSM changes to the table before the update ends.
+
+    Used when ``PostgresStorage`` runs without a local cache (several replicas), instead of
+    waiting for the delayed background flush.
+    """
+
+    def __init__(self, storage: PostgresStorage) -> None:
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            try:
+                await self.storage.flush()
+            except Exception:
+                # Entries stay dirty; the storage's delayed flush retries them
+                logger.exception("FSM write-through flush failed")
@@ -1,50 +1,115 @@
 from __future__ import annotations
 
 import logging
+import time
 from typing import Any, Awaitable, Callable
 
 from aiogram import BaseMiddleware
 from aiogram.fsm.context import FSMContext
-from aiogram.types import TelegramObject, Message, CallbackQuery
+from aiogram.types import TelegramObject, Message, CallbackQuery, Update
+
+from bot.db.base import get_engine
+from bot.db.instrumentation import format_pool_status, track_queries
+from bot.services.metrics import UPDATE_SECONDS
+from bot.services.tracing import span
 
 logger = logging.getLogger()
 
+_META_KEY = "update_meta"
+
+
+def update_meta(update: Update, data: dict[str, Any]) -> dict[str, Any]:
+    """Metadata of the update (ids, payload), extracted once and cached in ``data``."""
+    meta = data.get(_META_KEY)
+    if meta is not None:
+        return meta
+    event = update.event
+    user_id: int | None = None
+    chat_id: int | None = None
+    payload: str | None = None
+    if isinstance(event, Message):
+        user_id = event.from_user.id if event.from_user else None
+        chat_id = event.chat.id if event.chat else None
+        payload = event.text or event.caption
+    elif isinstance(event, CallbackQuery):
+        user_id = event.from_user.id if event.from_user else None
+        chat_id = event.message.chat.id if event.message and event.message.chat else None
+        payload = event.data
+    meta = {
+        "update_id": update.update_id,
+        "event_type": update.event_type,
+        "user_id": user_id,
+        "chat_id": chat_id,
+        "payload": payload or "",
+    }
+    data[_META_KEY] = meta
+    return meta
+
+
+async def fsm_state_name(data: dict[str, Any]) -> str | None:
+    state: FSMContext | None = data.get("state")  # aiogram injects if available
+    if state is None:
+        return None
+    try:
+        return await state.get_state()
+    except Exception:
+        return None
+
 
 class LoggingMiddleware(BaseMiddleware):
+    """Update-level middleware: one log record per update with its DB cost."""
+
     async def __call__(
         self,
         handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
         event: TelegramObject,
         data: dict[str, Any],
     ) -> Any:
-        user_id: int | None = None
-        chat_id: int | None = None
-        payload: str | None = None
-
-        if isinstance(event, Message):
-            user_id = event.from_user.id if event.from_user else None
-            chat_id = event.chat.id if event.chat else None
-            payload = event.text or event.caption
-        elif isinstance(event, CallbackQuery):
-            user_id = event.from_user.id if event.from_user else None
-            chat_id = event.message.chat.id if event.message and event.message.chat else None
-            payload = event.data
-
-        state: FSMContext | None = data.get("state")  # aiogram injects if available
-        state_name: str | None = None
-        if state is not None:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        meta = update_meta(event, data)
+        # Reading FSM state costs a storage round-trip; only do it when it will be logged
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "update id=%s type=%s user_id=%s chat_id=%s state=%s payload=%s",
+                meta["update_id"],
+                meta["event_type"],
+                meta["user_id"],
+                meta["chat_id"],
+                await fsm_state_name(data),
+                meta["payload"],
+                extra=meta,
+            )
+
+        # Aggregate DB cost of the whole update (all middlewares + handler)
+        started = time.perf_counter()
+        with span("update", update_id=event.update_id, event_type=event.event_type), track_queries(
+            f"update:{event.update_id}"
+        ) as stats:
             try:
-                cur = await state.get_state()
-                state_name = cur
-            except Exception:
-                state_name = None
-
-        logger.debug(
-            "update event=%s user_id=%s chat_id=%s state=%s payload=%s",
-            event.__class__.__name__,
-            user_id,
-            chat_id,
-            state_name,
-            (payload or ""),
-        )
-        return await handler(event, data)
+                return await handler(event, data)
+            finally:
+                took_ms = (time.perf_counter() - started) * 1000.0
+                UPDATE_SECONDS.observe(took_ms / 1000.0, event_type=event.event_type)
+                if logger.isEnabledFor(logging.DEBUG):
+                    try:
+                        pool_txt = format_pool_status(get_engine())
+                    except Exception:
+                        pool_txt = "-"
+                    logger.debug(
+                        "update done id=%s type=%s took_ms=%.1f queries=%s db_ms=%.1f checkouts=%s pool=%s",
+                        event.update_id,
+                        event.event_type,
+                        took_ms,
+                        stats.count,
+                        stats.total_ms,
+                        stats.checkouts,
+                        pool_txt,
+                        extra={
+                            **meta,
+                            "took_ms": round(took_ms, 1),
+                            "queries": stats.count,
+                            "db_ms": round(stats.total_ms, 1),
+                        },
+                    )
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot.services.metrics import HANDLER_ERRORS, HANDLER_SECONDS, MIDDLEWARE_SECONDS
+from bot.services.tracing import span
+
+
+def handler_name(data: dict[str, Any]) -> str:
+    callback = getattr(data.get("handler"), "callback", None)
+    return getattr(callback, "__qualname__", None) or "unknown"
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Observe per-handler latency; register first so it wraps the other inner middlewares."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        name = handler_name(data)
+        started = time.perf_counter()
+        try:
+            with span(f"handler {name}"):
+                return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+
+
+class TimedMiddleware(BaseMiddleware):
+    """Wrap a middleware and observe its own time, excluding the downstream chain."""
+
+    def __init__(self, middleware: Callable[..., Awaitable[Any]], name: str | None = None) -> None:
+        self.middleware = middleware
+        self.name = name or type(middleware).__name__
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        downstream = 0.0
+
+        async def _timed_handler(event_: TelegramObject, data_: dict[str, Any]) -> Any:
+            nonlocal downstream
+            started_ = time.perf_counter()
+            try:
+                return await handler(event_, data_)
+            finally:
+                downstream += time.perf_counter() - started_
+
+        started = time.perf_counter()
+        try:
+            with span(f"middleware {self.name}"):
+                return await self.middleware(_timed_handler, event, data)
+        finally:
+            MIDDLEWARE_SECONDS.observe(time.perf_counter() - started - downstream, middleware=self.name)
@@ -1,17 +1,142 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 import time
 from typing import Callable, Awaitable, Any, Dict
 
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
 
+from bot.services.metrics import RATE_LIMIT_BUCKETS, RATE_LIMIT_EVENTS
+
+logger = logging.getLogger()
+
+POLICY_DELAY = "delay"
+POLICY_DROP = "drop"
+POLICY_COALESCE = "coalesce"
+POLICIES = (POLICY_DELAY, POLICY_DROP, POLICY_COALESCE)
+
+
+class TokenBucket:
+    """Classic token bucket; tokens may go negative to reserve a delayed slot."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if available now)."""
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def is_idle(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.capacity
+
 
 class RateLimitMiddleware(BaseMiddleware):
-    def __init__(self, min_interval_seconds: float = 0.7):
-        self.min_interval = min_interval_seconds
-        self._last_call_by_user: Dict[int, float] = {}
+    """Per-user, per-chat and global token-bucket limiter.
+
+    Policies when a bucket is empty:
+    - ``delay``: reserve the next slot and wait for it (bounded by ``max_delay``, else drop)
+    - ``drop``: reject the event right away
+    - ``coalesce``: like ``delay``, but of several callbacks from one user waiting at once
+      only the latest one is processed
+
+    Idle buckets are evicted after ``idle_ttl`` seconds, so memory stays bounded.
+    """
+
+    def __init__(
+        self,
+        user_rate: float = 1.5,
+        user_burst: int = 3,
+        chat_rate: float = 1.5,
+        chat_burst: int = 3,
+        global_rate: float = 30.0,
+        global_burst: int = 30,
+        policy: str = POLICY_DELAY,
+        max_delay: float = 2.0,
+        idle_ttl: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown rate limit policy: {policy}")
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.policy = policy
+        self.max_delay = max_delay
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        now = clock()
+        self._global = TokenBucket(global_rate, global_burst, now)
+        self._buckets: Dict[tuple[str, int], TokenBucket] = {}
+        self._last_sweep = now
+        # Sequence number of the latest callback per user (for coalescing)
+        self._latest_seq: Dict[int, int] = {}
+        self._seq = 0
+
+    def _bucket(self, kind: str, key: int, now: float) -> TokenBucket:
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            if kind == "user":
+                bucket = TokenBucket(self.user_rate, self.user_burst, now)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst, now)
+            self._buckets[(kind, key)] = bucket
+            RATE_LIMIT_BUCKETS.set(len(self._buckets))
+        return bucket
+
+    def _sweep(self, now: float) -> None:
+        if now - self._last_sweep < self.idle_ttl:
+            return
+        self._last_sweep = now
+        stale = [
+            key
+            for key, bucket in self._buckets.items()
+            if now - bucket.updated_at >= self.idle_ttl and bucket.is_idle(now)
+        ]
+        for key in stale:
+            del self._buckets[key]
+            if key[0] == "user":
+                self._latest_seq.pop(key[1], None)
+        RATE_LIMIT_BUCKETS.set(len(self._buckets))
+
+    def acquire(self, user_id: int | None, chat_id: int | None) -> float:
+        """Reserve a slot in all relevant buckets; return the delay before it is usable.
+
+        Returns a negative value if the event must be dropped (nothing is reserved then).
+        """
+        now = self._clock()
+        self._sweep(now)
+        buckets = [self._global]
+        if user_id is not None:
+            buckets.append(self._bucket("user", user_id, now))
+        if chat_id is not None and chat_id != user_id:
+            buckets.append(self._bucket("chat", chat_id, now))
+        wait = max(b.wait_time(now) for b in buckets)
+        if wait > 0 and (self.policy == POLICY_DROP or wait > self.max_delay):
+            return -1.0
+        for b in buckets:
+            b.take()
+        return wait
 
     async def __call__(
         self,
@@ -20,17 +145,50 @@ class RateLimitMiddleware(BaseMiddleware):
         data: dict[str, Any],
     ) -> Any:
         user_id: int | None = None
-        if isinstance(event, Message) and event.from_user:
-            user_id = event.from_user.id
-        elif isinstance(event, CallbackQuery) and event.from_user:
-            user_id = event.from_user.id
+        chat_id: int | None = None
+        if isinstance(event, Message):
+            user_id = event.from_user.id if event.from_user else None
+            chat_id = event.chat.id if event.chat else None
+        elif isinstance(event, CallbackQuery):
+            user_id = event.from_user.id if event.from_user else None
+            chat_id = event.message.chat.id if event.message and event.message.chat else None
 
-        if user_id is not None:
-            now = time.monotonic()
-            last = self._last_call_by_user.get(user_id, 0.0)
-            delta = now - last
-            if delta < self.min_interval:
-                await asyncio.sleep(self.min_interval - delta)
-            self._last_call_by_user[user_id] = time.monotonic()
+        seq: int | None = None
+        if self.policy == POLICY_COALESCE and isinstance(event, CallbackQuery) and user_id is not None:
+            self._seq += 1
+            seq = self._seq
+            self._latest_seq[user_id] = seq
 
+        wait = self.acquire(user_id, chat_id)
+        if wait < 0:
+            RATE_LIMIT_EVENTS.inc(outcome="dropped")
+            logger.debug("rate limit: dropped event user_id=%s chat_id=%s", user_id, chat_id)
+            await self._reject(event)
+            return None
+        if wait > 0:
+            RATE_LIMIT_EVENTS.inc(outcome="throttled")
+            await asyncio.sleep(wait)
+            # With the keyed serializer in front, callbacks of one user reach us one by one,
+            # so a newer tap is only visible through its queue
+            is_superseded = data.get("is_superseded")
+            superseded = is_superseded() if callable(is_superseded) else self._latest_seq.get(user_id) != seq
+            if seq is not None and superseded:
+                # A newer callback from this user is queued behind us; let it win
+                RATE_LIMIT_EVENTS.inc(outcome="coalesced")
+                await self._reject(event, silent=True)
+                return None
+
+        RATE_LIMIT_EVENTS.inc(outcome="passed")
         return await handler(event, data)
+
+    @staticmethod
+    async def _reject(event: TelegramObject, silent: bool = False) -> None:
+        if not isinstance(event, CallbackQuery):
+            return
+        try:
+            if silent:
+                await event.answer()
+            else:
+                await event.answer("Слишком много запросов, подождите немного")
+        except Exception:
+            pass
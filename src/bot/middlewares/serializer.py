@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+from bot.services.metrics import counter, gauge, histogram
+
+logger = logging.getLogger()
+
+UPDATE_QUEUE_DEPTH = gauge("pnlbot_update_queue_depth", "Updates waiting for their user's previous update")
+UPDATES_IN_FLIGHT = gauge("pnlbot_updates_in_flight", "Updates currently being processed")
+UPDATE_QUEUE_WAIT = histogram(
+    "pnlbot_update_queue_wait_seconds",
+    "Time an update waited for its key and a concurrency slot",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+UPDATES_SHED = counter("pnlbot_updates_shed_total", "Updates dropped because queues were full", ["reason"])
+
+
+@dataclass
+class _KeyQueue:
+    # asyncio.Lock wakes waiters in FIFO order, which keeps per-key processing ordered
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    depth: int = 0
+    latest_callback: int = 0
+
+
+class KeyedSerializerMiddleware(BaseMiddleware):
+    """Outer update middleware: one update at a time per (chat, user), others concurrently.
+
+    - Updates of the same key run strictly in arrival order, so FSM transitions of a
+      flow never interleave (e.g. double-tapped inline buttons)
+    - At most ``max_concurrent`` updates run at once across all keys
+    - An update is shed when its key already has ``max_per_key`` queued updates or
+      ``max_total`` updates are waiting overall
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_per_key: int = 10, max_total: int = 1000) -> None:
+        self.max_per_key = max_per_key
+        self.max_total = max_total
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._queues: dict[Hashable, _KeyQueue] = {}
+        self._waiting = 0
+        self._seq = itertools.count(1)
+
+    @staticmethod
+    def _key(data: dict[str, Any]) -> Hashable | None:
+        # Filled by aiogram's UserContextMiddleware, which runs before any user middleware
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if user is None and chat is None:
+            return None
+        return (chat.id if chat else None, user.id if user else None)
+
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        key = self._key(data)
+        if key is None:
+            return await self._run(handler, event, data, time.perf_counter())
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _KeyQueue()
+        if queue.depth >= self.max_per_key:
+            return await self._shed(event, "per_key", key)
+        if self._waiting >= self.max_total:
+            return await self._shed(event, "total", key)
+
+        if isinstance(event, Update) and event.callback_query is not None:
+            # Lets later middlewares (rate limit coalescing) see that a newer tap is queued
+            seq = next(self._seq)
+            queue.latest_callback = seq
+            data["is_superseded"] = lambda: queue.latest_callback != seq
+
+        started = time.perf_counter()
+        queue.depth += 1
+        self._waiting += 1
+        UPDATE_QUEUE_DEPTH.inc()
+        waiting = True
+        try:
+            async with queue.lock:
+                waiting = False
+                self._waiting -= 1
+                UPDATE_QUEUE_DEPTH.dec()
+                return await self._run(handler, event, data, started)
+        finally:
+            if waiting:
+                # Cancelled while waiting for the key
+                self._waiting -= 1
+                UPDATE_QUEUE_DEPTH.dec()
+            queue.depth -= 1
+            if queue.depth == 0 and self._queues.get(key) is queue:
+                del self._queues[key]
+
+    async def _run(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+        started: float,
+    ) -> Any:
+        async with self._semaphore:
+            UPDATE_QUEUE_WAIT.observe(time.perf_counter() - started)
+            UPDATES_IN_FLIGHT.inc()
+            try:
+                return await handler(event, data)
+            finally:
+                UPDATES_IN_FLIGHT.dec()
+
+    async def _shed(self, event: TelegramObject, reason: str, key: Hashable) -> None:
+        UPDATES_SHED.inc(reason=reason)
+        logger.warning("Update shed: reason=%s key=%s waiting=%s", reason, key, self._waiting)
+        callback: CallbackQuery | None = event.callback_query if isinstance(event, Update) else None
+        if callback is not None:
+            try:
+                await callback.answer("Бот перегружен, повторите позже")
+            except Exception:
+                pass
+        return None
+
+
+__all__ = ["KeyedSerializerMiddleware"]
@@ -7,9 +7,8 @@ from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
 
 from bot.settings import Settings
-from bot.db.base import session_scope
-from bot.db.models import User
-from bot.services.time import now_msk
+from bot.db.base import UnitOfWork
+from bot.services.user_cache import ensure_user, get_known_user_cache
 
 logger = logging.getLogger()
 
@@ -49,19 +48,27 @@ class WhitelistMiddleware(BaseMiddleware):
             logger.warning("Rejected non-whitelisted user: %s", from_user_id)
             return
 
-        try:
-            with session_scope() as s:
-                user = s.query(User).filter(User.tg_user_id == from_user_id).one_or_none()
-                if user is None:
-                    user = User(
-                        tg_user_id=from_user_id,
-                        first_name=getattr(getattr(event, "from_user", None), "first_name", None),
-                        last_name=getattr(getattr(event, "from_user", None), "last_name", None),
-                        username=getattr(getattr(event, "from_user", None), "username", None),
-                        created_at=now_msk(),
+        # Known users cost no DB round-trip at all
+        db_user_id = get_known_user_cache().get(from_user_id)
+        if db_user_id is None:
+            from_user = getattr(event, "from_user", None)
+            uow: UnitOfWork = data["uow"]
+            try:
+                s = uow.session
+                # Savepoint: a failed insert must not poison the update's transaction
+                with s.begin_nested():
+                    db_user_id = ensure_user(
+                        s,
+                        from_user_id,
+                        first_name=getattr(from_user, "first_name", None),
+                        last_name=getattr(from_user, "last_name", None),
+                        username=getattr(from_user, "username", None),
                     )
-                    s.add(user)
-        except Exception:
-            logger.exception("Failed to upsert user")
+                # The user row is needed whatever the handler does; commit it before the
+                # handler's first Bot API call so the update's transaction stays read-only
+                uow.commit()
+            except Exception:
+                logger.exception("Failed to upsert user")
+        data["db_user_id"] = db_user_id
 
         return await handler(event, data)
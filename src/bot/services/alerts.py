@@ -5,9 +5,10 @@ import logging
 from aiogram import Bot
 from datetime import timezone, timedelta
 
-from bot.db.base import session_scope
+from bot.db.base import read_session_scope
 from bot.db.models import User, Channel, ChannelDailySnapshot, PostSnapshot, ChannelDailyChurn
-from sqlalchemy import func
+from sqlalchemy import case, func
+from bot.services.profiling import profiled
 from bot.services.time import now_msk
 
 logger = logging.getLogger()
@@ -21,13 +22,14 @@ async def notify_admins(bot: Bot, user_ids: list[int], text: str) -> None:
             logger.exception("Failed to send alert to %s", uid)
 
 
+@profiled("stats")
 async def build_stats_report_text() -> str:
     today = now_msk().date()
     now_moment = now_msk()
     now_utc = now_moment.astimezone(timezone.utc)
     horizons = [24, 48, 72]
 
-    with session_scope() as s:
+    with read_session_scope() as s:
         channels = (
             s.query(Channel)
             .filter(Channel.is_active.is_(True))
@@ -36,6 +38,58 @@ async def build_stats_report_text() -> str:
         )
         if not channels:
             return "Активных каналов не найдено."
+        ch_ids = [ch.id for ch in channels]
+
+        # Aggregate everything per channel in a fixed number of queries (no per-channel N+1)
+        subs_by_ch: dict[int, int | None] = {
+            row.channel_id: row.subscribers_count
+            for row in s.query(ChannelDailySnapshot.channel_id, ChannelDailySnapshot.subscribers_count)
+            .filter(
+                ChannelDailySnapshot.channel_id.in_(ch_ids),
+                ChannelDailySnapshot.snapshot_date == today,
+            )
+            .all()
+        }
+
+        start_utc_by_h = {h: now_utc - timedelta(hours=h) for h in horizons}
+        start_date_by_h = {
+            h: (now_moment - timedelta(days=int((h + 23) // 24) - 1)).date() for h in horizons
+        }
+
+        post_columns = []
+        for h in horizons:
+            in_window = PostSnapshot.posted_at >= start_utc_by_h[h]
+            post_columns.append(func.count(case((in_window, PostSnapshot.id))))
+            post_columns.append(func.avg(case((in_window, PostSnapshot.views))))
+        posts_by_ch: dict[int, tuple] = {
+            row[0]: tuple(row[1:])
+            for row in s.query(PostSnapshot.channel_id, *post_columns)
+            .filter(
+                PostSnapshot.channel_id.in_(ch_ids),
+                PostSnapshot.snapshot_date == today,
+                PostSnapshot.posted_at >= min(start_utc_by_h.values()),
+                PostSnapshot.posted_at <= now_utc,
+            )
+            .group_by(PostSnapshot.channel_id)
+            .all()
+        }
+
+        churn_columns = []
+        for h in horizons:
+            in_window = ChannelDailyChurn.snapshot_date >= start_date_by_h[h]
+            churn_columns.append(func.coalesce(func.sum(case((in_window, ChannelDailyChurn.joins_count))), 0))
+            churn_columns.append(func.coalesce(func.sum(case((in_window, ChannelDailyChurn.leaves_count))), 0))
+        churn_by_ch: dict[int, tuple] = {
+            row[0]: tuple(row[1:])
+            for row in s.query(ChannelDailyChurn.channel_id, *churn_columns)
+            .filter(
+                ChannelDailyChurn.channel_id.in_(ch_ids),
+                ChannelDailyChurn.snapshot_date >= min(start_date_by_h.values()),
+                ChannelDailyChurn.snapshot_date <= today,
+            )
+            .group_by(ChannelDailyChurn.channel_id)
+            .all()
+        }
 
         lines: list[str] = []
         total_subs: int = 0
@@ -45,38 +99,17 @@ async def build_stats_report_text() -> str:
 
         for ch in channels:
             title = ch.title or ch.username or str(ch.tg_chat_id)
-            daily = (
-                s.query(ChannelDailySnapshot)
-                .filter(
-                    ChannelDailySnapshot.channel_id == ch.id,
-                    ChannelDailySnapshot.snapshot_date == today,
-                )
-                .one_or_none()
-            )
-            subs = daily.subscribers_count if daily else None
+            subs = subs_by_ch.get(ch.id)
             if subs is not None:
                 try:
                     total_subs += int(subs)
                 except Exception:
                     pass
             parts: list[str] = [f"<b>{title}</b>", f"👥 {subs if subs is not None else '-'}"]
-            for h in horizons:
-                start_utc = now_utc - timedelta(hours=h)
-                days_window = int((h + 23) // 24)
-                start_local_date = (now_moment - timedelta(days=days_window-1)).date()
-                cnt, avg_views = (
-                    s.query(
-                        func.count(PostSnapshot.id),
-                        func.avg(PostSnapshot.views),
-                    )
-                    .filter(
-                        PostSnapshot.channel_id == ch.id,
-                        PostSnapshot.snapshot_date == today,
-                        PostSnapshot.posted_at >= start_utc,
-                        PostSnapshot.posted_at <= now_utc,
-                    )
-                    .one()
-                )
+            post_row = posts_by_ch.get(ch.id)
+            churn_row = churn_by_ch.get(ch.id)
+            for idx, h in enumerate(horizons):
+                cnt, avg_views = post_row[idx * 2: idx * 2 + 2] if post_row else (0, None)
                 cnt_int = int(cnt or 0)
                 avg_int = int((avg_views or 0))
                 try:
@@ -87,18 +120,7 @@ async def build_stats_report_text() -> str:
                 if subs and subs > 0 and avg_views is not None:
                     er = (float(avg_views) / float(subs)) * 100.0
                     er_txt = f"{er:.1f}%"
-                joins_sum, leaves_sum = (
-                    s.query(
-                        func.coalesce(func.sum(ChannelDailyChurn.joins_count), 0),
-                        func.coalesce(func.sum(ChannelDailyChurn.leaves_count), 0),
-                    )
-                    .filter(
-                        ChannelDailyChurn.channel_id == ch.id,
-                        ChannelDailyChurn.snapshot_date >= start_local_date,
-                        ChannelDailyChurn.snapshot_date <= today,
-                    )
-                    .one()
-                )
+                joins_sum, leaves_sum = churn_row[idx * 2: idx * 2 + 2] if churn_row else (0, 0)
                 try:
                     total_joins_by_h[h] += int(joins_sum or 0)
                     total_leaves_by_h[h] += int(leaves_sum or 0)
@@ -127,7 +149,7 @@ async def build_stats_report_text() -> str:
 
 async def notify_daily_stats(bot: Bot) -> None:
     text = await build_stats_report_text()
-    with session_scope() as s:
+    with read_session_scope() as s:
         user_ids = [
             row.tg_user_id for row in s.query(User).filter(User.notify_daily_stats.is_(True)).all()
         ]
@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from bot.db.base import get_engine, session_scope
+from bot.db.models import Category, Channel
+from bot.types.enums import (
+    EXPENSE_CATEGORY_CODES,
+    INCOME_CATEGORY_CODES,
+    INVEST_CATEGORY_CODES,
+    OperationType,
+)
+
+logger = logging.getLogger()
+
+NOTIFY_CHANNEL = "pnlbot_catalog"
+# Safety net for replicas that miss a notification (or run without LISTEN)
+DEFAULT_MAX_AGE_SECONDS = 300.0
+CHANNEL_PAGE_SIZE = 8
+
+_CODES_BY_OP_TYPE = {
+    OperationType.INCOME.value: INCOME_CATEGORY_CODES,
+    OperationType.EXPENSE.value: EXPENSE_CATEGORY_CODES,
+    OperationType.PERSONAL_INVEST.value: INVEST_CATEGORY_CODES,
+}
+
+
+@dataclass(frozen=True)
+class CategoryInfo:
+    id: int
+    code: str
+    name: str
+    is_active: bool
+
+
+@dataclass(frozen=True)
+class ChannelInfo:
+    id: int
+    tg_chat_id: int
+    title: str | None
+    username: str | None
+    created_at: datetime
+    is_active: bool
+
+    @property
+    def display_name(self) -> str:
+        return self.title or self.username or str(self.tg_chat_id)
+
+
+@dataclass(frozen=True)
+class ChannelPage:
+    items: tuple[ChannelInfo, ...]
+    # Cursor that reproduces this page (id of the channel right before it)
+    after_id: int | None
+    has_prev: bool
+    has_next: bool
+    number: int
+    pages: int
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Immutable view of categories and channels; replaced as a whole on reload."""
+
+    categories_by_id: Mapping[int, CategoryInfo]
+    channels_by_id: Mapping[int, ChannelInfo]
+    # Active only, in UI order: categories by name, channels newest first
+    active_categories: tuple[CategoryInfo, ...]
+    active_channels: tuple[ChannelInfo, ...]
+    # Active channels sorted by (display name, id) for the paginated picker
+    channels_by_title: tuple[ChannelInfo, ...]
+    title_keys: tuple[str, ...]
+    title_pos: Mapping[int, int]
+    loaded_at: float
+
+    def categories_for(self, op_type: int) -> list[tuple[int, str, str]]:
+        """(id, name, code) of active categories offered for ``op_type``."""
+        codes = _CODES_BY_OP_TYPE.get(op_type, frozenset())
+        return [(c.id, c.name, c.code) for c in self.active_categories if c.code in codes]
+
+    def channel_page(
+        self,
+        after_id: int | None = None,
+        before_id: int | None = None,
+        prefix: str = "",
+        only_ids: list[int] | None = None,
+        size: int = CHANNEL_PAGE_SIZE,
+    ) -> ChannelPage:
+        """One page of active channels in title order, addressed by keyset cursors.
+
+        ``after_id``/``before_id`` are channel ids: the page starts right after (or ends
+        right before) that channel in the current title order. That is all a cursor
+        guarantees; if channels are added, removed or renamed in between, page contents and
+        numbers shift, and a cursor whose channel is gone falls back to the first page.
+        ``prefix`` narrows to titles starting with it (a bisect range over the sorted keys);
+        ``only_ids`` keeps just those channels.
+        """
+        if prefix:
+            key = prefix.casefold()
+            lo = bisect.bisect_left(self.title_keys, key)
+            hi = bisect.bisect_left(self.title_keys, key + "\U0010ffff")
+            candidates = self.channels_by_title[lo:hi]
+        else:
+            candidates = self.channels_by_title
+        if only_ids is not None:
+            wanted = set(only_ids)
+            candidates = tuple(ch for ch in candidates if ch.id in wanted)
+        positions = [self.title_pos[ch.id] for ch in candidates]
+
+        if before_id is not None and before_id in self.title_pos:
+            start = max(0, bisect.bisect_left(positions, self.title_pos[before_id]) - size)
+        elif after_id is not None and after_id in self.title_pos:
+            start = bisect.bisect_right(positions, self.title_pos[after_id])
+        else:
+            start = 0
+        if start >= len(candidates):
+            # The cursor's page emptied out (e.g. unselected in the "selected only" view)
+            start = max(0, len(candidates) - size)
+        return ChannelPage(
+            items=tuple(candidates[start : start + size]),
+            after_id=candidates[start - 1].id if start > 0 else None,
+            has_prev=start > 0,
+            has_next=start + size < len(candidates),
+            number=-(-start // size) + 1,
+            pages=max(1, -(-len(candidates) // size)),
+        )
+
+    def channel_titles(self, channel_ids: list[int]) -> str:
+        if not channel_ids:
+            return "—"
+        titles = []
+        for cid in channel_ids:
+            ch = self.channels_by_id.get(cid)
+            titles.append((ch.title if ch else None) or str(cid))
+        return ", ".join(titles)
+
+
+def _load_snapshot() -> CatalogSnapshot:
+    with session_scope() as s:
+        categories = [
+            CategoryInfo(id=int(r.id), code=r.code, name=r.name, is_active=bool(r.is_active))
+            for r in s.query(Category.id, Category.code, Category.name, Category.is_active)
+            .order_by(Category.name)
+            .all()
+        ]
+        channels = [
+            ChannelInfo(
+                id=int(r.id),
+                tg_chat_id=int(r.tg_chat_id),
+                title=r.title,
+                username=r.username,
+                created_at=r.created_at,
+                is_active=bool(r.is_active),
+            )
+            for r in s.query(
+                Channel.id,
+                Channel.tg_chat_id,
+                Channel.title,
+                Channel.username,
+                Channel.created_at,
+                Channel.is_active,
+            )
+            .order_by(Channel.created_at.desc(), Channel.id.desc())
+            .all()
+        ]
+    active_channels = tuple(ch for ch in channels if ch.is_active)
+    by_title = tuple(sorted(active_channels, key=lambda ch: (ch.display_name.casefold(), ch.id)))
+    return CatalogSnapshot(
+        categories_by_id=MappingProxyType({c.id: c for c in categories}),
+        channels_by_id=MappingProxyType({ch.id: ch for ch in channels}),
+        active_categories=tuple(c for c in categories if c.is_active),
+        active_channels=active_channels,
+        channels_by_title=by_title,
+        title_keys=tuple(ch.display_name.casefold() for ch in by_title),
+        title_pos=MappingProxyType({ch.id: i for i, ch in enumerate(by_title)}),
+        loaded_at=time.monotonic(),
+    )
+
+
+class Catalog:
+    """Process-wide cache of the category/channel snapshot.
+
+    ``invalidate()`` bumps a version; the next ``get()`` reloads. A reload that raced with
+    an invalidation is returned to its caller but not kept, so stale data never sticks.
+    """
+
+    def __init__(self, max_age: float = DEFAULT_MAX_AGE_SECONDS) -> None:
+        self.max_age = max_age
+        self._snapshot: CatalogSnapshot | None = None
+        self._version = 0
+
+    def _fresh(self) -> CatalogSnapshot | None:
+        snap = self._snapshot
+        if snap is not None and time.monotonic() - snap.loaded_at < self.max_age:
+            return snap
+        return None
+
+    async def get(self) -> CatalogSnapshot:
+        snap = self._fresh()
+        if snap is not None:
+            return snap
+        version = self._version
+        snap = await asyncio.to_thread(_load_snapshot)
+        if version == self._version:
+            self._snapshot = snap
+        return snap
+
+    def warm(self) -> CatalogSnapshot:
+        version = self._version
+        snap = _load_snapshot()
+        if version == self._version:
+            self._snapshot = snap
+        return snap
+
+    def invalidate(self) -> None:
+        # Plain attribute writes: safe to call from the LISTEN thread as well
+        self._version += 1
+        self._snapshot = None
+
+
+_catalog = Catalog()
+
+
+def get_catalog() -> Catalog:
+    return _catalog
+
+
+async def catalog_snapshot() -> CatalogSnapshot:
+    return await _catalog.get()
+
+
+def warm_catalog() -> None:
+    snap = _catalog.warm()
+    logger.info(
+        "Catalog cache warmed: %s categories, %s active channels",
+        len(snap.active_categories),
+        len(snap.active_channels),
+    )
+
+
+# Set by invalidate_catalog(session) until the session's outermost transaction ends
+_CATALOG_CHANGED = "catalog_changed"
+
+
+def invalidate_catalog(s: Session | None = None) -> None:
+    """Drop the cached catalog after categories or channels change.
+
+    With a session the local cache is dropped once its outermost transaction commits and,
+    on Postgres, other replicas are told via NOTIFY (delivered on the same commit).
+    """
+    if s is None:
+        _catalog.invalidate()
+        return
+    if s.get_bind().dialect.name == "postgresql":
+        s.execute(text("SELECT pg_notify(:channel, '')"), {"channel": NOTIFY_CHANNEL})
+    s.info[_CATALOG_CHANGED] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    # Releasing a savepoint fires after_commit too; the change is visible only after the top-level commit
+    if session.in_nested_transaction():
+        return
+    if session.info.pop(_CATALOG_CHANGED, None):
+        _catalog.invalidate()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_catalog_change(session: Session, transaction) -> None:  # type: ignore[no-untyped-def]
+    # Rolled back or closed without committing
+    if transaction.parent is None:
+        session.info.pop(_CATALOG_CHANGED, None)
+
+
+class _CatalogListener:
+    """LISTEN for catalog changes made by other replicas (Postgres only)."""
+
+    def __init__(self) -> None:
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="catalog-listen", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=10)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Catalog LISTEN connection failed, retrying")
+                # Whatever happened while we were disconnected is unknown
+                _catalog.invalidate()
+                self._stop.wait(5.0)
+
+    def _listen(self) -> None:
+        raw = get_engine().raw_connection()
+        # Keep this long-lived connection out of the pool's accounting
+        raw.detach()
+        conn = raw.driver_connection
+        try:
+            conn.autocommit = True
+            conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            while not self._stop.is_set():
+                for _notify in conn.notifies(timeout=5.0):
+                    _catalog.invalidate()
+        finally:
+            raw.close()
+
+
+_listener: _CatalogListener | None = None
+
+
+def start_catalog_listener() -> None:
+    global _listener
+    if _listener is not None or get_engine().dialect.name != "postgresql":
+        return
+    _listener = _CatalogListener()
+    _listener.start()
+
+
+def stop_catalog_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+__all__ = [
+    "CHANNEL_PAGE_SIZE",
+    "CatalogSnapshot",
+    "ChannelPage",
+    "CategoryInfo",
+    "ChannelInfo",
+    "get_catalog",
+    "catalog_snapshot",
+    "warm_catalog",
+    "invalidate_catalog",
+    "start_catalog_listener",
+    "stop_catalog_listener",
+]
@@ -18,7 +18,9 @@ from bot.db.models import (
     ChannelSubscribersHistory,
     ChannelDailyChurn,
 )
+from bot.services.error_aggregator import report_error
 from bot.services.mtproto_client import get_telethon
+from bot.services.profiling import profiled
 from bot.services.time import MSK_TZ, now_msk
 
 logger = logging.getLogger()
@@ -45,8 +47,8 @@ async def fetch_channel_subscribers_count(tg_chat_id: int) -> int | None:
     except ChannelPrivateError:
         logger.warning("Channel is private or inaccessible: %s", tg_chat_id)
         return None
-    except Exception:
-        logger.exception("Failed to fetch subscribers count for %s", tg_chat_id)
+    except Exception as exc:
+        report_error(exc, "Failed to fetch subscribers count for %s", tg_chat_id)
         return None
 
 
@@ -65,10 +67,11 @@ async def iter_channel_posts_in_range(tg_chat_id: int, start_dt: datetime, end_d
                 yield msg
     except ChannelPrivateError:
         logger.warning("Channel is private or inaccessible: %s", tg_chat_id)
-    except Exception:
-        logger.exception("Failed to iterate posts for %s", tg_chat_id)
+    except Exception as exc:
+        report_error(exc, "Failed to iterate posts for %s", tg_chat_id)
 
 
+@profiled("collect")
 async def collect_daily_for_all_channels(snapshot_date_local: datetime) -> dict[str, int]:
     start_local = snapshot_date_local.replace(hour=0, minute=0, second=0, microsecond=0)
     # For daily subscribers snapshot we use today's local date (MSK)
@@ -191,10 +194,8 @@ async def collect_daily_for_all_channels(snapshot_date_local: datetime) -> dict[
         # Churn history (requires admin rights): stats.getBroadcastStats growth_graph
         try:
             await _collect_and_store_churn_history(ch_id, tg_chat_id, collected_at)
-        except Exception:
-            logger.exception(
-                "Churn collection failed for %s (check admin rights / limits)", tg_chat_id
-            )
+        except Exception as exc:
+            report_error(exc, "Churn collection failed for %s (check admin rights / limits)", tg_chat_id)
 
         channels_processed += 1
 
@@ -324,10 +325,8 @@ async def collect_for_channel(channel_id: int, tg_chat_id: int, when_local: date
     # Churn (requires admin rights)
     try:
         await _collect_and_store_churn_history(channel_id, tg_chat_id, collected_at)
-    except Exception:
-        logger.exception(
-            "Churn collection failed for %s (check admin rights / limits)", tg_chat_id
-        )
+    except Exception as exc:
+        report_error(exc, "Churn collection failed for %s (check admin rights / limits)", tg_chat_id)
 
     return {
         "channels": 1,
@@ -353,8 +352,8 @@ async def _collect_and_store_churn_history(channel_id: int, tg_chat_id: int, col
     if isinstance(graph, StatsGraphAsync):
         try:
             graph = await client(LoadAsyncGraphRequest(token=graph.token))
-        except Exception:
-            logger.exception("Churn: failed to load async followers graph for %s", tg_chat_id)
+        except Exception as exc:
+            report_error(exc, "Churn: failed to load async followers graph for %s", tg_chat_id)
             return
 
     if not isinstance(graph, StatsGraph):
@@ -369,8 +368,8 @@ async def _collect_and_store_churn_history(channel_id: int, tg_chat_id: int, col
 
     try:
         parsed = json.loads(raw_json)
-    except Exception:
-        logger.exception("Churn: failed to parse followers graph JSON for %s", tg_chat_id)
+    except Exception as exc:
+        report_error(exc, "Churn: failed to parse followers graph JSON for %s", tg_chat_id)
         return
 
     if not isinstance(parsed, dict) or not isinstance(parsed.get("columns"), list):
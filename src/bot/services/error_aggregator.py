@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Callable
+
+logger = logging.getLogger()
+
+_APP_PATH_MARKER = os.sep + "bot" + os.sep
+
+
+@dataclass
+class ErrorEntry:
+    fingerprint: str
+    exc_type: str
+    location: str
+    last_message: str
+    # "<exception type>: <message>" of the latest occurrence, for summaries
+    last_error: str
+    first_seen: float
+    last_seen: float
+    last_logged: float
+    count: int = 1
+    # Occurrences since the last log record for this fingerprint
+    suppressed: int = 0
+
+
+def fingerprint(exc: BaseException) -> tuple[str, str, str]:
+    """Return (fingerprint, exception type, location) for ``exc``.
+
+    The location is the innermost frame of our own code plus the innermost frame overall,
+    so the same driver error raised from different call sites stays distinct while
+    varying messages (ids, values) do not split one failure into many.
+    """
+    exc_type = f"{type(exc).__module__}.{type(exc).__qualname__}"
+    frames = traceback.extract_tb(exc.__traceback__) if exc.__traceback__ else []
+    innermost = frames[-1] if frames else None
+    app_frame = next((f for f in reversed(frames) if _APP_PATH_MARKER in f.filename), None)
+    parts = []
+    for frame in (app_frame, innermost):
+        if frame is not None:
+            parts.append(f"{os.path.basename(frame.filename)}:{frame.name}:{frame.lineno}")
+    location = " <- ".join(dict.fromkeys(reversed(parts))) or "-"
+    digest = hashlib.sha1(f"{exc_type}|{location}".encode()).hexdigest()[:10]
+    return digest, exc_type, location
+
+
+class ErrorAggregator:
+    """Deduplicate error logs by fingerprint.
+
+    The first occurrence of a fingerprint is logged with the full traceback; repeats are
+    counted and summarized at most once per ``summary_interval`` seconds, either by the
+    next repeat or by ``flush()`` (called periodically and at shutdown), so a burst that
+    stops is still reported.
+    """
+
+    def __init__(
+        self,
+        summary_interval: float = 60.0,
+        window_seconds: float = 24 * 3600.0,
+        max_entries: int = 500,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.summary_interval = summary_interval
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: dict[str, ErrorEntry] = {}
+
+    def record(self, exc: BaseException, msg: str, *args: Any, log: logging.Logger | None = None) -> ErrorEntry:
+        log = log or logger
+        fp, exc_type, location = fingerprint(exc)
+        now = self._clock()
+        text = (msg % args) if args else msg
+        entry = self._entries.get(fp)
+        if entry is None or now - entry.last_seen > self.window_seconds:
+            entry = ErrorEntry(
+                fingerprint=fp,
+                exc_type=exc_type,
+                location=location,
+                last_message=text,
+                last_error=f"{exc_type}: {exc}",
+                first_seen=now,
+                last_seen=now,
+                last_logged=now,
+            )
+            self._entries[fp] = entry
+            self._evict()
+            log.error("%s [error fp=%s]", text, fp, exc_info=exc)
+            return entry
+
+        entry.count += 1
+        entry.suppressed += 1
+        entry.last_seen = now
+        entry.last_message = text
+        entry.last_error = f"{exc_type}: {exc}"
+        if now - entry.last_logged >= self.summary_interval:
+            self._log_summary(entry, now, log)
+        return entry
+
+    def flush(self, force: bool = False) -> int:
+        """Log pending summaries whose interval has passed (all of them with ``force``).
+
+        Returns the number of summaries written.
+        """
+        now = self._clock()
+        flushed = 0
+        for entry in list(self._entries.values()):
+            if entry.suppressed and (force or now - entry.last_logged >= self.summary_interval):
+                self._log_summary(entry, now, logger)
+                flushed += 1
+        return flushed
+
+    @staticmethod
+    def _log_summary(entry: ErrorEntry, now: float, log: logging.Logger) -> None:
+        log.warning(
+            "%s [error fp=%s repeated %s times in %.0fs, total=%s: %s]",
+            entry.last_message,
+            entry.fingerprint,
+            entry.suppressed,
+            now - entry.last_logged,
+            entry.count,
+            entry.last_error,
+        )
+        entry.suppressed = 0
+        entry.last_logged = now
+
+    def _evict(self) -> None:
+        if len(self._entries) <= self.max_entries:
+            return
+        # Drop the least recently seen fingerprints
+        for entry in sorted(self._entries.values(), key=lambda e: e.last_seen)[: len(self._entries) - self.max_entries]:
+            del self._entries[entry.fingerprint]
+
+    def top(self, n: int = 10) -> list[ErrorEntry]:
+        now = self._clock()
+        recent = [e for e in self._entries.values() if now - e.last_seen <= self.window_seconds]
+        return sorted(recent, key=lambda e: (e.count, e.last_seen), reverse=True)[:n]
+
+    def format_top(self, n: int = 10) -> str:
+        entries = self.top(n)
+        if not entries:
+            return "Ошибок за последние сутки нет."
+        now = self._clock()
+        lines = [f"<b>Ошибки за сутки (топ {len(entries)})</b>"]
+        for e in entries:
+            ago_min = int((now - e.last_seen) // 60)
+            lines.append(
+                f"\n<code>{e.fingerprint}</code> ×{e.count}, последняя {ago_min} мин назад\n"
+                f"{_escape(e.exc_type)} @ {_escape(e.location)}\n"
+                f"<i>{_escape(e.last_message[:200])}</i>"
+            )
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+_aggregator = ErrorAggregator()
+
+
+def get_error_aggregator() -> ErrorAggregator:
+    return _aggregator
+
+
+def report_error(exc: BaseException, msg: str, *args: Any) -> None:
+    """Log ``exc`` through the shared aggregator (full traceback only on first occurrence)."""
+    _aggregator.record(exc, msg, *args)
+
+
+def flush_error_summaries(force: bool = False) -> int:
+    return _aggregator.flush(force=force)
+
+
+__all__ = [
+    "ErrorAggregator",
+    "ErrorEntry",
+    "fingerprint",
+    "get_error_aggregator",
+    "report_error",
+    "flush_error_summaries",
+]
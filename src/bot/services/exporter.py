@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Any, BinaryIO, Iterator
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Integer, SmallInteger, Text, cast, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from bot.db.base import read_session_scope
+from bot.db.models import (
+    ChannelDailyChurn,
+    ChannelDailySnapshot,
+    Operation,
+    OperationChannel,
+    PostSnapshot,
+)
+from bot.services.history import HistoryFilter, operation_conditions
+
+logger = logging.getLogger()
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+EXPORT_FORMATS = (FORMAT_CSV, FORMAT_PARQUET)
+FILE_SUFFIXES = {FORMAT_CSV: ".csv.gz", FORMAT_PARQUET: ".parquet"}
+# Rows fetched per round trip from the server-side cursor (and per Parquet row group)
+EXPORT_BATCH_ROWS = 10_000
+
+_SNAPSHOT_MODELS = {
+    "post_snapshots": PostSnapshot,
+    "channel_daily_snapshots": ChannelDailySnapshot,
+    "channel_daily_churn": ChannelDailyChurn,
+}
+EXPORT_DATASETS = ("operations", *_SNAPSHOT_MODELS)
+DATASET_ALIASES = {
+    "operations": "operations",
+    "ops": "operations",
+    "posts": "post_snapshots",
+    "post_snapshots": "post_snapshots",
+    "subscribers": "channel_daily_snapshots",
+    "channel_daily_snapshots": "channel_daily_snapshots",
+    "churn": "channel_daily_churn",
+    "channel_daily_churn": "channel_daily_churn",
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def export_statement(dataset: str, flt: HistoryFilter, dialect_name: str) -> Select:
+    """All columns of ``dataset`` narrowed by ``flt``, in primary key order.
+
+    Operations get an extra ``channel_ids`` column (comma-separated) and honour every
+    history filter; snapshot tables only the date range and the channel.
+    """
+    if dataset == "operations":
+        if dialect_name == "postgresql":
+            agg = func.string_agg(cast(OperationChannel.c.channel_id, Text), ",")
+        else:
+            agg = func.group_concat(OperationChannel.c.channel_id, ",")
+        channel_ids = (
+            select(agg)
+            .where(OperationChannel.c.operation_id == Operation.id)
+            .scalar_subquery()
+            .label("channel_ids")
+        )
+        columns = [*Operation.__table__.columns, channel_ids]
+        return select(*columns).where(*operation_conditions(flt)).order_by(Operation.id)
+
+    model = _SNAPSHOT_MODELS.get(dataset)
+    if model is None:
+        raise ExportError(f"Неизвестный набор данных: {dataset}")
+    if flt.op_type is not None or flt.category_id is not None or flt.user_id is not None:
+        raise ExportError("Для статистики каналов доступны только фильтры по дате и каналу")
+    stmt = select(*model.__table__.columns)
+    # Snapshot dates are naive (see models)
+    if flt.date_from is not None:
+        stmt = stmt.where(model.snapshot_date >= datetime.combine(flt.date_from, time.min))
+    if flt.date_to is not None:
+        stmt = stmt.where(model.snapshot_date < datetime.combine(flt.date_to + timedelta(days=1), time.min))
+    if flt.channel_id is not None:
+        stmt = stmt.where(model.channel_id == flt.channel_id)
+    return stmt.order_by(model.id)
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return value
+
+
+def _iter_batches(s: Session, stmt: Select) -> Iterator[list[tuple]]:
+    # yield_per streams through a server-side cursor on Postgres
+    result = s.execute(stmt.execution_options(yield_per=EXPORT_BATCH_ROWS))
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+
+def _write_csv_gz(columns: list[str], batches: Iterator[list[tuple]], out: BinaryIO) -> int:
+    rows = 0
+    with gzip.GzipFile(fileobj=out, mode="wb") as gz:
+        text = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows([_csv_value(v) for v in row] for row in batch)
+            rows += len(batch)
+        text.flush()
+        text.detach()
+    return rows
+
+
+def _copy_csv_gz(s: Session, stmt: Select, out: BinaryIO) -> int:
+    """Postgres: let the server render the CSV (``COPY (query) TO STDOUT``) and just gzip it."""
+    compiled = stmt.compile(dialect=s.get_bind().dialect)
+    dbapi_conn = s.connection().connection.driver_connection
+    with gzip.GzipFile(fileobj=out, mode="wb") as gz:
+        with dbapi_conn.cursor() as cur:
+            with cur.copy(f"COPY ({compiled}) TO STDOUT WITH (FORMAT csv, HEADER)", compiled.params) as copy:
+                for block in copy:
+                    gz.write(block)
+            rows = cur.rowcount
+    return int(rows)
+
+
+def _arrow_schema(stmt: Select):  # type: ignore[no-untyped-def]
+    import pyarrow as pa
+
+    fields = []
+    for col in stmt.selected_columns:
+        sa_type = col.type
+        if isinstance(sa_type, (BigInteger, Integer, SmallInteger)):
+            arrow_type = pa.int64()
+        elif isinstance(sa_type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(sa_type, DateTime):
+            arrow_type = pa.timestamp("us", tz="UTC") if sa_type.timezone else pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(col.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _write_parquet(stmt: Select, batches: Iterator[list[tuple]], out: BinaryIO) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ExportError("Для экспорта в Parquet установите pyarrow (pip install pnlbot[parquet])") from e
+
+    schema = _arrow_schema(stmt)
+    rows = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            arrays = [pa.array(list(values), type=field.type) for values, field in zip(columns, schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            rows += len(batch)
+        if not rows:
+            writer.write_table(schema.empty_table())
+    return rows
+
+
+def export_dataset(
+    dataset: str,
+    out: BinaryIO,
+    fmt: str = FORMAT_CSV,
+    flt: HistoryFilter | None = None,
+) -> int:
+    """Stream ``dataset`` into ``out`` as gzip CSV or Parquet; returns the number of rows.
+
+    Blocking; memory stays bounded by one batch whatever the table size.
+    """
+    dataset = DATASET_ALIASES.get(dataset, dataset)
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Неизвестный формат: {fmt}")
+    flt = flt or HistoryFilter()
+    with read_session_scope() as s:
+        dialect_name = s.get_bind().dialect.name
+        stmt = export_statement(dataset, flt, dialect_name)
+        if fmt == FORMAT_PARQUET:
+            rows = _write_parquet(stmt, _iter_batches(s, stmt), out)
+        elif dialect_name == "postgresql":
+            rows = _copy_csv_gz(s, stmt, out)
+        else:
+            columns = [col.name for col in stmt.selected_columns]
+            rows = _write_csv_gz(columns, _iter_batches(s, stmt), out)
+    logger.info("Exported %s rows of %s as %s", rows, dataset, fmt)
+    return rows
+
+
+__all__ = [
+    "FORMAT_CSV",
+    "FORMAT_PARQUET",
+    "EXPORT_FORMATS",
+    "EXPORT_DATASETS",
+    "DATASET_ALIASES",
+    "FILE_SUFFIXES",
+    "ExportError",
+    "export_statement",
+    "export_dataset",
+]
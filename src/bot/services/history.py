@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, replace
+from datetime import date, datetime, time, timedelta
+from typing import Any
+
+from sqlalchemy import ColumnElement, exists, select, tuple_
+from sqlalchemy.orm import Session
+
+from bot.db.models import Operation, OperationChannel
+from bot.services.catalog import CatalogSnapshot
+from bot.services.time import MSK_TZ
+from bot.types.enums import OperationType
+
+HISTORY_PAGE_SIZE = 10
+
+OP_TYPE_ALIASES = {
+    "in": OperationType.INCOME.value,
+    "доход": OperationType.INCOME.value,
+    "out": OperationType.EXPENSE.value,
+    "расход": OperationType.EXPENSE.value,
+    "invest": OperationType.PERSONAL_INVEST.value,
+    "вложения": OperationType.PERSONAL_INVEST.value,
+}
+
+HISTORY_USAGE = (
+    "Фильтры /history (можно комбинировать):\n"
+    "in | out | invest — тип операции\n"
+    "cat:<код или начало названия> — категория\n"
+    "ch:<id, @username или начало названия> — канал\n"
+    "me — только мои операции\n"
+    "from:ДД.ММ.ГГГГ to:ДД.ММ.ГГГГ — период"
+)
+
+_FILTER_RE = re.compile(r"([tchufe])(\d+)")
+
+
+class HistoryFilterError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class HistoryFilter:
+    op_type: int | None = None
+    category_id: int | None = None
+    channel_id: int | None = None
+    user_id: int | None = None
+    date_from: date | None = None
+    date_to: date | None = None
+
+    def encode(self) -> str:
+        """Compact form for callback data, e.g. ``t2c5f20240101``."""
+        parts = []
+        for key, value in (
+            ("t", self.op_type),
+            ("c", self.category_id),
+            ("h", self.channel_id),
+            ("u", self.user_id),
+            ("f", self.date_from.strftime("%Y%m%d") if self.date_from else None),
+            ("e", self.date_to.strftime("%Y%m%d") if self.date_to else None),
+        ):
+            if value is not None:
+                parts.append(f"{key}{value}")
+        return "".join(parts)
+
+    @classmethod
+    def decode(cls, value: str) -> "HistoryFilter":
+        fields: dict[str, Any] = {}
+        names = {"t": "op_type", "c": "category_id", "h": "channel_id", "u": "user_id"}
+        for key, number in _FILTER_RE.findall(value or ""):
+            if key in names:
+                fields[names[key]] = int(number)
+            else:
+                try:
+                    day = datetime.strptime(number, "%Y%m%d").date()
+                except ValueError:
+                    continue
+                fields["date_from" if key == "f" else "date_to"] = day
+        return cls(**fields)
+
+    def with_op_type(self, op_type: int | None) -> "HistoryFilter":
+        return replace(self, op_type=op_type)
+
+
+def _parse_date(value: str) -> date:
+    for fmt in ("%d.%m.%Y", "%Y-%m-%d", "%d.%m.%y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise HistoryFilterError(f"Не понял дату: {value}")
+
+
+def parse_history_args(args: str | None, catalog: CatalogSnapshot, db_user_id: int | None) -> HistoryFilter:
+    """Build a filter from ``/history`` arguments; raises HistoryFilterError with a user message."""
+    flt = HistoryFilter()
+    for token in (args or "").split():
+        key, _, value = token.partition(":")
+        key = key.lower()
+        if not value and key in OP_TYPE_ALIASES:
+            flt = replace(flt, op_type=OP_TYPE_ALIASES[key])
+        elif not value and key in ("me", "я"):
+            if db_user_id is None:
+                raise HistoryFilterError("Не удалось определить пользователя")
+            flt = replace(flt, user_id=db_user_id)
+        elif key == "cat" and value:
+            needle = value.casefold()
+            matches = [
+                c
+                for c in catalog.categories_by_id.values()
+                if c.code.casefold() == needle or c.name.casefold().startswith(needle)
+            ]
+            if len(matches) != 1:
+                raise HistoryFilterError(f"Категория «{value}» не найдена или неоднозначна")
+            flt = replace(flt, category_id=matches[0].id)
+        elif key == "ch" and value:
+            if value.lstrip("-").isdigit() and int(value) in catalog.channels_by_id:
+                matches = [catalog.channels_by_id[int(value)]]
+            elif value.startswith("@"):
+                uname = value[1:].casefold()
+                matches = [ch for ch in catalog.channels_by_id.values() if (ch.username or "").casefold() == uname]
+            else:
+                needle = value.casefold()
+                matches = [
+                    ch for ch in catalog.channels_by_id.values() if ch.display_name.casefold().startswith(needle)
+                ]
+            if len(matches) != 1:
+                raise HistoryFilterError(f"Канал «{value}» не найден или неоднозначен")
+            flt = replace(flt, channel_id=matches[0].id)
+        elif key == "from" and value:
+            flt = replace(flt, date_from=_parse_date(value))
+        elif key == "to" and value:
+            flt = replace(flt, date_to=_parse_date(value))
+        else:
+            raise HistoryFilterError(f"Неизвестный фильтр: {token}")
+    return flt
+
+
+@dataclass(frozen=True)
+class HistoryPage:
+    rows: list[Any]
+    # Operation ids used as keyset cursors (None when there is no such page)
+    prev_before_id: int | None
+    next_after_id: int | None
+
+
+_COLUMNS = (
+    Operation.id,
+    Operation.created_at,
+    Operation.op_type,
+    Operation.category_id,
+    Operation.amount_kop,
+    Operation.is_general,
+    Operation.free_text_reason,
+    Operation.receipt_url,
+    Operation.comment,
+)
+
+
+def operation_conditions(flt: HistoryFilter) -> list[ColumnElement[bool]]:
+    """WHERE clauses on ``operations`` for ``flt`` (shared with the export)."""
+    conditions: list[ColumnElement[bool]] = []
+    if flt.op_type is not None:
+        conditions.append(Operation.op_type == flt.op_type)
+    if flt.category_id is not None:
+        conditions.append(Operation.category_id == flt.category_id)
+    if flt.user_id is not None:
+        conditions.append(Operation.created_by_user_id == flt.user_id)
+    if flt.channel_id is not None:
+        conditions.append(
+            exists().where(
+                OperationChannel.c.operation_id == Operation.id,
+                OperationChannel.c.channel_id == flt.channel_id,
+            )
+        )
+    if flt.date_from is not None:
+        conditions.append(Operation.created_at >= datetime.combine(flt.date_from, time.min, MSK_TZ))
+    if flt.date_to is not None:
+        conditions.append(
+            Operation.created_at < datetime.combine(flt.date_to + timedelta(days=1), time.min, MSK_TZ)
+        )
+    return conditions
+
+
+def _filtered(flt: HistoryFilter):  # type: ignore[no-untyped-def]
+    return select(*_COLUMNS).where(*operation_conditions(flt))
+
+
+def fetch_history_page(
+    s: Session,
+    flt: HistoryFilter,
+    after_id: int | None = None,
+    before_id: int | None = None,
+    size: int = HISTORY_PAGE_SIZE,
+) -> HistoryPage:
+    """Newest-first page of operations using keyset pagination on (created_at, id).
+
+    Cursors are operation ids; their ``created_at`` is read by primary key inside the same
+    statement, so a page costs one indexed range scan no matter how deep it is.
+    """
+    key = tuple_(Operation.created_at, Operation.id)
+    rows: list[Any] = []
+    has_prev = has_next = False
+    if before_id is not None:
+        cursor_at = select(Operation.created_at).where(Operation.id == before_id).scalar_subquery()
+        newer = s.execute(
+            _filtered(flt)
+            .where(key > tuple_(cursor_at, before_id))
+            .order_by(Operation.created_at.asc(), Operation.id.asc())
+            .limit(size + 1)
+        ).all()
+        if len(newer) > size:
+            rows = list(reversed(newer[:size]))
+            has_prev = has_next = True
+    elif after_id is not None:
+        cursor_at = select(Operation.created_at).where(Operation.id == after_id).scalar_subquery()
+        rows = s.execute(
+            _filtered(flt)
+            .where(key < tuple_(cursor_at, after_id))
+            .order_by(Operation.created_at.desc(), Operation.id.desc())
+            .limit(size + 1)
+        ).all()
+        has_prev = bool(rows)
+    if not rows:
+        # First page, or the requested page is gone / shorter than a full page
+        rows = s.execute(
+            _filtered(flt).order_by(Operation.created_at.desc(), Operation.id.desc()).limit(size + 1)
+        ).all()
+        has_prev = False
+    if len(rows) > size:
+        rows = rows[:size]
+        has_next = True
+    return HistoryPage(
+        rows=rows,
+        prev_before_id=int(rows[0].id) if has_prev and rows else None,
+        next_after_id=int(rows[-1].id) if has_next else None,
+    )
+
+
+def fetch_operation_channels(s: Session, operation_ids: list[int]) -> dict[int, list[int]]:
+    ch_map: dict[int, list[int]] = {}
+    if operation_ids:
+        res = s.execute(OperationChannel.select().where(OperationChannel.c.operation_id.in_(operation_ids)))
+        for op_id, ch_id in res:
+            ch_map.setdefault(int(op_id), []).append(int(ch_id))
+    return ch_map
+
+
+__all__ = [
+    "HISTORY_PAGE_SIZE",
+    "HISTORY_USAGE",
+    "HistoryFilter",
+    "HistoryFilterError",
+    "HistoryPage",
+    "parse_history_args",
+    "operation_conditions",
+    "fetch_history_page",
+    "fetch_operation_channels",
+]
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import logging
+
+from aiohttp import web
+
+from bot.services.metrics import render_latest, run_collectors
+
+logger = logging.getLogger()
+
+_app: web.Application | None = None
+_runner: web.AppRunner | None = None
+
+
+async def _metrics(request: web.Request) -> web.Response:
+    await run_collectors()
+    return web.Response(
+        text=render_latest(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def _healthz(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+def get_http_app() -> web.Application:
+    """Shared aiohttp application served on the exposed port (routes may be added before start)."""
+    global _app
+    if _app is None:
+        app = web.Application()
+        app.router.add_get("/metrics", _metrics)
+        app.router.add_get("/healthz", _healthz)
+        _app = app
+    return _app
+
+
+async def start_http_server(host: str, port: int) -> None:
+    global _runner
+    if _runner is not None:
+        return
+    runner = web.AppRunner(get_http_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    _runner = runner
+    logger.info("HTTP server listening on %s:%s", host, port)
+
+
+async def shutdown_http_server() -> None:
+    global _runner, _app
+    if _runner is None:
+        return
+    try:
+        await _runner.cleanup()
+    except Exception:
+        logger.exception("Failed to stop HTTP server")
+    finally:
+        _runner = None
+        _app = None
@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import IO, Any, Iterator
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from bot.db.base import session_scope
+from bot.db.models import User
+from bot.services.catalog import CatalogSnapshot, CategoryInfo, ChannelInfo
+from bot.services.history import OP_TYPE_ALIASES
+from bot.services.parsing import AmountParseError, parse_amount_rub_to_kop
+from bot.services.quick_entry import (
+    QuickOperation,
+    bulk_insert_operations,
+    dedup_hash_for,
+    operation_values,
+)
+from bot.services.time import MSK_TZ
+from bot.types.enums import (
+    EXPENSE_CATEGORY_CODES,
+    INCOME_CATEGORY_CODES,
+    INVEST_CATEGORY_CODES,
+    OperationType,
+)
+
+logger = logging.getLogger()
+
+# Bot API refuses to hand out larger files to bots anyway
+MAX_IMPORT_BYTES = 20 * 1024 * 1024
+MAX_REPORTED_ERRORS = 20
+# Rows per INSERT when COPY is not available (SQLite)
+INSERT_CHUNK_SIZE = 1000
+
+IMPORT_USAGE = (
+    "Импорт операций из CSV (UTF-8, разделитель «,» или «;»). Первая строка — заголовок:\n"
+    "date,type,category,amount,channels,comment,reason,receipt\n"
+    "• date — 31.12.2023 или 31.12.2023 18:30 (МСК), также 2023-12-31\n"
+    "• type — in / out / invest (или доход / расход / вложения)\n"
+    "• category — код категории, например ad_purchase, или её точное название\n"
+    "• amount — сумма в рублях: 1200, 1 200,50\n"
+    "• channels — @username или названия через пробел/запятую; пусто — общая операция\n"
+    "• comment, reason, receipt — необязательны; reason обязателен для custom\n"
+    "Дубликаты (по тем же правилам, что и при ручном вводе) пропускаются: одинаковые операции "
+    "в один день различайте временем (с точностью до 3 минут).\n"
+    "Отправьте файл документом с подписью /import или после этой команды."
+)
+
+_HEADER_ALIASES = {
+    "date": "date",
+    "дата": "date",
+    "type": "type",
+    "тип": "type",
+    "category": "category",
+    "категория": "category",
+    "amount": "amount",
+    "сумма": "amount",
+    "channels": "channels",
+    "каналы": "channels",
+    "comment": "comment",
+    "комментарий": "comment",
+    "reason": "reason",
+    "пояснение": "reason",
+    "receipt": "receipt",
+    "чек": "receipt",
+}
+_REQUIRED_COLUMNS = ("date", "type", "category", "amount")
+_DATETIME_FORMATS = (
+    "%d.%m.%Y %H:%M:%S",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y",
+    "%d.%m.%y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d",
+)
+_CODES_BY_OP_TYPE = {
+    OperationType.INCOME.value: INCOME_CATEGORY_CODES,
+    OperationType.EXPENSE.value: EXPENSE_CATEGORY_CODES,
+    OperationType.PERSONAL_INVEST.value: INVEST_CATEGORY_CODES,
+}
+_CHANNELS_SPLIT_RE = re.compile(r"[\s,;]+")
+
+_STAGING_DDL = """
+CREATE TEMP TABLE import_staging (
+    line_no integer NOT NULL,
+    created_at timestamptz NOT NULL,
+    op_type smallint NOT NULL,
+    category_id smallint NOT NULL,
+    amount_kop bigint NOT NULL,
+    free_text_reason text,
+    receipt_url text,
+    comment text,
+    is_general boolean NOT NULL,
+    channel_ids bigint[] NOT NULL,
+    dedup_hash text NOT NULL
+) ON COMMIT DROP
+"""
+_STAGING_COLUMNS = (
+    "line_no, created_at, op_type, category_id, amount_kop, free_text_reason, "
+    "receipt_url, comment, is_general, channel_ids, dedup_hash"
+)
+_MERGE_SQL = """
+WITH ins AS (
+    INSERT INTO finance.operations (
+        created_at, op_type, category_id, amount_kop, currency, free_text_reason,
+        receipt_url, comment, created_by_user_id, is_general, dedup_hash
+    )
+    SELECT created_at, op_type, category_id, amount_kop, 'RUB', free_text_reason,
+           receipt_url, comment, :user_id, is_general, dedup_hash
+    FROM import_staging
+    ORDER BY line_no
+    ON CONFLICT (dedup_hash) DO NOTHING
+    RETURNING id, dedup_hash
+), links AS (
+    INSERT INTO finance.operation_channels (operation_id, channel_id)
+    SELECT ins.id, unnest(st.channel_ids)
+    FROM ins JOIN import_staging st ON st.dedup_hash = ins.dedup_hash
+)
+SELECT count(*) FROM ins
+"""
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be imported (bad header, encoding, ...)."""
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportProgress:
+    """Written by the import thread, read by the event loop for progress messages."""
+
+    rows: int = 0
+    stage: str = "проверка и загрузка"
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    error_count: int = 0
+    errors: list[str] = field(default_factory=list)
+    # Rows skipped because an earlier row of the same file has the same dedup hash
+    collision_count: int = 0
+    collisions: list[str] = field(default_factory=list)
+
+    def add_error(self, line_no: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Строка {line_no}: {message}")
+
+    def add_collision(self, line_no: int, first_line_no: int) -> None:
+        self.duplicates += 1
+        self.collision_count += 1
+        if len(self.collisions) < MAX_REPORTED_ERRORS:
+            self.collisions.append(f"Строка {line_no}: совпадает со строкой {first_line_no}")
+
+
+class _Lookups:
+    """Category/channel resolution built once per file from the cached catalog."""
+
+    def __init__(self, catalog: CatalogSnapshot) -> None:
+        self.categories: dict[str, CategoryInfo] = {}
+        for cat in catalog.categories_by_id.values():
+            self.categories.setdefault(cat.name.casefold(), cat)
+        for cat in catalog.categories_by_id.values():
+            self.categories[cat.code.casefold()] = cat
+        # Paused channels included: old rows may well refer to them
+        self.channels_by_username: dict[str, ChannelInfo] = {}
+        self.channels_by_title: dict[str, list[ChannelInfo]] = {}
+        for ch in catalog.channels_by_id.values():
+            if ch.username:
+                self.channels_by_username[ch.username.casefold()] = ch
+            self.channels_by_title.setdefault(ch.display_name.casefold(), []).append(ch)
+
+    def category(self, value: str, op_type: int) -> CategoryInfo:
+        cat = self.categories.get(value.strip().casefold())
+        if cat is None:
+            raise ImportRowError(f"неизвестная категория «{value}»")
+        if cat.code not in _CODES_BY_OP_TYPE.get(op_type, ()):
+            raise ImportRowError(f"категория «{value}» не подходит для этого типа операции")
+        return cat
+
+    def channel_ids(self, value: str) -> tuple[int, ...]:
+        ids: list[int] = []
+        for token in _CHANNELS_SPLIT_RE.split(value.strip()):
+            if not token:
+                continue
+            key = token.lstrip("@").casefold()
+            ch = self.channels_by_username.get(key)
+            if ch is None:
+                by_title = self.channels_by_title.get(key, [])
+                if len(by_title) != 1:
+                    raise ImportRowError(f"канал «{token}» не найден или неоднозначен")
+                ch = by_title[0]
+            if ch.id not in ids:
+                ids.append(ch.id)
+        return tuple(ids)
+
+
+def _parse_datetime(value: str) -> datetime:
+    raw = value.strip()
+    for fmt in _DATETIME_FORMATS:
+        try:
+            dt = datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+        return dt.replace(tzinfo=MSK_TZ)
+    try:
+        dt = datetime.fromisoformat(raw)
+    except ValueError:
+        raise ImportRowError(f"не понял дату «{value}»") from None
+    return dt if dt.tzinfo else dt.replace(tzinfo=MSK_TZ)
+
+
+def parse_import_row(row: dict[str, str], lookups: _Lookups) -> tuple[datetime, QuickOperation]:
+    created_at = _parse_datetime(row.get("date") or "")
+    type_value = (row.get("type") or "").strip().casefold()
+    op_type = OP_TYPE_ALIASES.get(type_value)
+    if op_type is None and type_value.isdigit() and int(type_value) in _CODES_BY_OP_TYPE:
+        op_type = int(type_value)
+    if op_type is None:
+        raise ImportRowError(f"неизвестный тип «{row.get('type') or ''}»")
+    category = lookups.category(row.get("category") or "", op_type)
+    try:
+        amount_kop = parse_amount_rub_to_kop(row.get("amount") or "")
+    except AmountParseError as e:
+        raise ImportRowError(str(e)) from e
+    reason = (row.get("reason") or "").strip() or None
+    if category.code == "custom" and not reason:
+        raise ImportRowError("для категории custom нужно пояснение (reason)")
+    op = QuickOperation(
+        op_type=op_type,
+        category_id=category.id,
+        category_code=category.code,
+        amount_kop=amount_kop,
+        channel_ids=lookups.channel_ids(row.get("channels") or ""),
+        receipt_url=(row.get("receipt") or "").strip() or None,
+        comment=(row.get("comment") or "").strip() or None,
+        free_text_reason=reason,
+    )
+    return created_at, op
+
+
+def _open_csv(stream: IO[bytes]) -> Iterator[tuple[int, dict[str, str]]]:
+    """Yield (line number, row keyed by canonical column) while decoding the stream lazily."""
+    reader = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        header_line = reader.readline()
+        if not header_line.strip():
+            raise ImportFileError("Файл пустой")
+        delimiter = ";" if header_line.count(";") > header_line.count(",") else ","
+        header = next(csv.reader([header_line], delimiter=delimiter))
+        columns = [_HEADER_ALIASES.get(name.strip().casefold()) for name in header]
+        missing = [name for name in _REQUIRED_COLUMNS if name not in columns]
+        if missing:
+            raise ImportFileError(f"Нет обязательных колонок: {', '.join(missing)}")
+        rows = csv.reader(reader, delimiter=delimiter)
+        for values in rows:
+            if not any(v.strip() for v in values):
+                continue
+            # line_num does not count the header line read above
+            yield rows.line_num + 1, {col: v for col, v in zip(columns, values) if col is not None}
+    finally:
+        # Leave closing the underlying file to the caller
+        reader.detach()
+
+
+def _validated_rows(
+    stream: IO[bytes],
+    catalog: CatalogSnapshot,
+    tg_user_id: int,
+    report: ImportReport,
+    progress: ImportProgress,
+) -> Iterator[tuple[int, datetime, QuickOperation, str]]:
+    lookups = _Lookups(catalog)
+    # dedup hash -> first line with it; the hash rounds time down to 3 minutes
+    seen: dict[str, int] = {}
+    try:
+        for line_no, row in _open_csv(stream):
+            report.rows += 1
+            progress.rows = report.rows
+            try:
+                created_at, op = parse_import_row(row, lookups)
+            except ImportRowError as e:
+                report.add_error(line_no, str(e))
+                continue
+            dedup = dedup_hash_for(op, tg_user_id, created_at)
+            if dedup in seen:
+                report.add_collision(line_no, seen[dedup])
+                continue
+            seen[dedup] = line_no
+            yield line_no, created_at, op, dedup
+    except UnicodeDecodeError as e:
+        raise ImportFileError("Файл должен быть в кодировке UTF-8") from e
+    except csv.Error as e:
+        raise ImportFileError(f"Некорректный CSV: {e}") from e
+
+
+def _load_postgres(
+    s: Session, rows: Iterator[tuple[int, datetime, QuickOperation, str]], db_user_id: int, progress: ImportProgress
+) -> tuple[int, int]:
+    s.execute(text(_STAGING_DDL))
+    # COPY goes through the same connection, hence the same transaction as the session
+    dbapi_conn = s.connection().connection.driver_connection
+    staged = 0
+    with dbapi_conn.cursor() as cur:
+        with cur.copy(f"COPY import_staging ({_STAGING_COLUMNS}) FROM STDIN") as copy:
+            for line_no, created_at, op, dedup in rows:
+                copy.write_row(
+                    (
+                        line_no,
+                        created_at,
+                        op.op_type,
+                        op.category_id,
+                        op.amount_kop,
+                        op.free_text_reason,
+                        op.receipt_url,
+                        op.comment,
+                        op.is_general,
+                        list(op.channel_ids),
+                        dedup,
+                    )
+                )
+                staged += 1
+    progress.stage = "сохранение"
+    inserted = int(s.execute(text(_MERGE_SQL), {"user_id": db_user_id}).scalar_one())
+    return staged, inserted
+
+
+def _load_chunked(
+    s: Session, rows: Iterator[tuple[int, datetime, QuickOperation, str]], db_user_id: int
+) -> tuple[int, int]:
+    staged = inserted = 0
+    chunk: list[dict[str, Any]] = []
+    channels_by_hash: dict[str, tuple[int, ...]] = {}
+    for _, created_at, op, dedup in rows:
+        chunk.append(operation_values(op, created_at, db_user_id, dedup))
+        channels_by_hash[dedup] = op.channel_ids
+        if len(chunk) >= INSERT_CHUNK_SIZE:
+            inserted += bulk_insert_operations(s, chunk, channels_by_hash)
+            staged += len(chunk)
+            chunk, channels_by_hash = [], {}
+    inserted += bulk_insert_operations(s, chunk, channels_by_hash)
+    staged += len(chunk)
+    return staged, inserted
+
+
+def import_operations(
+    stream: IO[bytes],
+    catalog: CatalogSnapshot,
+    tg_user_id: int,
+    db_user_id: int | None = None,
+    progress: ImportProgress | None = None,
+) -> ImportReport:
+    """Validate a CSV stream row by row and merge it into ``operations`` in one transaction.
+
+    Blocking; run it in a worker thread. On Postgres valid rows are streamed with ``COPY``
+    into a temporary staging table and merged with ``INSERT ... ON CONFLICT (dedup_hash) DO
+    NOTHING`` in a single statement; elsewhere they are inserted in chunks. Nothing is
+    committed if the file turns out to be unreadable halfway through.
+    """
+    progress = progress or ImportProgress()
+    report = ImportReport()
+    with session_scope() as s:
+        if db_user_id is None:
+            db_user_id = s.query(User.id).filter(User.tg_user_id == tg_user_id).scalar()
+            if db_user_id is None:
+                raise ImportFileError("Пользователь не найден, отправьте /start")
+        rows = _validated_rows(stream, catalog, tg_user_id, report, progress)
+        if s.get_bind().dialect.name == "postgresql":
+            staged, inserted = _load_postgres(s, rows, db_user_id, progress)
+        else:
+            staged, inserted = _load_chunked(s, rows, db_user_id)
+    report.inserted = inserted
+    report.duplicates += staged - inserted
+    logger.info(
+        "Imported operations: rows=%s inserted=%s duplicates=%s errors=%s",
+        report.rows,
+        report.inserted,
+        report.duplicates,
+        report.error_count,
+    )
+    return report
+
+
+__all__ = [
+    "MAX_IMPORT_BYTES",
+    "IMPORT_USAGE",
+    "ImportFileError",
+    "ImportProgress",
+    "ImportReport",
+    "import_operations",
+]
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Connection
+
+from bot.db.base import get_engine, session_scope
+from bot.db.models import JobRun
+from bot.services.metrics import gauge
+
+logger = logging.getLogger()
+
+JOB_LEADER = gauge("pnlbot_job_leader", "1 while this instance holds the job's leader lock", ["job", "instance"])
+
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_ERROR_MAX_CHARS = 2000
+
+
+def lock_key(job_id: str) -> int:
+    """Stable pg_advisory_lock key for a job (crc32, fits into bigint)."""
+    return zlib.crc32(f"pnlbot:job:{job_id}".encode())
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+class _AdvisoryLock:
+    """Session-level advisory lock held on a dedicated connection.
+
+    The lock lives as long as the connection: if this process dies or the connection
+    drops, Postgres releases it and a follower can take over. The lease is "renewed" by
+    pinging the connection; a failed ping means the lock may be gone.
+    """
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self.key = lock_key(job_id)
+        self._conn: Connection | None = None
+
+    def try_acquire(self) -> bool:
+        conn = get_engine().connect()
+        try:
+            acquired = bool(conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": self.key}).scalar())
+            # End the implicit transaction; the session-level lock survives it
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def ping(self) -> None:
+        assert self._conn is not None
+        self._conn.execute(text("SELECT 1"))
+        self._conn.commit()
+
+    def release(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": self.key})
+            self._conn.commit()
+        except Exception:
+            logger.exception("Failed to release leader lock for %s", self.job_id)
+            # close() alone would return the connection to the pool with the lock still held;
+            # discarding the DBAPI connection ends the session and releases it
+            self._conn.invalidate()
+        finally:
+            self._conn.close()
+            self._conn = None
+
+
+def _already_finished(job_id: str, run_key: str) -> bool:
+    with session_scope() as s:
+        return (
+            s.execute(
+                select(JobRun.job_id).where(
+                    JobRun.job_id == job_id,
+                    JobRun.run_key == run_key,
+                    JobRun.finished_at.is_not(None),
+                )
+            ).first()
+            is not None
+        )
+
+
+def _mark_finished(job_id: str, run_key: str, started_at: datetime, error: Exception | None = None) -> None:
+    with session_scope() as s:
+        s.merge(
+            JobRun(
+                job_id=job_id,
+                run_key=run_key,
+                instance=INSTANCE_ID,
+                started_at=started_at,
+                finished_at=datetime.now(timezone.utc),
+                status="done" if error is None else "failed",
+                error=None if error is None else f"{type(error).__name__}: {error}"[:_ERROR_MAX_CHARS],
+            )
+        )
+
+
+async def run_as_leader(
+    job_id: str,
+    run_key: str,
+    job: Callable[[], Awaitable[Any]],
+    renew_interval: float = 15.0,
+    takeover_window: float = 3600.0,
+) -> bool:
+    """Run ``job`` for ``run_key`` (e.g. the date) on exactly one replica.
+
+    The instance that gets the advisory lock runs the job and records the outcome in
+    ``finance.job_runs`` (``status`` "done" or "failed" with the error) before releasing it.
+    The others keep retrying the lock for ``takeover_window`` seconds and run the job
+    themselves only if the leader's lock went away while the job was running (crash, lost
+    connection, lost lease). A failed run is not repeated: the job may have partly done its
+    work (e.g. notified some users); delete the row to allow a rerun. Returns True if this
+    instance ran the job.
+    """
+    lock = _AdvisoryLock(job_id)
+    deadline = asyncio.get_running_loop().time() + takeover_window
+    while True:
+        if await asyncio.to_thread(_already_finished, job_id, run_key):
+            logger.info("Job %s/%s already finished by another instance", job_id, run_key)
+            return False
+        if await asyncio.to_thread(lock.try_acquire):
+            break
+        if asyncio.get_running_loop().time() >= deadline:
+            logger.warning(
+                "Job %s/%s: leader lock not acquired within %ss, giving up", job_id, run_key, takeover_window
+            )
+            return False
+        await asyncio.sleep(renew_interval)
+
+    JOB_LEADER.set(1, job=job_id, instance=INSTANCE_ID)
+    logger.info("Job %s/%s: acquired leader lock as %s", job_id, run_key, INSTANCE_ID)
+    job_task: asyncio.Future | None = None
+    try:
+        # Finished between our last check and acquiring the lock
+        if await asyncio.to_thread(_already_finished, job_id, run_key):
+            return False
+        started_at = datetime.now(timezone.utc)
+        job_task = asyncio.ensure_future(job())
+        while True:
+            done, _ = await asyncio.wait({job_task}, timeout=renew_interval)
+            if done:
+                break
+            try:
+                await asyncio.to_thread(lock.ping)
+            except Exception as exc:
+                # The lock may already be held by a follower; do not keep running in parallel
+                job_task.cancel()
+                raise LeaseLost(f"leader lease lost for {job_id}") from exc
+        try:
+            job_task.result()
+        except Exception as exc:
+            await asyncio.to_thread(_mark_finished, job_id, run_key, started_at, exc)
+            raise
+        await asyncio.to_thread(_mark_finished, job_id, run_key, started_at)
+        return True
+    finally:
+        if job_task is not None and not job_task.done():
+            job_task.cancel()
+        JOB_LEADER.set(0, job=job_id, instance=INSTANCE_ID)
+        await asyncio.to_thread(lock.release)
+
+
+__all__ = ["run_as_leader", "lock_key", "LeaseLost", "INSTANCE_ID"]
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+
+logger = logging.getLogger()
+
+DEFAULT_DELAY_SECONDS = 0.4
+
+_Key = tuple[int, int]
+_Fingerprint = tuple[str | None, str | None]
+
+
+def _fingerprint(text: str | None, reply_markup: InlineKeyboardMarkup | None) -> _Fingerprint:
+    markup = reply_markup.model_dump_json(exclude_none=True) if reply_markup is not None else None
+    return text, markup
+
+
+@dataclass
+class _PendingEdit:
+    message: Message
+    text: str
+    reply_markup: InlineKeyboardMarkup | None
+    task: asyncio.Task | None = None
+
+
+class EditDebouncer:
+    """Collapse rapid edits of one message into a single ``editMessageText``.
+
+    ``edit()`` only records the latest wanted content; the actual call happens ``delay``
+    seconds after the first pending edit. Edits that would not change what the message
+    already shows are skipped, so Telegram never answers "message is not modified".
+    """
+
+    def __init__(self, delay: float = DEFAULT_DELAY_SECONDS, max_tracked: int = 1024) -> None:
+        self.delay = delay
+        self.max_tracked = max_tracked
+        self._pending: dict[_Key, _PendingEdit] = {}
+        # Edits already handed to Telegram (popped from _pending, awaiting edit_text)
+        self._sending: dict[_Key, asyncio.Task] = {}
+        # Last content we sent per message (the update's copy of the message may be older)
+        self._shown: OrderedDict[_Key, _Fingerprint] = OrderedDict()
+        self.sent = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _key(message: Message) -> _Key:
+        return message.chat.id, message.message_id
+
+    def edit(self, message: Message, text: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+        key = self._key(message)
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.text = text
+            pending.reply_markup = reply_markup
+            return
+        pending = _PendingEdit(message=message, text=text, reply_markup=reply_markup)
+        self._pending[key] = pending
+        # Fresh context: the edit outlives the update and must not reuse its DB session
+        pending.task = asyncio.create_task(self._flush_later(key), context=contextvars.Context())
+
+    async def cancel(self, message: Message) -> None:
+        """Drop a pending edit, e.g. before the message moves on to the next step.
+
+        An edit that is already being sent cannot be recalled; it is awaited instead, so the
+        caller's own edit of the message lands after it.
+        """
+        key = self._key(message)
+        pending = self._pending.pop(key, None)
+        if pending is not None and pending.task is not None:
+            pending.task.cancel()
+        sending = self._sending.get(key)
+        if sending is not None:
+            # wait() rather than await: cancelling the caller must not abort the request
+            await asyncio.wait({sending})
+        self._shown.pop(key, None)
+
+    async def _flush_later(self, key: _Key) -> None:
+        await asyncio.sleep(self.delay)
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        task = asyncio.current_task()
+        assert task is not None
+        self._sending[key] = task
+        try:
+            await self._send(key, pending)
+        finally:
+            if self._sending.get(key) is task:
+                del self._sending[key]
+
+    async def _send(self, key: _Key, pending: _PendingEdit) -> None:
+        wanted = _fingerprint(pending.text, pending.reply_markup)
+        shown = self._shown.get(key)
+        if shown is None:
+            shown = _fingerprint(pending.message.text, pending.message.reply_markup)
+        if wanted == shown:
+            self.skipped += 1
+            return
+        try:
+            await pending.message.edit_text(pending.text, reply_markup=pending.reply_markup)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                logger.warning("Debounced edit failed for %s: %s", key, e)
+                return
+        except Exception:
+            logger.exception("Debounced edit failed for %s", key)
+            return
+        self.sent += 1
+        self._shown[key] = wanted
+        self._shown.move_to_end(key)
+        while len(self._shown) > self.max_tracked:
+            self._shown.popitem(last=False)
+
+
+_debouncer = EditDebouncer()
+
+
+def get_edit_debouncer() -> EditDebouncer:
+    return _debouncer
+
+
+__all__ = ["EditDebouncer", "get_edit_debouncer"]
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import math
+import threading
+from typing import Any, Callable, Iterable, Sequence
+
+logger = logging.getLogger()
+
+DEFAULT_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Metrics are updated from the event loop and from worker threads (DB hooks)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type_name}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels_text(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def replace_all(self, values: dict[LabelValues, float]) -> None:
+        """Swap the whole label set at once (drops series that disappeared)."""
+        with self._lock:
+            self._values = dict(values)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels_text(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts..., sum, count]
+        self._values: dict[LabelValues, list[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, **labels: Any) -> float:
+        row = self._values.get(self._key(labels))
+        return row[-1] if row else 0.0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, row in items:
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += row[i]
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_labels_text(self.labelnames, key, le)} {_format_value(cumulative)}"
+            yield f"{self.name}_sum{_labels_text(self.labelnames, key)} {_format_value(row[-2])}"
+            yield f"{self.name}_count{_labels_text(self.labelnames, key)} {_format_value(row[-1])}"
+
+
+Collector = Callable[[], Any]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Collector] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Collector) -> None:
+        """Register a callable (sync or async) that refreshes gauges right before a scrape."""
+        self._collectors.append(collector)
+
+    async def collect(self) -> None:
+        for collector in self._collectors:
+            try:
+                result = collector()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Metrics collector failed: %s", getattr(collector, "__name__", collector))
+
+    def render(self) -> str:
+        return "".join(m.render() for m in self._metrics.values())
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def histogram(
+    name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+
+# --- Bot metrics -----------------------------------------------------------------------------
+
+UPDATE_SECONDS = histogram(
+    "pnlbot_update_duration_seconds", "Total time to process an update", ["event_type"]
+)
+HANDLER_SECONDS = histogram(
+    "pnlbot_handler_duration_seconds", "Handler latency (including inner middlewares)", ["handler"]
+)
+HANDLER_ERRORS = counter("pnlbot_handler_errors_total", "Updates that ended with an exception", ["handler"])
+MIDDLEWARE_SECONDS = histogram(
+    "pnlbot_middleware_duration_seconds",
+    "Own time spent in a middleware (excluding downstream handlers)",
+    ["middleware"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 2.5),
+)
+DB_QUERY_SECONDS = histogram("pnlbot_db_query_duration_seconds", "SQL statement execution time", ["kind"])
+DB_POOL = gauge("pnlbot_db_pool_connections", "Connection pool state", ["state"])
+TELETHON_RPC_TOTAL = counter("pnlbot_telethon_rpc_total", "MTProto requests sent via Telethon", ["method", "status"])
+TELETHON_RPC_SECONDS = histogram(
+    "pnlbot_telethon_rpc_duration_seconds",
+    "MTProto request time including flood-wait sleeps",
+    ["method"],
+)
+JOB_SECONDS = histogram(
+    "pnlbot_job_duration_seconds",
+    "Scheduled job duration",
+    ["job"],
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0),
+)
+JOB_FAILURES = counter("pnlbot_job_failures_total", "Scheduled job failures", ["job"])
+JOB_LAST_SUCCESS = gauge("pnlbot_job_last_success_timestamp_seconds", "Unix time of the last successful run", ["job"])
+RATE_LIMIT_EVENTS = counter(
+    "pnlbot_rate_limit_events_total",
+    "Updates seen by the rate limiter by outcome (passed/throttled/dropped/coalesced)",
+    ["outcome"],
+)
+RATE_LIMIT_BUCKETS = gauge("pnlbot_rate_limit_buckets", "Per-user and per-chat token buckets held in memory")
+CHANNEL_LAST_SUCCESS = gauge(
+    "pnlbot_channel_last_success_timestamp_seconds",
+    "Unix time of the last successful stats collection per channel (Channel.last_success_at)",
+    ["channel_id", "title"],
+)
+
+
+def query_kind(statement: str) -> str:
+    """First SQL keyword, lowercased (select/insert/update/...), for low-cardinality labels."""
+    head = statement.lstrip().split(None, 1)
+    kind = head[0].lower() if head else ""
+    return kind if kind in ("select", "insert", "update", "delete", "with") else "other"
+
+
+async def run_collectors() -> None:
+    await REGISTRY.collect()
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
+
+
+def _refresh_pool_gauges() -> None:
+    from bot.db.base import get_engine
+    from bot.db.instrumentation import pool_status
+
+    try:
+        status = pool_status(get_engine())
+    except RuntimeError:
+        # Engine is not initialized yet
+        return
+    DB_POOL.replace_all({(name,): float(value) for name, value in status.items()})
+
+
+_CHANNELS_REFRESH_SECONDS = 60.0
+_channels_refreshed_at: float | None = None
+
+
+async def _refresh_channel_gauges() -> None:
+    global _channels_refreshed_at
+    loop = asyncio.get_running_loop()
+    # The scrape interval is usually shorter than collection cadence; avoid a query per scrape
+    if _channels_refreshed_at is not None and loop.time() - _channels_refreshed_at < _CHANNELS_REFRESH_SECONDS:
+        return
+    _channels_refreshed_at = loop.time()
+
+    def _load() -> dict[LabelValues, float]:
+        from bot.db.base import read_session_scope
+        from bot.db.models import Channel
+
+        with read_session_scope() as s:
+            rows = (
+                s.query(Channel.id, Channel.title, Channel.last_success_at)
+                .filter(Channel.is_active.is_(True))
+                .all()
+            )
+        return {
+            (str(ch_id), title or ""): (last.timestamp() if last is not None else 0.0)
+            for ch_id, title, last in rows
+        }
+
+    try:
+        values = await asyncio.to_thread(_load)
+    except RuntimeError:
+        # Engine is not initialized yet
+        return
+    CHANNEL_LAST_SUCCESS.replace_all(values)
+
+
+REGISTRY.add_collector(_refresh_pool_gauges)
+REGISTRY.add_collector(_refresh_channel_gauges)
+
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "REGISTRY",
+    "counter",
+    "gauge",
+    "histogram",
+    "query_kind",
+    "run_collectors",
+    "render_latest",
+]
@@ -2,16 +2,43 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import time
 from typing import Optional
 
 from telethon import TelegramClient
+from telethon.errors import FloodWaitError
 from telethon.sessions import StringSession
 
+from bot.services.metrics import TELETHON_RPC_SECONDS, TELETHON_RPC_TOTAL
+from bot.services.tracing import span
 from bot.settings import Settings
 
 logger = logging.getLogger()
 
 
+class InstrumentedTelegramClient(TelegramClient):
+    """TelegramClient that records per-method RPC counts and time (incl. flood-wait sleeps)."""
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):  # type: ignore[no-untyped-def]
+        method = "batch" if isinstance(request, (list, tuple)) else type(request).__name__
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            with span(f"telethon {method}"):
+                return await super()._call(
+                    sender, request, ordered=ordered, flood_sleep_threshold=flood_sleep_threshold
+                )
+        except FloodWaitError:
+            status = "flood_wait"
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            TELETHON_RPC_TOTAL.inc(method=method, status=status)
+            TELETHON_RPC_SECONDS.observe(time.perf_counter() - started, method=method)
+
+
 _client: Optional[TelegramClient] = None
 
 
@@ -23,7 +50,7 @@ async def init_telethon(settings: Settings) -> TelegramClient:
     if not settings.telethon_session_string:
         raise RuntimeError("TELETHON_SESSION_STRING is required and must be set")
     session = StringSession(settings.telethon_session_string)
-    client = TelegramClient(session, settings.telethon_api_id, settings.telethon_api_hash)
+    client = InstrumentedTelegramClient(session, settings.telethon_api_id, settings.telethon_api_hash)
     await client.connect()
     if not await client.is_user_authorized():
         logger.error("Telethon session is not authorized. Interactive login is required to proceed.")
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import functools
+import io
+import logging
+import marshal
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, TypeVar
+
+logger = logging.getLogger()
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLE = "sample"
+
+# Targets that can be armed from the admin command
+TARGETS = ("collect", "stats")
+
+# (file name, content) pairs plus a short caption
+Deliver = Callable[[list[tuple[str, bytes]], str], Awaitable[None]]
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+@dataclass
+class _ProfileRequest:
+    mode: str
+    deliver: Deliver
+
+
+_armed: dict[str, _ProfileRequest] = {}
+
+
+def arm_profile(target: str, mode: str, deliver: Deliver) -> None:
+    """Profile the next call of ``target`` and hand the results to ``deliver``."""
+    if target not in TARGETS:
+        raise ValueError(f"Unknown profile target: {target}")
+    if mode not in (MODE_CPROFILE, MODE_SAMPLE):
+        raise ValueError(f"Unknown profile mode: {mode}")
+    _armed[target] = _ProfileRequest(mode=mode, deliver=deliver)
+
+
+def is_armed(target: str) -> bool:
+    return target in _armed
+
+
+class _StackSampler:
+    """Sample the event loop thread's Python stack; output in collapsed (flamegraph) format."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self) -> bytes:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+
+def _pstats_files(profiler: cProfile.Profile, target: str) -> list[tuple[str, bytes]]:
+    stats = pstats.Stats(profiler)
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(60)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return [
+        # Same format as Profile.dump_stats: open with pstats.Stats(path) or snakeviz
+        (f"{target}-{stamp}.pstats", marshal.dumps(stats.stats)),  # type: ignore[attr-defined]
+        (f"{target}-{stamp}.txt", text.getvalue().encode()),
+    ]
+
+
+def profiled(target: str) -> Callable[[F], F]:
+    """Decorator: run the wrapped coroutine under a profiler when ``target`` is armed."""
+
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            request = _armed.pop(target, None)
+            if request is None:
+                return await fn(*args, **kwargs)
+
+            started = time.perf_counter()
+            if request.mode == MODE_SAMPLE:
+                sampler = _StackSampler(threading.get_ident())
+                sampler.start()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    sampler.stop()
+                    elapsed = time.perf_counter() - started
+                    stamp = time.strftime("%Y%m%d-%H%M%S")
+                    await _deliver(
+                        request,
+                        [(f"{target}-{stamp}.collapsed", sampler.collapsed())],
+                        f"{target}: {elapsed:.1f}s, {sum(sampler.stacks.values())} samples (collapsed stacks)",
+                    )
+
+            # cProfile hooks the whole thread: other tasks interleaving on the loop are included
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - started
+                await _deliver(
+                    request,
+                    _pstats_files(profiler, target),
+                    f"{target}: {elapsed:.1f}s (cProfile, includes concurrent tasks)",
+                )
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+async def _deliver(request: _ProfileRequest, files: list[tuple[str, bytes]], caption: str) -> None:
+    try:
+        await request.deliver(files, caption)
+    except Exception:
+        logger.exception("Failed to deliver profile results")
+
+
+_mem_baseline: tracemalloc.Snapshot | None = None
+
+
+async def memory_diff(top: int = 40) -> tuple[str, bytes | None]:
+    """Take a tracemalloc snapshot and diff it against the previous one.
+
+    The first call starts tracing and only records the baseline.
+    """
+    global _mem_baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(10)
+        _mem_baseline = None
+
+    def _snapshot_and_diff() -> tuple[tracemalloc.Snapshot, list[tracemalloc.StatisticDiff] | None]:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+        )
+        diff = snapshot.compare_to(_mem_baseline, "lineno") if _mem_baseline is not None else None
+        return snapshot, diff
+
+    snapshot, diff = await asyncio.to_thread(_snapshot_and_diff)
+    _mem_baseline = snapshot
+    current, peak = tracemalloc.get_traced_memory()
+    summary = f"tracemalloc: current={current / 1e6:.1f}MB peak={peak / 1e6:.1f}MB"
+    if diff is None:
+        return summary + "\nБазовый снимок сохранён, повторите команду позже для сравнения.", None
+    lines = [summary, f"Top {top} allocation changes since previous snapshot:", ""]
+    lines.extend(str(stat) for stat in diff[:top])
+    return summary, "\n".join(lines).encode()
+
+
+def stop_memory_tracing() -> None:
+    global _mem_baseline
+    _mem_baseline = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+__all__ = [
+    "MODE_CPROFILE",
+    "MODE_SAMPLE",
+    "TARGETS",
+    "arm_profile",
+    "is_armed",
+    "profiled",
+    "memory_diff",
+    "stop_memory_tracing",
+]
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable, Mapping
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from bot.db.models import Operation, OperationChannel
+from bot.services.catalog import CatalogSnapshot, CategoryInfo, ChannelInfo
+from bot.services.dedup import build_dedup_hash
+from bot.services.parsing import AmountParseError, parse_amount_rub_to_kop
+
+MAX_BATCH_SIZE = 50
+
+QUICK_ENTRY_USAGE = (
+    "Быстрый ввод: /out <сумма> <категория> [@канал ...] [ссылка на чек] [#комментарий]\n"
+    "Например: /out 1 200,50 ad_purchase @chan1 @chan2 #весенняя закупка\n"
+    "Категория — код или начало названия; без каналов операция общая.\n"
+    "Для категории custom текст после # — обязательное пояснение.\n"
+    f"Можно отправить до {MAX_BATCH_SIZE} операций сразу — по одной на строку."
+)
+
+_AMOUNT_TOKEN_RE = re.compile(r"\d[\d.,]*")
+# "#" starts the comment only at the beginning of a token, so URL fragments survive
+_COMMENT_START_RE = re.compile(r"(?:^|\s)#")
+
+
+class QuickEntryError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class QuickOperation:
+    op_type: int
+    category_id: int
+    category_code: str
+    amount_kop: int
+    channel_ids: tuple[int, ...] = ()
+    receipt_url: str | None = None
+    comment: str | None = None
+    free_text_reason: str | None = None
+
+    @property
+    def is_general(self) -> bool:
+        return not self.channel_ids
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON-friendly form for FSM data."""
+        return {
+            "op_type": self.op_type,
+            "category_id": self.category_id,
+            "category_code": self.category_code,
+            "amount_kop": self.amount_kop,
+            "channel_ids": list(self.channel_ids),
+            "receipt_url": self.receipt_url,
+            "comment": self.comment,
+            "free_text_reason": self.free_text_reason,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "QuickOperation":
+        return cls(**{**data, "channel_ids": tuple(int(cid) for cid in data.get("channel_ids") or ())})
+
+
+def _find_category(token: str, op_type: int, catalog: CatalogSnapshot) -> CategoryInfo:
+    allowed = {cat_id for cat_id, _, _ in catalog.categories_for(op_type)}
+    candidates = [catalog.categories_by_id[cat_id] for cat_id in allowed]
+    needle = token.casefold()
+    matches = [c for c in candidates if c.code.casefold() == needle]
+    if not matches:
+        matches = [c for c in candidates if c.name.casefold().startswith(needle)]
+    if len(matches) != 1:
+        raise QuickEntryError(f"Категория «{token}» не найдена или неоднозначна")
+    return matches[0]
+
+
+def _find_channel(token: str, catalog: CatalogSnapshot) -> ChannelInfo:
+    needle = token[1:].casefold()
+    matches = [ch for ch in catalog.active_channels if (ch.username or "").casefold() == needle]
+    if not matches and needle:
+        matches = [ch for ch in catalog.active_channels if ch.display_name.casefold().startswith(needle)]
+    if len(matches) != 1:
+        raise QuickEntryError(f"Канал «{token}» не найден или неоднозначен")
+    return matches[0]
+
+
+def parse_quick_line(line: str, op_type: int, catalog: CatalogSnapshot) -> QuickOperation:
+    """Parse ``<amount> <category> [@channel ...] [receipt url] [#comment]``."""
+    m = _COMMENT_START_RE.search(line)
+    body, comment = (line[: m.start()], line[m.end() :]) if m else (line, "")
+    tokens = body.split()
+    n_amount = 0
+    while n_amount < len(tokens) and _AMOUNT_TOKEN_RE.fullmatch(tokens[n_amount]):
+        n_amount += 1
+    if n_amount == 0:
+        raise QuickEntryError("Строка должна начинаться с суммы")
+    try:
+        # "1 200,50" arrives as two tokens
+        amount_kop = parse_amount_rub_to_kop(" ".join(tokens[:n_amount]))
+    except AmountParseError as e:
+        raise QuickEntryError(str(e)) from e
+    rest = tokens[n_amount:]
+    if not rest:
+        raise QuickEntryError("Не указана категория")
+    category = _find_category(rest[0], op_type, catalog)
+    channel_ids: list[int] = []
+    receipt_url: str | None = None
+    for token in rest[1:]:
+        if token.startswith("@"):
+            ch = _find_channel(token, catalog)
+            if ch.id not in channel_ids:
+                channel_ids.append(ch.id)
+        elif token.startswith(("http://", "https://")) and receipt_url is None:
+            receipt_url = token
+        else:
+            raise QuickEntryError(f"Не понял «{token}»: каналы пишутся через @, комментарий — после #")
+    text = comment.strip()
+    if category.code == "custom":
+        if not text:
+            raise QuickEntryError("Для категории custom нужно пояснение после #")
+        return QuickOperation(
+            op_type=op_type,
+            category_id=category.id,
+            category_code=category.code,
+            amount_kop=amount_kop,
+            channel_ids=tuple(channel_ids),
+            receipt_url=receipt_url,
+            free_text_reason=text,
+        )
+    return QuickOperation(
+        op_type=op_type,
+        category_id=category.id,
+        category_code=category.code,
+        amount_kop=amount_kop,
+        channel_ids=tuple(channel_ids),
+        receipt_url=receipt_url,
+        comment=text or None,
+    )
+
+
+def parse_quick_entry(text: str, op_type: int, catalog: CatalogSnapshot) -> tuple[list[QuickOperation], list[str]]:
+    """Parse one operation per non-empty line; returns the operations and per-line errors."""
+    ops: list[QuickOperation] = []
+    errors: list[str] = []
+    lines = [(i, line.strip()) for i, line in enumerate(text.splitlines(), start=1) if line.strip()]
+    if len(lines) > MAX_BATCH_SIZE:
+        return [], [f"Слишком много строк: {len(lines)}, максимум {MAX_BATCH_SIZE}"]
+    for i, line in lines:
+        try:
+            ops.append(parse_quick_line(line, op_type, catalog))
+        except QuickEntryError as e:
+            errors.append(f"Строка {i}: {e}")
+    return ops, errors
+
+
+def dedup_hash_for(op: QuickOperation, tg_user_id: int, created_at: datetime) -> str:
+    return build_dedup_hash(
+        tg_user_id=tg_user_id,
+        op_type=op.op_type,
+        category_code=op.category_code,
+        amount_kop=op.amount_kop,
+        channel_ids=op.channel_ids,
+        is_general=op.is_general,
+        created_at=created_at,
+    )
+
+
+def batch_collisions(ops: Iterable[QuickOperation], tg_user_id: int, created_at: datetime) -> dict[int, int]:
+    """Positions (0-based) of operations that repeat an earlier one of the batch -> that one's position.
+
+    A batch is saved with one timestamp, so such operations share a dedup hash and only the
+    first of them is stored.
+    """
+    first: dict[str, int] = {}
+    repeats: dict[int, int] = {}
+    for i, op in enumerate(ops):
+        dedup = dedup_hash_for(op, tg_user_id, created_at)
+        if dedup in first:
+            repeats[i] = first[dedup]
+        else:
+            first[dedup] = i
+    return repeats
+
+
+def operation_values(op: QuickOperation, created_at: datetime, db_user_id: int | None, dedup_hash: str) -> dict[str, Any]:
+    return {
+        "created_at": created_at,
+        "op_type": op.op_type,
+        "category_id": op.category_id,
+        "amount_kop": op.amount_kop,
+        "currency": "RUB",
+        "free_text_reason": op.free_text_reason,
+        "receipt_url": op.receipt_url,
+        "comment": op.comment,
+        "created_by_user_id": db_user_id,
+        "is_general": op.is_general,
+        "dedup_hash": dedup_hash,
+    }
+
+
+def bulk_insert_operations(
+    s: Session, rows: list[dict[str, Any]], channels_by_hash: Mapping[str, Iterable[int]]
+) -> int:
+    """Multi-row ``INSERT ... ON CONFLICT (dedup_hash) DO NOTHING`` plus one executemany of channel links.
+
+    ``rows`` must have distinct dedup hashes; returns how many operations were actually inserted.
+    """
+    if not rows:
+        return 0
+    insert = postgresql.insert if s.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = (
+        insert(Operation)
+        .on_conflict_do_nothing(index_elements=[Operation.dedup_hash])
+        .returning(Operation.id, Operation.dedup_hash)
+    )
+    inserted = s.execute(stmt, rows).all()
+    links = [
+        {"operation_id": int(op_id), "channel_id": int(ch_id)}
+        for op_id, dedup in inserted
+        for ch_id in channels_by_hash.get(dedup, ())
+    ]
+    if links:
+        s.execute(OperationChannel.insert(), links)
+    return len(inserted)
+
+
+def insert_operations(
+    s: Session,
+    ops: Iterable[QuickOperation],
+    tg_user_id: int,
+    db_user_id: int | None,
+    created_at: datetime,
+) -> tuple[int, int]:
+    """Insert operations and their channel links in two statements; returns (inserted, duplicates).
+
+    Dedup follows ``build_dedup_hash``: rows that collide with an existing operation (or with
+    an earlier row of the same batch) are skipped via ``ON CONFLICT (dedup_hash) DO NOTHING``.
+    """
+    rows: dict[str, dict[str, Any]] = {}
+    channels_by_hash: dict[str, tuple[int, ...]] = {}
+    total = 0
+    for op in ops:
+        total += 1
+        dedup = dedup_hash_for(op, tg_user_id, created_at)
+        if dedup not in rows:
+            rows[dedup] = operation_values(op, created_at, db_user_id, dedup)
+            channels_by_hash[dedup] = op.channel_ids
+    inserted = bulk_insert_operations(s, list(rows.values()), channels_by_hash)
+    return inserted, total - inserted
+
+
+__all__ = [
+    "MAX_BATCH_SIZE",
+    "QUICK_ENTRY_USAGE",
+    "QuickEntryError",
+    "QuickOperation",
+    "parse_quick_line",
+    "parse_quick_entry",
+    "dedup_hash_for",
+    "batch_collisions",
+    "operation_values",
+    "bulk_insert_operations",
+    "insert_operations",
+]
@@ -1,21 +1,58 @@
 from __future__ import annotations
 
 import logging
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Iterator
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from aiogram import Bot
 
+from bot.db.instrumentation import track_queries
 from bot.services.time import MSK_TZ
 from bot.services.channel_stats import collect_daily_for_all_channels
 from bot.services.alerts import notify_daily_stats
+from bot.services.error_aggregator import flush_error_summaries, get_error_aggregator
+from bot.services.leader import run_as_leader
+from bot.services.metrics import JOB_FAILURES, JOB_LAST_SUCCESS, JOB_SECONDS
+from bot.services.tracing import span
 
 logger = logging.getLogger()
 
 _scheduler: AsyncIOScheduler | None = None
 
 
+class _JobRun:
+    failed = False
+    # Another instance ran it (see run_as_leader)
+    skipped = False
+
+
+@contextmanager
+def job_timer(job_id: str) -> Iterator[_JobRun]:
+    """Record duration, failures and last success time of a scheduled job."""
+    run = _JobRun()
+    started = time.perf_counter()
+    try:
+        with span(f"job {job_id}") as job_span:
+            yield run
+            if run.failed and job_span is not None:
+                job_span.error = "job failed"
+    except Exception:
+        run.failed = True
+        raise
+    finally:
+        if not run.skipped:
+            JOB_SECONDS.observe(time.perf_counter() - started, job=job_id)
+            if run.failed:
+                JOB_FAILURES.inc(job=job_id)
+            else:
+                JOB_LAST_SUCCESS.set(time.time(), job=job_id)
+
+
 def start_scheduler() -> AsyncIOScheduler:
     global _scheduler
     if _scheduler is not None:
@@ -30,29 +67,56 @@ def start_scheduler() -> AsyncIOScheduler:
 def add_daily_job(bot: Bot) -> None:
     scheduler = start_scheduler()
 
+    async def _collect() -> None:
+        # Use today's local date for snapshot (at 00:00 job runs for the new day)
+        await collect_daily_for_all_channels(datetime.now(tz=MSK_TZ))
+
     async def _job_wrapper() -> None:
-        try:
-            # Use today's local date for snapshot (at 00:00 job runs for the new day)
-            await collect_daily_for_all_channels(datetime.now(tz=MSK_TZ))
-        except Exception:
-            logger.exception("Daily collection job failed")
+        run_key = datetime.now(tz=MSK_TZ).date().isoformat()
+        with track_queries("job:daily_collect") as stats, job_timer("daily_collect") as job:
+            try:
+                # Only one replica collects; the others take over if it dies mid-run
+                job.skipped = not await run_as_leader("daily_collect", run_key, _collect)
+            except Exception:
+                job.failed = True
+                logger.exception("Daily collection job failed")
+        logger.info("Daily collection job queries=%s db_ms=%.1f", stats.count, stats.total_ms)
 
     # Run at 23:45 MSK daily
     trigger = CronTrigger(hour=23, minute=45, timezone=MSK_TZ)
     scheduler.add_job(_job_wrapper, trigger, id="daily_collect", replace_existing=True)
     logger.info("Daily job scheduled at 23:45 MSK")
 
+    async def _notify() -> None:
+        await notify_daily_stats(bot)
+
     async def _notify_job() -> None:
-        try:
-            await notify_daily_stats(bot)
-        except Exception:
-            logger.exception("Daily stats notify job failed")
+        run_key = datetime.now(tz=MSK_TZ).date().isoformat()
+        with track_queries("job:daily_notify_stats") as stats, job_timer("daily_notify_stats") as job:
+            try:
+                job.skipped = not await run_as_leader("daily_notify_stats", run_key, _notify)
+            except Exception:
+                job.failed = True
+                logger.exception("Daily stats notify job failed")
+        logger.info("Daily stats notify job queries=%s db_ms=%.1f", stats.count, stats.total_ms)
 
     notify_trigger = CronTrigger(hour=9, minute=0, timezone=MSK_TZ)
     scheduler.add_job(_notify_job, notify_trigger, id="daily_notify_stats", replace_existing=True)
     logger.info("Daily stats notification scheduled at 09:00 MSK")
 
 
+def add_error_summary_job() -> None:
+    """Log repeat counts of errors that stopped recurring (they are otherwise only summarized on the next repeat)."""
+    scheduler = start_scheduler()
+    interval = get_error_aggregator().summary_interval
+    scheduler.add_job(
+        flush_error_summaries,
+        IntervalTrigger(seconds=interval, timezone=MSK_TZ),
+        id="flush_error_summaries",
+        replace_existing=True,
+    )
+
+
 def shutdown_scheduler() -> None:
     global _scheduler
     if _scheduler is None:
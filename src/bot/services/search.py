@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import bindparam, func, literal_column, or_, select
+from sqlalchemy.orm import Session
+
+from bot.db.models import Operation
+
+SEARCH_PAGE_SIZE = 5
+MIN_QUERY_LENGTH = 3
+MAX_QUERY_LENGTH = 100
+
+# Must stay identical to the expression of ix_operations_search_trgm (migration 0011):
+# the planner only uses the index for the very same expression. Inlined literals, not bind
+# parameters, for the same reason.
+SEARCH_DOCUMENT = literal_column(
+    "(coalesce(finance.operations.comment, '') || ' ' || "
+    "coalesce(finance.operations.free_text_reason, '') || ' ' || "
+    "coalesce(finance.operations.receipt_url, ''))"
+)
+
+
+@dataclass(frozen=True)
+class SearchPage:
+    rows: list[Any]
+    offset: int
+    has_more: bool
+
+
+_COLUMNS = (
+    Operation.id,
+    Operation.created_at,
+    Operation.op_type,
+    Operation.category_id,
+    Operation.amount_kop,
+    Operation.is_general,
+    Operation.free_text_reason,
+    Operation.receipt_url,
+    Operation.comment,
+)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split())[:MAX_QUERY_LENGTH]
+
+
+def query_id(query: str) -> str:
+    """Short id of a normalized query for callback data (the query itself may not fit)."""
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+
+
+def escape_like(value: str) -> str:
+    """Make ``%``, ``_`` and backslashes literal in a LIKE pattern that uses backslash as the escape."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_operations(s: Session, query: str, offset: int = 0, size: int = SEARCH_PAGE_SIZE) -> SearchPage:
+    """Operations whose comment, reason or receipt URL match ``query``, best matches first.
+
+    On Postgres this is ``query <% document`` (pg_trgm word similarity, served by the GIN
+    trigram index) ranked by ``word_similarity``. Elsewhere (tests, local SQLite) it falls
+    back to a substring match ranked by date (SQLite's ``lower()`` only folds ASCII).
+    """
+    query = normalize_query(query)
+    q = bindparam("q", query)
+    if s.get_bind().dialect.name == "postgresql":
+        score = func.word_similarity(q, SEARCH_DOCUMENT)
+        stmt = (
+            select(*_COLUMNS, score.label("score"))
+            .where(
+                q.op("<%")(SEARCH_DOCUMENT)
+                | SEARCH_DOCUMENT.ilike(bindparam("pattern", f"%{escape_like(query)}%"), escape="\\")
+            )
+            .order_by(score.desc(), Operation.created_at.desc(), Operation.id.desc())
+        )
+    else:
+        pattern = f"%{escape_like(query.lower())}%"
+        stmt = (
+            select(*_COLUMNS)
+            .where(
+                or_(
+                    func.lower(Operation.comment).like(pattern, escape="\\"),
+                    func.lower(Operation.free_text_reason).like(pattern, escape="\\"),
+                    func.lower(Operation.receipt_url).like(pattern, escape="\\"),
+                )
+            )
+            .order_by(Operation.created_at.desc(), Operation.id.desc())
+        )
+    rows = s.execute(stmt.offset(offset).limit(size + 1)).all()
+    return SearchPage(rows=rows[:size], offset=offset, has_more=len(rows) > size)
+
+
+__all__ = [
+    "SEARCH_PAGE_SIZE",
+    "MIN_QUERY_LENGTH",
+    "SearchPage",
+    "normalize_query",
+    "query_id",
+    "escape_like",
+    "search_operations",
+]
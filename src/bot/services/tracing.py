@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+logger = logging.getLogger()
+
+FORMAT_JSONL = "jsonl"
+FORMAT_OTLP = "otlp"
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_json(self) -> dict[str, Any]:
+        """Flat span record using OTLP/JSON field names."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error}
+            if self.error
+            else {"code": "STATUS_CODE_OK"},
+        }
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_envelope(spans: list[Span]) -> dict[str, Any]:
+    """ExportTraceServiceRequest in OTLP/JSON (readable by the collector's otlpjsonfile receiver)."""
+    otlp_spans = []
+    for s in spans:
+        record = s.to_json()
+        record["startTimeUnixNano"] = str(s.start_ns)
+        record["endTimeUnixNano"] = str(s.end_ns)
+        record["attributes"] = [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()]
+        otlp_spans.append(record)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "pnlbot"}}]},
+                "scopeSpans": [{"scope": {"name": "bot.services.tracing"}, "spans": otlp_spans}],
+            }
+        ]
+    }
+
+
+class JsonLinesExporter:
+    """Write finished spans to a file from a background thread (no file I/O on the event loop)."""
+
+    def __init__(self, path: str, fmt: str = FORMAT_JSONL, flush_interval: float = 1.0) -> None:
+        self.path = path
+        self.fmt = fmt
+        self.flush_interval = flush_interval
+        self._queue: queue.SimpleQueue[Span | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def _write(self, fh, batch: list[Span]) -> None:  # type: ignore[no-untyped-def]
+        if not batch:
+            return
+        if self.fmt == FORMAT_OTLP:
+            fh.write(json.dumps(_otlp_envelope(batch), ensure_ascii=False, default=str) + "\n")
+        else:
+            for s in batch:
+                fh.write(json.dumps(s.to_json(), ensure_ascii=False, default=str) + "\n")
+        fh.flush()
+
+    def _run(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as fh:
+            stopping = False
+            while not stopping:
+                batch: list[Span] = []
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                try:
+                    self._write(fh, batch)
+                except Exception:
+                    logger.exception("Failed to write trace spans to %s", self.path)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+_current_span: ContextVar[Span | None] = ContextVar("trace_current_span", default=None)
+_exporter: JsonLinesExporter | None = None
+
+
+def init_tracing(path: str, fmt: str = FORMAT_JSONL) -> None:
+    global _exporter
+    if _exporter is not None:
+        return
+    _exporter = JsonLinesExporter(path, fmt)
+    logger.info("Tracing enabled: file=%s format=%s", path, fmt)
+
+
+def shutdown_tracing() -> None:
+    global _exporter
+    if _exporter is None:
+        return
+    exporter, _exporter = _exporter, None
+    exporter.shutdown()
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def start_span(name: str, **attributes: Any) -> tuple[Span, Token] | None:
+    """Open a span as a child of the current one; pair with :func:`end_span`.
+
+    Returns ``None`` (and costs nothing more) when tracing is disabled.
+    """
+    if _exporter is None:
+        return None
+    parent = _current_span.get()
+    s = Span(
+        trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent else None,
+        name=name,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    return s, _current_span.set(s)
+
+
+def end_span(handle: tuple[Span, Token] | None, error: BaseException | None = None) -> None:
+    if handle is None:
+        return
+    s, token = handle
+    s.end_ns = time.time_ns()
+    if error is not None:
+        s.error = f"{type(error).__name__}: {error}"
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # Ended from another context (e.g. a DB hook in a different thread); nothing to restore
+        pass
+    exporter = _exporter
+    if exporter is not None:
+        exporter.export(s)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    handle = start_span(name, **attributes)
+    try:
+        yield handle[0] if handle else None
+    except BaseException as exc:
+        end_span(handle, exc)
+        raise
+    else:
+        end_span(handle)
+
+
+__all__ = [
+    "Span",
+    "JsonLinesExporter",
+    "init_tracing",
+    "shutdown_tracing",
+    "tracing_enabled",
+    "current_span",
+    "start_span",
+    "end_span",
+    "span",
+]
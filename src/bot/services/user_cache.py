@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from bot.db.base import session_scope
+from bot.db.models import User
+from bot.services.time import now_msk
+
+logger = logging.getLogger()
+
+DEFAULT_MAX_SIZE = 10_000
+
+
+class KnownUserCache:
+    """Bounded LRU map tg_user_id -> finance.users.id."""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self._ids: OrderedDict[int, int] = OrderedDict()
+
+    def get(self, tg_user_id: int) -> int | None:
+        db_id = self._ids.get(tg_user_id)
+        if db_id is not None:
+            self._ids.move_to_end(tg_user_id)
+        return db_id
+
+    def put(self, tg_user_id: int, db_user_id: int) -> None:
+        self._ids[tg_user_id] = db_user_id
+        self._ids.move_to_end(tg_user_id)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    def clear(self) -> None:
+        self._ids.clear()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+_cache = KnownUserCache()
+
+# session.info key: users inserted by the session's open transaction, cached once it commits
+_PENDING_USERS = "pending_known_users"
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_users(session: Session) -> None:
+    # Releasing a savepoint fires after_commit too; only the top-level commit makes rows durable
+    if session.in_nested_transaction():
+        return
+    for tg_user_id, db_id in session.info.pop(_PENDING_USERS, {}).items():
+        _cache.put(tg_user_id, db_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending_users(session: Session) -> None:
+    # Any rollback, savepoint included, may have undone the insert; a later miss just re-reads the row
+    session.info.pop(_PENDING_USERS, None)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_pending_users(session: Session, transaction) -> None:  # type: ignore[no-untyped-def]
+    # Closing a session ends its transaction without after_rollback
+    if transaction.parent is None:
+        session.info.pop(_PENDING_USERS, None)
+
+
+def get_known_user_cache() -> KnownUserCache:
+    return _cache
+
+
+def warm_known_users() -> int:
+    """Preload the most recently created users into the cache."""
+    with session_scope() as s:
+        rows = (
+            s.query(User.tg_user_id, User.id)
+            .order_by(User.id.desc())
+            .limit(_cache.max_size)
+            .all()
+        )
+    # Oldest first so the newest end up most recently used
+    for tg_user_id, db_id in reversed(rows):
+        _cache.put(int(tg_user_id), int(db_id))
+    logger.info("Known users cache warmed: %s users", len(rows))
+    return len(rows)
+
+
+def ensure_user(
+    s: Session,
+    tg_user_id: int,
+    first_name: str | None = None,
+    last_name: str | None = None,
+    username: str | None = None,
+) -> int:
+    """Return the db id for ``tg_user_id``, creating the user on first contact.
+
+    Known users are served from memory; unknown ones cost a single
+    ``INSERT ... ON CONFLICT DO NOTHING RETURNING id`` (plus a lookup if another process won).
+    A new id is cached only after ``s`` commits, so a rolled back insert never leaks into the cache.
+    """
+    db_id = _cache.get(tg_user_id)
+    if db_id is not None:
+        return db_id
+    stmt = (
+        pg_insert(User)
+        .values(
+            tg_user_id=tg_user_id,
+            first_name=first_name,
+            last_name=last_name,
+            username=username,
+            created_at=now_msk(),
+        )
+        .on_conflict_do_nothing(index_elements=[User.tg_user_id])
+        .returning(User.id)
+    )
+    db_id = s.execute(stmt).scalar_one_or_none()
+    if db_id is not None:
+        s.info.setdefault(_PENDING_USERS, {})[tg_user_id] = int(db_id)
+        return int(db_id)
+    # Another transaction already committed the row
+    db_id = s.query(User.id).filter(User.tg_user_id == tg_user_id).scalar()
+    _cache.put(tg_user_id, int(db_id))
+    return int(db_id)
+
+
+__all__ = ["KnownUserCache", "get_known_user_cache", "warm_known_users", "ensure_user"]
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import re
 import sys
 from dataclasses import dataclass
 from urllib.parse import quote_plus
 from typing import Set
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 
-def _parse_whitelist(value: str | None) -> Set[int]:
+def _parse_whitelist(value: str | None, name: str = "WHITELIST_USER_IDS") -> Set[int]:
     if not value:
         return set()
     result: Set[int] = set()
@@ -18,7 +23,7 @@ def _parse_whitelist(value: str | None) -> Set[int]:
         if not part:
             continue
         if not part.isdigit():
-            raise ValueError(f"WHITELIST_USER_IDS содержит нечисловой id: {part}")
+            raise ValueError(f"{name} содержит нечисловой id: {part}")
         result.add(int(part))
     return result
 
@@ -30,6 +35,17 @@ def _get_env(name: str, default: str | None = None, required: bool = False) -> s
     return val or ""
 
 
+def _get_float_env(name: str, default: str) -> float:
+    raw = _get_env(name, default=default).strip()
+    try:
+        value = float(raw)
+    except ValueError:
+        raise RuntimeError(f"{name} должен быть числом")
+    if value <= 0:
+        raise RuntimeError(f"{name} должен быть больше нуля")
+    return value
+
+
 def _normalize_host_port(host: str, port: str) -> tuple[str, str]:
     """Return sanitized host and port.
 
@@ -54,13 +70,37 @@ def _normalize_host_port(host: str, port: str) -> tuple[str, str]:
 class Settings:
     bot_token: str
     database_url: str
+    database_url_ro: str | None
+    db_replica_max_lag_seconds: int
     whitelist_user_ids: Set[int]
+    admin_user_ids: Set[int]
     tz: str
     log_level: str
     telethon_api_id: int
     telethon_api_hash: str
     telethon_session_path: str
     telethon_session_string: str | None
+    db_slow_query_ms: int
+    debug_db_awaits: bool
+    rate_limit_policy: str
+    rate_limit_user_rate: float
+    rate_limit_chat_rate: float
+    rate_limit_global_rate: float
+    rate_limit_burst: int
+    http_host: str
+    http_port: int
+    trace_file: str | None
+    trace_format: str
+    fsm_storage: str
+    fsm_state_ttl_hours: int
+    bot_mode: str
+    fsm_cache_seconds: float
+    webhook_url: str | None
+    webhook_path: str
+    webhook_secret: str | None
+    bot_api_base_url: str | None
+    update_concurrency: int
+    update_queue_per_user: int
 
     @classmethod
     def load(cls) -> "Settings":
@@ -88,7 +128,18 @@ class Settings:
                 f"postgresql+psycopg://{enc_user}:{enc_password}@{norm_host}:{norm_port}/{db_name}"
             )
 
+        # Optional read replica for reports; empty means "use primary"
+        database_url_ro = _get_env("DATABASE_URL_RO", default="").strip() or None
+        db_replica_max_lag_str = _get_env("DB_REPLICA_MAX_LAG_SECONDS", default="30").strip()
+        if not db_replica_max_lag_str.isdigit():
+            raise RuntimeError("DB_REPLICA_MAX_LAG_SECONDS должен быть числом")
+        db_replica_max_lag_seconds = int(db_replica_max_lag_str)
+
         whitelist_user_ids = _parse_whitelist(_get_env("WHITELIST_USER_IDS", required=True))
+        # Admin-only commands (/errors, ...); defaults to everyone in the whitelist
+        admin_user_ids = _parse_whitelist(_get_env("ADMIN_USER_IDS", default=""), "ADMIN_USER_IDS") or set(
+            whitelist_user_ids
+        )
         tz = _get_env("TZ", default="Europe/Moscow")
         log_level = _get_env("LOG_LEVEL", default="INFO").upper()
         telethon_api_id_str = _get_env("TELETHON_API_ID", required=True)
@@ -98,33 +149,173 @@ class Settings:
         telethon_api_hash = _get_env("TELETHON_API_HASH", required=True)
         telethon_session_path = _get_env("TELETHON_SESSION_PATH", default="telethon.session")
         telethon_session_string = _get_env("TELETHON_SESSION_STRING", default="").strip() or None
+        db_slow_query_ms_str = _get_env("DB_SLOW_QUERY_MS", default="500").strip()
+        if not db_slow_query_ms_str.isdigit():
+            raise RuntimeError("DB_SLOW_QUERY_MS должен быть числом")
+        db_slow_query_ms = int(db_slow_query_ms_str)
+        debug_db_awaits = _get_env("DEBUG_DB_AWAITS", default="0").strip() in ("1", "true", "True")
+        # Token-bucket limits: events per second per user / per chat / for the whole bot
+        rate_limit_policy = _get_env("RATE_LIMIT_POLICY", default="delay").strip().lower()
+        if rate_limit_policy not in ("delay", "drop", "coalesce"):
+            raise RuntimeError("RATE_LIMIT_POLICY должен быть одним из: delay, drop, coalesce")
+        rate_limit_user_rate = _get_float_env("RATE_LIMIT_USER_RATE", "1.5")
+        rate_limit_chat_rate = _get_float_env("RATE_LIMIT_CHAT_RATE", "1.5")
+        rate_limit_global_rate = _get_float_env("RATE_LIMIT_GLOBAL_RATE", "30")
+        rate_limit_burst_str = _get_env("RATE_LIMIT_BURST", default="3").strip()
+        if not rate_limit_burst_str.isdigit() or int(rate_limit_burst_str) < 1:
+            raise RuntimeError("RATE_LIMIT_BURST должен быть положительным числом")
+        rate_limit_burst = int(rate_limit_burst_str)
+        # Built-in HTTP server (/metrics); 0 disables it
+        http_host = _get_env("HTTP_HOST", default="0.0.0.0").strip()
+        http_port_str = _get_env("HTTP_PORT", default="8080").strip()
+        if not http_port_str.isdigit():
+            raise RuntimeError("HTTP_PORT должен быть числом")
+        http_port = int(http_port_str)
+        # Local tracing: spans are appended to TRACE_FILE as JSON lines (disabled if empty)
+        trace_file = _get_env("TRACE_FILE", default="").strip() or None
+        trace_format = _get_env("TRACE_FORMAT", default="jsonl").strip().lower()
+        if trace_format not in ("jsonl", "otlp"):
+            raise RuntimeError("TRACE_FORMAT должен быть jsonl или otlp")
+        # Where aiogram keeps FSM states (half-entered operations)
+        fsm_storage = _get_env("FSM_STORAGE", default="postgres").strip().lower()
+        if fsm_storage not in ("postgres", "memory"):
+            raise RuntimeError("FSM_STORAGE должен быть postgres или memory")
+        fsm_state_ttl_str = _get_env("FSM_STATE_TTL_HOURS", default="72").strip()
+        if not fsm_state_ttl_str.isdigit() or int(fsm_state_ttl_str) < 1:
+            raise RuntimeError("FSM_STATE_TTL_HOURS должен быть положительным числом")
+        fsm_state_ttl_hours = int(fsm_state_ttl_str)
+        # Update delivery: long polling or webhook served on HTTP_PORT
+        bot_mode = _get_env("BOT_MODE", default="polling").strip().lower()
+        if bot_mode not in ("polling", "webhook"):
+            raise RuntimeError("BOT_MODE должен быть polling или webhook")
+        webhook_url = _get_env("WEBHOOK_URL", default="").strip().rstrip("/") or None
+        webhook_path = "/" + _get_env("WEBHOOK_PATH", default="/webhook").strip().strip("/")
+        webhook_secret = _get_env("WEBHOOK_SECRET", default="").strip() or None
+        if bot_mode == "webhook":
+            if not webhook_url:
+                raise RuntimeError("WEBHOOK_URL обязателен при BOT_MODE=webhook")
+            if not webhook_secret or not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", webhook_secret):
+                raise RuntimeError("WEBHOOK_SECRET обязателен при BOT_MODE=webhook: 1-256 символов A-Z, a-z, 0-9, _ и -")
+            if not http_port:
+                raise RuntimeError("HTTP_PORT не может быть 0 при BOT_MODE=webhook")
+        # Webhook deployments may run several replicas sharing fsm_states: no local FSM cache by default
+        fsm_cache_default = "0" if bot_mode == "webhook" else "600"
+        fsm_cache_str = _get_env("FSM_CACHE_SECONDS", default=fsm_cache_default).strip() or fsm_cache_default
+        try:
+            fsm_cache_seconds = float(fsm_cache_str)
+        except ValueError:
+            raise RuntimeError("FSM_CACHE_SECONDS должен быть числом")
+        if fsm_cache_seconds < 0:
+            raise RuntimeError("FSM_CACHE_SECONDS не может быть отрицательным")
+        # Alternative Bot API server (e.g. a local telegram-bot-api instance)
+        bot_api_base_url = _get_env("BOT_API_BASE_URL", default="").strip().rstrip("/") or None
+        # Updates of one user are processed in order; different users concurrently up to this limit
+        update_concurrency_str = _get_env("UPDATE_CONCURRENCY", default="32").strip()
+        if not update_concurrency_str.isdigit() or int(update_concurrency_str) < 1:
+            raise RuntimeError("UPDATE_CONCURRENCY должен быть положительным числом")
+        update_concurrency = int(update_concurrency_str)
+        update_queue_str = _get_env("UPDATE_QUEUE_PER_USER", default="10").strip()
+        if not update_queue_str.isdigit() or int(update_queue_str) < 1:
+            raise RuntimeError("UPDATE_QUEUE_PER_USER должен быть положительным числом")
+        update_queue_per_user = int(update_queue_str)
         return cls(
             bot_token=bot_token,
             database_url=database_url,
+            database_url_ro=database_url_ro,
+            db_replica_max_lag_seconds=db_replica_max_lag_seconds,
             whitelist_user_ids=whitelist_user_ids,
+            admin_user_ids=admin_user_ids,
             tz=tz,
             log_level=log_level,
             telethon_api_id=telethon_api_id,
             telethon_api_hash=telethon_api_hash,
             telethon_session_path=telethon_session_path,
             telethon_session_string=telethon_session_string,
+            db_slow_query_ms=db_slow_query_ms,
+            debug_db_awaits=debug_db_awaits,
+            rate_limit_policy=rate_limit_policy,
+            rate_limit_user_rate=rate_limit_user_rate,
+            rate_limit_chat_rate=rate_limit_chat_rate,
+            rate_limit_global_rate=rate_limit_global_rate,
+            rate_limit_burst=rate_limit_burst,
+            http_host=http_host,
+            http_port=http_port,
+            trace_file=trace_file,
+            trace_format=trace_format,
+            fsm_storage=fsm_storage,
+            fsm_state_ttl_hours=fsm_state_ttl_hours,
+            bot_mode=bot_mode,
+            fsm_cache_seconds=fsm_cache_seconds,
+            webhook_url=webhook_url,
+            webhook_path=webhook_path,
+            webhook_secret=webhook_secret,
+            bot_api_base_url=bot_api_base_url,
+            update_concurrency=update_concurrency,
+            update_queue_per_user=update_queue_per_user,
         )
 
 
-def setup_logging(level_name: str = "INFO") -> None:
-    level = getattr(logging, level_name.upper(), logging.INFO)
-    formatter = logging.Formatter(
-        fmt="%(asctime)s %(levelname)s %(name)s %(message)s",
-        datefmt="%Y-%m-%dT%H:%M:%S%z",
-    )
+_LOG_RECORD_FIELDS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class _JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra={...}`` fields are emitted as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: dict[str, object] = {
+            "ts": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _LOG_RECORD_FIELDS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """Render message and traceback in the caller thread, keep formatting to the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: QueueListener | None = None
 
-    class _MaxLevelFilter(logging.Filter):
-        def __init__(self, max_level: int) -> None:
-            super().__init__()
-            self.max_level = max_level
 
-        def filter(self, record: logging.LogRecord) -> bool:  # type: ignore[override]
-            return record.levelno < self.max_level
+def stop_logging() -> None:
+    """Flush queued records and stop the background listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level_name: str = "INFO") -> None:
+    global _listener
+    level = getattr(logging, level_name.upper(), logging.INFO)
+    datefmt = "%Y-%m-%dT%H:%M:%S%z"
+    if os.environ.get("LOG_FORMAT", "").strip().lower() == "json":
+        formatter: logging.Formatter = _JsonFormatter(datefmt=datefmt)
+    else:
+        formatter = logging.Formatter(
+            fmt="%(asctime)s %(levelname)s %(name)s %(message)s",
+            datefmt=datefmt,
+        )
 
     # stdout handler: emit all logs (including ERROR) to stdout as well
     stdout_handler = logging.StreamHandler(stream=sys.stdout)
@@ -136,11 +327,7 @@ def setup_logging(level_name: str = "INFO") -> None:
     stderr_handler.setFormatter(formatter)
     stderr_handler.setLevel(logging.ERROR)
 
-    root = logging.getLogger()
-    root.setLevel(level)
-    root.handlers.clear()
-    root.addHandler(stdout_handler)
-    root.addHandler(stderr_handler)
+    handlers: list[logging.Handler] = [stdout_handler, stderr_handler]
 
     # Optional file handler
     log_file = os.environ.get("LOG_FILE", "").strip()
@@ -152,10 +339,22 @@ def setup_logging(level_name: str = "INFO") -> None:
             )
             file_handler.setFormatter(formatter)
             file_handler.setLevel(level)
-            root.addHandler(file_handler)
+            handlers.append(file_handler)
         except Exception:
             # If file logging fails, continue without breaking the app
-            root.exception("Failed to initialize file logger: %s", log_file)
+            logging.getLogger().exception("Failed to initialize file logger: %s", log_file)
+
+    # Handlers do blocking I/O, so they run in a background thread fed by a queue;
+    # the event loop only pays for an in-memory enqueue
+    stop_logging()
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers.clear()
+    root.addHandler(_QueueHandler(log_queue))
 
     # Ensure verbose logs from aiogram are visible
     for logger_name in (
@@ -170,4 +369,7 @@ def setup_logging(level_name: str = "INFO") -> None:
     logging.captureWarnings(True)
 
 
-__all__ = ["Settings", "setup_logging"]
+atexit.register(stop_logging)
+
+
+__all__ = ["Settings", "setup_logging", "stop_logging"]
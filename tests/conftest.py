@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Iterator
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.sqlite import DATETIME as SQLITE_DATETIME
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.types import BigInteger, DateTime, SmallInteger
+
+from bot.db import base as db_base
+from bot.db.models import Base
+from bot.services.catalog import invalidate_catalog
+
+
+@compiles(BigInteger, "sqlite")
+@compiles(SmallInteger, "sqlite")
+def _sqlite_integer(type_, compiler, **kw):  # type: ignore[no-untyped-def]
+    # SQLite only autoincrements "INTEGER PRIMARY KEY" columns
+    return "INTEGER"
+
+
+class _LenientSqliteDateTime(SQLITE_DATETIME):
+    # Models keep snapshot dates in DateTime columns (psycopg accepts plain dates there)
+    def bind_processor(self, dialect):  # type: ignore[no-untyped-def]
+        process = super().bind_processor(dialect)
+
+        def _process(value):  # type: ignore[no-untyped-def]
+            if isinstance(value, date) and not isinstance(value, datetime):
+                # Same text form as SQLite DATE binds, so comparisons with dates line up
+                return value.isoformat()
+            return process(value) if process else value
+
+        return _process
+
+
+@pytest.fixture
+def db_engine(monkeypatch: pytest.MonkeyPatch, tmp_path) -> Iterator[Engine]:  # type: ignore[no-untyped-def]
+    """SQLite engine with the ``finance`` schema, wired into ``bot.db.base``.
+
+    File-backed so that every pooled connection (worker threads included) sees the same
+    data with its own transactions, as with Postgres.
+    """
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'main.db'}",
+        connect_args={"check_same_thread": False, "timeout": 10},
+    )
+    engine.dialect.colspecs = {**engine.dialect.colspecs, DateTime: _LenientSqliteDateTime}
+    finance_path = str(tmp_path / "finance.db")
+
+    @event.listens_for(engine, "connect")
+    def _attach_schema(dbapi_conn, conn_record):  # type: ignore[no-untyped-def]
+        dbapi_conn.execute(f"ATTACH DATABASE '{finance_path}' AS finance")
+        # Let SQLAlchemy drive transactions: pysqlite's implicit BEGIN breaks savepoints
+        dbapi_conn.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):  # type: ignore[no-untyped-def]
+        conn.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine)
+    # Cached catalog snapshots must not leak between test databases
+    invalidate_catalog()
+    monkeypatch.setattr(db_base, "_engine", engine)
+    monkeypatch.setattr(
+        db_base,
+        "_SessionLocal",
+        sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True),
+    )
+    yield engine
+    engine.dispose()
+
+
+@dataclass
+class QueryCounter:
+    statements: list[str] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __str__(self) -> str:
+        return "\n".join(f"{i + 1}: {' '.join(st.split())}" for i, st in enumerate(self.statements))
+
+
+@pytest.fixture
+def count_queries(db_engine: Engine):
+    """Count SQL statements executed on the test engine inside a ``with`` block."""
+
+    @contextmanager
+    def _count() -> Iterator[QueryCounter]:
+        counter = QueryCounter()
+
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+            counter.statements.append(statement)
+
+        event.listen(db_engine, "before_cursor_execute", _before_cursor_execute)
+        try:
+            yield counter
+        finally:
+            event.remove(db_engine, "before_cursor_execute", _before_cursor_execute)
+
+    return _count
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+
+from bot.db.base import session_scope
+from bot.db.models import Category, Channel
+from bot.services.catalog import catalog_snapshot, get_catalog, invalidate_catalog
+from bot.services.time import now_msk
+from bot.types.enums import DEFAULT_CATEGORY_SEED, OperationType
+
+
+def _seed() -> None:
+    with session_scope() as s:
+        for code, name in DEFAULT_CATEGORY_SEED:
+            s.add(Category(code=code, name=name, is_active=True))
+        s.add(Channel(tg_chat_id=-1001, title="first", created_at=now_msk(), is_active=True))
+        s.add(Channel(tg_chat_id=-1002, title="paused", created_at=now_msk(), is_active=False))
+
+
+def test_snapshot_is_cached_until_commit_invalidates(db_engine, count_queries) -> None:
+    _seed()
+    get_catalog().warm()
+
+    with count_queries() as counter:
+        snap = asyncio.run(catalog_snapshot())
+        assert asyncio.run(catalog_snapshot()) is snap
+    assert counter.count == 0
+
+    income = {code for _, _, code in snap.categories_for(OperationType.INCOME.value)}
+    assert "ad_revenue" in income and "ad_purchase" not in income
+    assert [ch.title for ch in snap.channel_page().items] == ["first"]
+
+    with session_scope() as s:
+        s.add(Channel(tg_chat_id=-1003, title="second", created_at=now_msk(), is_active=True))
+        invalidate_catalog(s)
+        # Not committed yet: other updates keep using the old snapshot
+        assert get_catalog()._snapshot is snap
+
+    fresh = asyncio.run(catalog_snapshot())
+    assert fresh is not snap
+    assert [ch.title for ch in fresh.channel_page().items] == ["first", "second"]
+
+
+def test_rolled_back_change_keeps_snapshot(db_engine) -> None:
+    _seed()
+    snap = get_catalog().warm()
+    try:
+        with session_scope() as s:
+            s.add(Channel(tg_chat_id=-1004, title="failed", created_at=now_msk(), is_active=True))
+            invalidate_catalog(s)
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert asyncio.run(catalog_snapshot()) is snap
+
+
+def test_channel_pages_use_keyset_cursors(db_engine) -> None:
+    with session_scope() as s:
+        for i in range(20):
+            s.add(Channel(tg_chat_id=-2000 - i, title=f"news {i:02d}", created_at=now_msk(), is_active=True))
+        s.add(Channel(tg_chat_id=-3000, title="Sport", created_at=now_msk(), is_active=True))
+    snap = get_catalog().warm()
+
+    first = snap.channel_page(size=8)
+    assert [ch.title for ch in first.items] == [f"news {i:02d}" for i in range(8)]
+    assert (first.number, first.pages, first.has_prev, first.has_next) == (1, 3, False, True)
+
+    second = snap.channel_page(after_id=first.items[-1].id, size=8)
+    assert second.items[0].title == "news 08"
+    assert second.after_id == first.items[-1].id
+    back = snap.channel_page(before_id=second.items[0].id, size=8)
+    assert back.items == first.items
+
+    last = snap.channel_page(after_id=second.items[-1].id, size=8)
+    assert [ch.title for ch in last.items] == ["news 16", "news 17", "news 18", "news 19", "Sport"]
+    assert last.number == 3 and not last.has_next
+
+    # Prefix search is case-insensitive; "selected only" keeps title order
+    assert [ch.title for ch in snap.channel_page(prefix="SP").items] == ["Sport"]
+    assert snap.channel_page(prefix="zzz").items == ()
+    picked = [first.items[3].id, first.items[1].id]
+    assert [ch.id for ch in snap.channel_page(only_ids=picked).items] == sorted(picked, key=snap.title_pos.get)
+
+
+def test_savepoint_release_does_not_invalidate_before_outer_commit(db_engine) -> None:
+    _seed()
+    snap = get_catalog().warm()
+    try:
+        with session_scope() as s:
+            with s.begin_nested():
+                s.add(Channel(tg_chat_id=-1005, title="nested", created_at=now_msk(), is_active=True))
+                invalidate_catalog(s)
+            # Savepoint released, outer transaction still open
+            assert get_catalog()._snapshot is snap
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert asyncio.run(catalog_snapshot()) is snap
+
+    with session_scope() as s:
+        with s.begin_nested():
+            s.add(Channel(tg_chat_id=-1006, title="second", created_at=now_msk(), is_active=True))
+            invalidate_catalog(s)
+    fresh = asyncio.run(catalog_snapshot())
+    assert [ch.title for ch in fresh.channel_page().items] == ["first", "second"]
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from bot.db.base import session_scope
+from bot.db.models import Channel
+from bot.handlers.channels import CHANNEL_LIST_PAGE_SIZE, _render_channel_list
+from bot.services.time import now_msk
+
+
+def _callbacks(kb) -> list[str]:
+    return [b.callback_data for row in kb.inline_keyboard for b in row]
+
+
+def _seed(n: int) -> None:
+    with session_scope() as s:
+        for i in range(n):
+            s.add(
+                Channel(
+                    tg_chat_id=-100 - i,
+                    title=f"ch{i}",
+                    created_at=now_msk(),
+                    is_active=i % 3 != 0,
+                    last_error="failed to fetch subscribers" if i == 1 else None,
+                )
+            )
+
+
+def test_channel_list_pages_with_keyset_cursors(db_engine) -> None:
+    _seed(20)
+    text, kb = _render_channel_list("all", "")
+    assert text.splitlines()[0] == "Каналы (все): 20"
+    # Newest first, one numbered line per channel
+    assert "1. ch19" in text and f"{CHANNEL_LIST_PAGE_SIZE}. ch12" in text
+    next_cursor = next(c for c in _callbacks(kb) if c.startswith("chl:all:a"))
+
+    text2, kb2 = _render_channel_list("all", next_cursor.split(":", 2)[2])
+    assert "1. ch11" in text2
+    prev_cursor = next(c for c in _callbacks(kb2) if c.startswith("chl:all:b"))
+    assert _render_channel_list("all", prev_cursor.split(":", 2)[2])[0] == text
+
+
+def test_channel_list_filters(db_engine) -> None:
+    _seed(6)
+    failing, kb = _render_channel_list("failing", "")
+    assert failing.splitlines()[0] == "Каналы (ошибки): 1"
+    assert "ch1 — ошибка сбора" in failing
+    assert not any(c.startswith("chl:failing:a") for c in _callbacks(kb))
+    paused, _ = _render_channel_list("paused", "")
+    assert "ch0 — на паузе" in paused and "ch3 — на паузе" in paused and "ch2" not in paused
@@ -1,6 +1,9 @@
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
+from sqlalchemy.exc import IntegrityError
+
+from bot.handlers.flow_add_operation import _is_dedup_conflict
 from bot.services.dedup import build_dedup_hash
 
 
@@ -9,3 +12,10 @@ def test_dedup_stable_order():
     h1 = build_dedup_hash(1, 1, "ad_revenue", 100, [5, 2, 3], False, dt)
     h2 = build_dedup_hash(1, 1, "ad_revenue", 100, [3, 5, 2], False, dt)
     assert h1 == h2
+
+
+def test_only_dedup_hash_conflicts_count_as_duplicates():
+    dup = IntegrityError("INSERT", {}, Exception("UNIQUE constraint failed: operations.dedup_hash"))
+    other = IntegrityError("INSERT", {}, Exception("FOREIGN KEY constraint failed"))
+    assert _is_dedup_conflict(dup)
+    assert not _is_dedup_conflict(other)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import logging
+
+import pytest
+
+from bot.services.error_aggregator import ErrorAggregator
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _fail(value: int) -> None:
+    raise ValueError(f"bad value {value}")
+
+
+def _raise_and_record(agg: ErrorAggregator, value: int):  # type: ignore[no-untyped-def]
+    try:
+        _fail(value)
+    except ValueError as exc:
+        return agg.record(exc, "processing %s failed", value)
+
+
+def test_repeats_are_summarized(caplog: pytest.LogCaptureFixture) -> None:
+    clock = FakeClock()
+    agg = ErrorAggregator(summary_interval=60.0, clock=clock)
+    with caplog.at_level(logging.WARNING):
+        for i in range(100):
+            clock.now = i * 0.1
+            _raise_and_record(agg, i)
+        clock.now = 61.0
+        _raise_and_record(agg, 100)
+
+    # Different messages, same failure: one fingerprint
+    assert [e.count for e in agg.top()] == [101]
+    errors = [r for r in caplog.records if r.levelno == logging.ERROR]
+    summaries = [r for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(errors) == 1 and errors[0].exc_info
+    assert len(summaries) == 1
+    assert "repeated 100 times" in summaries[0].getMessage()
+
+
+def test_distinct_failures_are_ranked() -> None:
+    agg = ErrorAggregator(clock=FakeClock())
+    for i in range(3):
+        _raise_and_record(agg, i)
+    try:
+        {}["missing"]
+    except KeyError as exc:
+        agg.record(exc, "lookup failed")
+
+    top = agg.top(10)
+    assert [e.count for e in top] == [3, 1]
+    assert top[0].exc_type.endswith("ValueError")
+    assert top[0].fingerprint in agg.format_top()
+
+
+def test_flush_reports_repeats_that_stopped(caplog: pytest.LogCaptureFixture) -> None:
+    clock = FakeClock()
+    agg = ErrorAggregator(summary_interval=60.0, clock=clock)
+    for i in range(5):
+        _raise_and_record(agg, i)
+
+    with caplog.at_level(logging.WARNING):
+        # Nothing is due yet unless forced (shutdown)
+        assert agg.flush() == 0
+        clock.now = 61.0
+        assert agg.flush() == 1
+        assert agg.flush(force=True) == 0
+
+    summaries = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(summaries) == 1
+    assert "repeated 4 times" in summaries[0] and "ValueError: bad value 4" in summaries[0]
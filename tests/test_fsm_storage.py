@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from datetime import timedelta
+
+from aiogram.fsm.storage.base import StorageKey
+
+from bot.db.base import session_scope
+from bot.db.fsm_storage import PostgresStorage
+from bot.db.models import FsmState
+from bot.handlers.flow_add_operation import AddOpStates
+from bot.middlewares import FsmFlushMiddleware
+
+KEY = StorageKey(bot_id=1, chat_id=1001, user_id=1001)
+
+
+def test_step_writes_are_coalesced_and_survive_restart(db_engine, count_queries) -> None:
+    async def _step() -> None:
+        storage = PostgresStorage(flush_delay=0.01, cleanup_interval=0)
+        await storage.set_state(KEY, AddOpStates.entering_amount)
+        await storage.update_data(KEY, {"op_type": "expense"})
+        await storage.update_data(KEY, {"category_id": 3})
+        await storage.update_data(KEY, {"channel_ids": [1, 2]})
+        await asyncio.sleep(0.1)
+        await storage.close()
+
+    with count_queries() as counter:
+        asyncio.run(_step())
+    writes = [st for st in counter.statements if st.lstrip().upper().startswith("INSERT")]
+    assert len(writes) == 1, str(counter)
+
+    async def _restart() -> None:
+        storage = PostgresStorage(cleanup_interval=0)
+        assert await storage.get_state(KEY) == AddOpStates.entering_amount.state
+        assert await storage.get_data(KEY) == {"op_type": "expense", "category_id": 3, "channel_ids": [1, 2]}
+        # Finishing the flow removes the row
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.close()
+
+    asyncio.run(_restart())
+    with session_scope() as s:
+        assert s.query(FsmState).count() == 0
+
+
+def test_expired_states_are_ignored_and_cleaned_up(db_engine) -> None:
+    async def _run() -> int:
+        storage = PostgresStorage(ttl=timedelta(seconds=-1), cleanup_interval=0)
+        await storage.set_state(KEY, AddOpStates.choosing_category)
+        await storage.close()
+        fresh = PostgresStorage(cleanup_interval=0)
+        assert await fresh.get_state(KEY) is None
+        return fresh.delete_expired()
+
+    assert asyncio.run(_run()) == 1
+
+
+def test_entry_is_not_reloaded_while_its_flush_is_in_flight(db_engine) -> None:
+    async def _run() -> None:
+        storage = PostgresStorage(cache_seconds=0, flush_delay=60, cleanup_interval=0)
+        started = threading.Event()
+        store = storage._store
+
+        def _slow_store(batch) -> None:  # type: ignore[no-untyped-def]
+            started.set()
+            time.sleep(0.2)
+            store(batch)
+
+        storage._store = _slow_store  # type: ignore[method-assign]
+        await storage.set_state(KEY, AddOpStates.entering_amount)
+        flush = asyncio.create_task(storage.flush())
+        await asyncio.to_thread(started.wait)
+        # The row is not written yet: a reload here would bring back the old (empty) state
+        assert await storage.get_state(KEY) == AddOpStates.entering_amount.state
+        assert await flush == 1
+        await storage.close()
+
+    asyncio.run(_run())
+
+
+def test_flush_middleware_writes_before_the_update_ends(db_engine) -> None:
+    async def _run() -> None:
+        storage = PostgresStorage(cache_seconds=0, flush_delay=60, cleanup_interval=0)
+        assert storage.write_through
+
+        async def _handler(event, data):  # type: ignore[no-untyped-def]
+            await storage.set_state(KEY, AddOpStates.entering_amount)
+            return "ok"
+
+        assert await FsmFlushMiddleware(storage)(_handler, object(), {}) == "ok"
+        # Another replica reads the new state right away
+        other = PostgresStorage(cache_seconds=0, cleanup_interval=0)
+        assert await other.get_state(KEY) == AddOpStates.entering_amount.state
+        await storage.close()
+
+    asyncio.run(_run())
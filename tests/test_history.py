@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+import pytest
+
+from bot.db.base import session_scope
+from bot.db.models import Category, Channel, Operation, OperationChannel, User
+from bot.services.catalog import get_catalog
+from bot.services.history import (
+    HistoryFilter,
+    HistoryFilterError,
+    fetch_history_page,
+    parse_history_args,
+)
+from bot.services.time import now_msk
+from bot.types.enums import OperationType
+
+
+def _seed(n: int) -> tuple[int, int]:
+    now = now_msk()
+    with session_scope() as s:
+        user = User(tg_user_id=1, created_at=now)
+        cat = Category(code="ad_purchase", name="Закупка рекламы", is_active=True)
+        ch = Channel(tg_chat_id=-100, title="News", username="news", created_at=now, is_active=True)
+        s.add_all([user, cat, ch])
+        s.flush()
+        for i in range(n):
+            op = Operation(
+                # Pairs share a timestamp so that the id tie-breaker matters
+                created_at=now - timedelta(minutes=i // 2),
+                op_type=OperationType.INCOME.value if i % 2 else OperationType.EXPENSE.value,
+                category_id=cat.id,
+                amount_kop=100 * i,
+                created_by_user_id=user.id,
+                dedup_hash=f"h{i}",
+            )
+            s.add(op)
+            s.flush()
+            if i % 3 == 0:
+                s.execute(OperationChannel.insert(), [{"operation_id": op.id, "channel_id": ch.id}])
+        return user.id, ch.id
+
+
+def _amounts(page) -> list[int]:
+    return [int(r.amount_kop) for r in page.rows]
+
+
+def test_keyset_pages_cover_history_without_gaps(db_engine) -> None:
+    _seed(25)
+    seen: list[int] = []
+    pages = []
+    with session_scope() as s:
+        page = fetch_history_page(s, HistoryFilter(), size=10)
+        while True:
+            pages.append(page)
+            seen.extend(_amounts(page))
+            if page.next_after_id is None:
+                break
+            page = fetch_history_page(s, HistoryFilter(), after_id=page.next_after_id, size=10)
+        assert pages[0].prev_before_id is None
+        back = fetch_history_page(s, HistoryFilter(), before_id=pages[2].prev_before_id, size=10)
+    assert len(seen) == len(set(seen)) == 25
+    # Newest first: same timestamp pairs come out by id desc
+    assert seen[:4] == [100, 0, 300, 200]
+    assert _amounts(back) == _amounts(pages[1])
+
+
+def test_filters(db_engine) -> None:
+    user_id, ch_id = _seed(12)
+    with session_scope() as s:
+        income = fetch_history_page(s, HistoryFilter(op_type=OperationType.INCOME.value))
+        by_channel = fetch_history_page(s, HistoryFilter(channel_id=ch_id))
+        nobody = fetch_history_page(s, HistoryFilter(user_id=user_id + 1))
+    assert all(r.op_type == OperationType.INCOME.value for r in income.rows) and len(income.rows) == 6
+    assert sorted(_amounts(by_channel)) == [0, 300, 600, 900]
+    assert nobody.rows == []
+
+
+def test_parse_args_and_callback_encoding(db_engine) -> None:
+    user_id, ch_id = _seed(1)
+    catalog = get_catalog().warm()
+    flt = parse_history_args("out cat:закуп ch:@news me from:01.10.2024 to:2024-10-31", catalog, user_id)
+    assert flt.op_type == OperationType.EXPENSE.value and flt.channel_id == ch_id and flt.user_id == user_id
+    assert HistoryFilter.decode(flt.encode()) == flt
+    assert len(f"oh:a9999999999:{flt.encode()}".encode()) <= 64
+    with pytest.raises(HistoryFilterError):
+        parse_history_args("ch:missing", catalog, user_id)
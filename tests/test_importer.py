@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import io
+
+import pytest
+
+from bot.db.base import session_scope
+from bot.db.models import Category, Channel, Operation, OperationChannel, User
+from bot.services.catalog import catalog_snapshot
+from bot.services.importer import ImportFileError, import_operations
+from bot.services.time import now_msk
+from bot.types.enums import DEFAULT_CATEGORY_SEED
+
+CSV = """﻿Дата;Тип;Категория;Сумма;Каналы;Комментарий;Пояснение
+31.12.2023 18:30;out;ad_purchase;1 200,50;@news, Memes;"новогодняя
+закупка";
+2024-01-02;доход;Выручка с РСЯ;300;;;
+2024-01-03;in;ad_purchase;10;;;
+2024-01-04;invest;custom;10;@nobody;;x
+02.01.2024;расход;custom;99;;;налог
+2024-01-02;in;ad_revenue_rsy;300;;;
+"""
+
+
+def _seed() -> None:
+    now = now_msk()
+    with session_scope() as s:
+        s.add(User(tg_user_id=1, created_at=now))
+        for code, name in DEFAULT_CATEGORY_SEED:
+            s.add(Category(code=code, name=name, is_active=True))
+        s.add(Channel(tg_chat_id=-100, title="News", username="news", created_at=now, is_active=True))
+        s.add(Channel(tg_chat_id=-101, title="Memes", created_at=now, is_active=False))
+
+
+def _import(data: str):  # type: ignore[no-untyped-def]
+    return import_operations(io.BytesIO(data.encode("utf-8")), asyncio.run(catalog_snapshot()), tg_user_id=1)
+
+
+def test_import_validates_rows_and_skips_duplicates(db_engine) -> None:
+    _seed()
+    report = _import(CSV)
+    assert (report.rows, report.inserted, report.duplicates, report.error_count) == (6, 3, 1, 2)
+    assert report.errors[0].startswith("Строка 5:") and "не подходит" in report.errors[0]
+    assert "@nobody" in report.errors[1]
+    # Same day, same operation: reported against the row it repeats
+    assert report.collisions == ["Строка 8: совпадает со строкой 4"]
+
+    with session_scope() as s:
+        ops = s.query(Operation).order_by(Operation.id).all()
+        assert [op.amount_kop for op in ops] == [120050, 30000, 9900]
+        assert ops[0].comment == "новогодняя\nзакупка" and not ops[0].is_general
+        assert ops[2].free_text_reason == "налог" and ops[2].is_general
+        assert len(s.execute(OperationChannel.select()).all()) == 2
+
+    again = _import(CSV)
+    assert (again.inserted, again.duplicates) == (0, 4)
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        ("", "пустой"),
+        ("date,type,amount\n", "category"),
+        ("date,type,category,amount\n01.01.2024,out,ad_purchase,1\n", None),
+    ],
+)
+def test_import_file_errors(db_engine, data: str, message: str | None) -> None:
+    _seed()
+    if message is None:
+        assert _import(data).inserted == 1
+        return
+    with pytest.raises(ImportFileError, match=message):
+        _import(data)
+
+
+def test_import_rejects_non_utf8(db_engine) -> None:
+    _seed()
+    data = "date,type,category,amount,comment\n01.01.2024,out,ad_purchase,1,привет\n".encode("cp1251")
+    with pytest.raises(ImportFileError, match="UTF-8"):
+        import_operations(io.BytesIO(data), asyncio.run(catalog_snapshot()), tg_user_id=1)
+    with session_scope() as s:
+        assert s.query(Operation).count() == 0
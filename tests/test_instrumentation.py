@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from sqlalchemy import create_engine, event, text
+
+from bot.db.instrumentation import install_query_hooks, reset_current_handler, set_current_handler, track_queries
+
+
+def test_sql_comment_names_the_handler_not_the_update() -> None:
+    engine = create_engine("sqlite://")
+    install_query_hooks(engine)
+    executed: list[str] = []
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):  # type: ignore[no-untyped-def]
+        executed.append(statement)
+
+    with engine.connect() as conn:
+        for update_id in (1, 2):
+            with track_queries(f"update:{update_id}"):
+                conn.execute(text("SELECT 1"))
+                token = set_current_handler("cmd_start")
+                try:
+                    conn.execute(text("SELECT 1"))
+                finally:
+                    reset_current_handler(token)
+        with track_queries("job:daily_collect"):
+            conn.execute(text("SELECT 1"))
+
+    assert executed == [
+        "SELECT 1 /* update */",
+        "SELECT 1 /* cmd_start */",
+        "SELECT 1 /* update */",
+        "SELECT 1 /* cmd_start */",
+        "SELECT 1 /* job:daily_collect */",
+    ]
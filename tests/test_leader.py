@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from bot.db.base import session_scope
+from bot.db.models import JobRun
+from bot.services import leader
+from bot.services.leader import LeaseLost, _AdvisoryLock, run_as_leader
+
+
+class _LocalLock:
+    """In-process stand-in for the Postgres advisory lock."""
+
+    held: set[str] = set()
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self._mine = False
+
+    def try_acquire(self) -> bool:
+        if self.job_id in self.held:
+            return False
+        self.held.add(self.job_id)
+        self._mine = True
+        return True
+
+    def ping(self) -> None:
+        pass
+
+    def release(self) -> None:
+        if self._mine:
+            self.held.discard(self.job_id)
+            self._mine = False
+
+
+@pytest.fixture(autouse=True)
+def local_lock(monkeypatch: pytest.MonkeyPatch) -> None:
+    _LocalLock.held = set()
+    monkeypatch.setattr(leader, "_AdvisoryLock", _LocalLock)
+
+
+def test_run_key_is_executed_once(db_engine) -> None:
+    calls: list[str] = []
+
+    async def job() -> None:
+        calls.append("run")
+
+    async def _run() -> list[bool]:
+        return [
+            await run_as_leader("daily_collect", "2025-01-31", job),
+            await run_as_leader("daily_collect", "2025-01-31", job),
+            await run_as_leader("daily_collect", "2025-02-01", job),
+        ]
+
+    assert asyncio.run(_run()) == [True, False, True]
+    assert calls == ["run", "run"]
+
+
+def test_failed_run_is_recorded_and_not_repeated(db_engine) -> None:
+    calls: list[str] = []
+
+    async def failing() -> None:
+        calls.append("run")
+        raise RuntimeError("boom")
+
+    async def _run() -> bool:
+        with pytest.raises(RuntimeError):
+            await run_as_leader("daily_notify_stats", "2025-01-31", failing)
+        return await run_as_leader("daily_notify_stats", "2025-01-31", failing)
+
+    assert asyncio.run(_run()) is False
+    assert calls == ["run"]
+    with session_scope() as s:
+        run = s.get(JobRun, ("daily_notify_stats", "2025-01-31"))
+        assert run.status == "failed"
+        assert run.error == "RuntimeError: boom"
+        assert run.finished_at is not None
+
+
+def test_follower_takes_over_when_the_leader_lock_is_lost(db_engine, monkeypatch) -> None:
+    calls: list[str] = []
+
+    class _DroppedLock(_LocalLock):
+        def ping(self) -> None:
+            # The leader's connection dropped: Postgres released the lock
+            self.release()
+            raise ConnectionError("server closed the connection")
+
+    async def slow() -> None:
+        calls.append("leader")
+        await asyncio.sleep(1)
+
+    async def ok() -> None:
+        calls.append("follower")
+
+    async def _run() -> bool:
+        monkeypatch.setattr(leader, "_AdvisoryLock", _DroppedLock)
+        with pytest.raises(LeaseLost):
+            await run_as_leader("daily_collect", "2025-04-01", slow, renew_interval=0.01)
+        monkeypatch.setattr(leader, "_AdvisoryLock", _LocalLock)
+        return await run_as_leader("daily_collect", "2025-04-01", ok, renew_interval=0.01)
+
+    assert asyncio.run(_run()) is True
+    assert calls == ["leader", "follower"]
+
+
+def test_release_discards_the_connection_when_unlock_fails() -> None:
+    class _Conn:
+        invalidated = closed = False
+
+        def execute(self, *args, **kwargs):  # type: ignore[no-untyped-def]
+            raise ConnectionError("server closed the connection")
+
+        def invalidate(self) -> None:
+            self.invalidated = True
+
+        def close(self) -> None:
+            self.closed = True
+
+    lock = _AdvisoryLock("daily_collect")
+    conn = lock._conn = _Conn()  # type: ignore[assignment]
+    lock.release()
+    assert conn.invalidated and conn.closed
+    assert lock._conn is None
+
+
+def test_follower_waits_for_leader_and_skips_completed_run(db_engine) -> None:
+    calls: list[str] = []
+
+    async def job() -> None:
+        calls.append("run")
+        await asyncio.sleep(0.05)
+
+    async def _run() -> list[bool]:
+        return list(
+            await asyncio.gather(
+                run_as_leader("daily_collect", "2025-03-01", job, renew_interval=0.01),
+                run_as_leader("daily_collect", "2025-03-01", job, renew_interval=0.01),
+            )
+        )
+
+    assert sorted(asyncio.run(_run())) == [False, True]
+    assert calls == ["run"]
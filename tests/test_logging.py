@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import json
+import logging
+import queue
+
+from bot.settings import _JsonFormatter, _QueueHandler
+
+
+def test_queued_record_is_rendered_as_json() -> None:
+    q: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = _QueueHandler(q)
+    log = logging.getLogger("test.json")
+    log.propagate = False
+    log.addHandler(handler)
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.exception("failed %s", "op", extra={"update_id": 42})
+    finally:
+        log.removeHandler(handler)
+
+    record = q.get_nowait()
+    # Nothing unpicklable or lazily formatted crosses the queue
+    assert record.exc_info is None and record.args is None
+    payload = json.loads(_JsonFormatter().format(record))
+    assert payload["message"] == "failed op"
+    assert payload["level"] == "ERROR"
+    assert payload["update_id"] == 42
+    assert "ValueError: boom" in payload["exc"]
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.services.message_edits import EditDebouncer
+
+
+class FakeMessage:
+    def __init__(self, text: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+        self.chat = SimpleNamespace(id=1)
+        self.message_id = 10
+        self.text = text
+        self.reply_markup = reply_markup
+        self.edits: list[str] = []
+
+    async def edit_text(self, text: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+        self.edits.append(text)
+
+
+def _kb(label: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=label, callback_data="x")]])
+
+
+def test_rapid_edits_collapse_into_last_one() -> None:
+    debouncer = EditDebouncer(delay=0.01)
+    message = FakeMessage("start", _kb("a"))
+
+    async def _run() -> None:
+        for i in range(5):
+            debouncer.edit(message, f"text {i}", reply_markup=_kb(str(i)))
+        await asyncio.sleep(0.05)
+
+    asyncio.run(_run())
+    assert message.edits == ["text 4"]
+    assert debouncer.sent == 1
+
+
+def test_edit_back_to_shown_content_is_skipped() -> None:
+    debouncer = EditDebouncer(delay=0.01)
+    message = FakeMessage("start", _kb("a"))
+
+    async def _run() -> None:
+        debouncer.edit(message, "other", reply_markup=_kb("b"))
+        debouncer.edit(message, "start", reply_markup=_kb("a"))
+        await asyncio.sleep(0.05)
+        # Same content as the last edit we sent
+        debouncer.edit(message, "next", reply_markup=_kb("c"))
+        await asyncio.sleep(0.05)
+        debouncer.edit(message, "next", reply_markup=_kb("c"))
+        await asyncio.sleep(0.05)
+
+    asyncio.run(_run())
+    assert message.edits == ["next"]
+    assert debouncer.skipped == 2
+
+
+def test_cancel_drops_pending_edit() -> None:
+    debouncer = EditDebouncer(delay=0.01)
+    message = FakeMessage("start")
+
+    async def _run() -> None:
+        debouncer.edit(message, "late")
+        await debouncer.cancel(message)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(_run())
+    assert message.edits == []
+
+
+def test_cancel_waits_for_edit_in_flight() -> None:
+    debouncer = EditDebouncer(delay=0.01)
+    message = FakeMessage("start")
+    release = asyncio.Event()
+
+    async def slow_edit_text(text: str, reply_markup: InlineKeyboardMarkup | None = None) -> None:
+        await release.wait()
+        message.edits.append(text)
+
+    message.edit_text = slow_edit_text  # type: ignore[method-assign]
+
+    async def _run() -> None:
+        debouncer.edit(message, "late")
+        await asyncio.sleep(0.05)
+        # The edit is on the wire now; the next step's own edit must land after it
+        cancel = asyncio.create_task(debouncer.cancel(message))
+        await asyncio.sleep(0.01)
+        assert not cancel.done()
+        release.set()
+        await cancel
+        message.edits.append("next step")
+
+    asyncio.run(_run())
+    assert message.edits == ["late", "next step"]
+    assert debouncer._shown == {}
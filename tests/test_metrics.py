@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import asyncio
+
+from bot.middlewares.metrics import TimedMiddleware
+from bot.services.metrics import Counter, Histogram, MIDDLEWARE_SECONDS, Registry
+
+
+def test_text_exposition() -> None:
+    registry = Registry()
+    requests = registry.register(Counter("t_requests_total", "Requests", ["method"]))
+    latency = registry.register(Histogram("t_latency_seconds", "Latency", buckets=(0.1, 1.0)))
+    requests.inc(method='get"x')
+    requests.inc(2, method="post")
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert '# TYPE t_requests_total counter' in text
+    assert 't_requests_total{method="get\\"x"} 1' in text
+    assert 't_requests_total{method="post"} 2' in text
+    assert 't_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{le="1"} 2' in text
+    assert 't_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "t_latency_seconds_count 3" in text
+
+
+def test_timed_middleware_excludes_downstream_time() -> None:
+    async def middleware(handler, event, data):  # type: ignore[no-untyped-def]
+        return await handler(event, data)
+
+    async def slow_handler(event, data):  # type: ignore[no-untyped-def]
+        await asyncio.sleep(0.05)
+        return "done"
+
+    timed = TimedMiddleware(middleware, name="test_passthrough")
+    assert asyncio.run(timed(slow_handler, object(), {})) == "done"
+    assert MIDDLEWARE_SECONDS.count(middleware="test_passthrough") == 1
+    text = MIDDLEWARE_SECONDS.render()
+    # Own time of a pass-through middleware is far below the handler's 50ms
+    assert 'pnlbot_middleware_duration_seconds_bucket{middleware="test_passthrough",le="0.01"} 1' in text
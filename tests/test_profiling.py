@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import asyncio
+import marshal
+
+from bot.services.profiling import MODE_CPROFILE, MODE_SAMPLE, arm_profile, profiled
+
+
+@profiled("stats")
+async def _work() -> int:
+    await asyncio.sleep(0.02)
+    return sum(range(10_000))
+
+
+def test_only_the_next_call_is_profiled() -> None:
+    delivered: list[tuple[list[tuple[str, bytes]], str]] = []
+
+    async def deliver(files, caption):  # type: ignore[no-untyped-def]
+        delivered.append((files, caption))
+
+    async def _run() -> None:
+        arm_profile("stats", MODE_CPROFILE, deliver)
+        assert await _work() == sum(range(10_000))
+        await _work()
+        arm_profile("stats", MODE_SAMPLE, deliver)
+        await _work()
+
+    asyncio.run(_run())
+    assert len(delivered) == 2
+    (pstats_name, pstats_data), (txt_name, txt_data) = delivered[0][0]
+    assert pstats_name.endswith(".pstats") and txt_name.endswith(".txt")
+    assert any(key[2] == "_work" for key in marshal.loads(pstats_data))
+    [(collapsed_name, _)] = delivered[1][0]
+    assert collapsed_name.endswith(".collapsed")
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+from datetime import timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.db.base import UnitOfWork, session_scope
+from bot.db.models import (
+    Base,
+    Category,
+    Channel,
+    ChannelDailyChurn,
+    ChannelDailySnapshot,
+    Operation,
+    OperationChannel,
+    PostSnapshot,
+    User,
+)
+from bot.handlers.channels import inline_operations_history
+from bot.handlers.commands import cmd_cashflow
+from bot.handlers.flow_add_operation import (
+    AddOpStates,
+    _show_confirmation,
+    choose_category,
+    confirm,
+    toggle_channel,
+)
+from bot.services.alerts import build_stats_report_text
+from bot.services.catalog import invalidate_catalog
+from bot.services.time import now_msk
+from bot.types.enums import DEFAULT_CATEGORY_SEED, OperationType
+
+TG_USER_ID = 1001
+# Upper bound for any single report/handler call checked below
+QUERY_BUDGET = 25
+
+
+class FakeMessage:
+    _next_id = 0
+
+    def __init__(self) -> None:
+        self.sent: list[str] = []
+        FakeMessage._next_id += 1
+        self.message_id = FakeMessage._next_id
+        self.chat = SimpleNamespace(id=TG_USER_ID)
+        self.text: str | None = None
+        self.reply_markup = None
+
+    async def answer(self, text: str, **kwargs) -> None:
+        self.sent.append(text)
+
+    async def edit_text(self, text: str, **kwargs) -> None:
+        self.sent.append(text)
+
+    async def edit_reply_markup(self, **kwargs) -> None:
+        return None
+
+
+class FakeUser:
+    id = TG_USER_ID
+
+
+class FakeCallback:
+    def __init__(self, data: str | None = None) -> None:
+        self.data = data
+        self.from_user = FakeUser()
+        self.message = FakeMessage()
+
+    async def answer(self, *args, **kwargs) -> None:
+        return None
+
+
+def _seed(n_channels: int, posts_per_channel: int = 3, n_operations: int = 5) -> list[int]:
+    now = now_msk()
+    today = now.date()
+    with session_scope() as s:
+        user = User(tg_user_id=TG_USER_ID, created_at=now)
+        s.add(user)
+        for code, name in DEFAULT_CATEGORY_SEED:
+            s.add(Category(code=code, name=name, is_active=True))
+        channels = [
+            Channel(tg_chat_id=-100 - i, title=f"ch{i}", created_at=now, is_active=True)
+            for i in range(n_channels)
+        ]
+        s.add_all(channels)
+        s.flush()
+        category = s.query(Category).filter(Category.code == "ad_purchase").one()
+        for ch in channels:
+            s.add(ChannelDailySnapshot(channel_id=ch.id, snapshot_date=today, subscribers_count=100, collected_at=now))
+            s.add(ChannelDailyChurn(channel_id=ch.id, snapshot_date=today, joins_count=3, leaves_count=1, collected_at=now))
+            for m in range(posts_per_channel):
+                s.add(
+                    PostSnapshot(
+                        channel_id=ch.id,
+                        message_id=m,
+                        posted_at=now.astimezone(timezone.utc) - timedelta(hours=m),
+                        snapshot_date=today,
+                        views=50,
+                        collected_at=now,
+                    )
+                )
+        for k in range(n_operations):
+            op = Operation(
+                created_at=now,
+                op_type=OperationType.EXPENSE.value,
+                category_id=category.id,
+                amount_kop=1000 + k,
+                created_by_user_id=user.id,
+                is_general=False,
+                dedup_hash=f"seed-{k}",
+            )
+            s.add(op)
+            s.flush()
+            s.execute(
+                OperationChannel.insert(),
+                [{"operation_id": op.id, "channel_id": ch.id} for ch in channels],
+            )
+        invalidate_catalog(s)
+        return [ch.id for ch in channels]
+
+
+async def _handle(handler, *args) -> None:
+    # Mimic DbSessionMiddleware: one unit of work per update
+    uow = UnitOfWork()
+    try:
+        if "uow" in inspect.signature(handler).parameters:
+            args = (*args, uow)
+        await handler(*args)
+        uow.commit()
+    finally:
+        uow.close()
+
+
+def _new_state() -> FSMContext:
+    return FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=1, chat_id=TG_USER_ID, user_id=TG_USER_ID))
+
+
+def _run_add_operation_flow(channel_ids: list[int]) -> None:
+    async def _flow() -> None:
+        state = _new_state()
+        await state.set_state(AddOpStates.choosing_category)
+        await state.update_data(op_type=OperationType.EXPENSE.value)
+        with session_scope() as s:
+            cat_id = s.query(Category.id).filter(Category.code == "ad_purchase").scalar()
+        await _handle(choose_category, FakeCallback(f"cat:{cat_id}"), state)
+        for ch_id in channel_ids:
+            await _handle(toggle_channel, FakeCallback(f"ch:{ch_id}"), state)
+        await state.update_data(amount_kop=12345, comment="test")
+        await _handle(_show_confirmation, FakeMessage(), state)
+        await _handle(confirm, FakeCallback("confirm"), state)
+
+    asyncio.run(_flow())
+    with session_scope() as s:
+        op = s.query(Operation).filter(Operation.amount_kop == 12345).one()
+        links = s.query(OperationChannel).filter(OperationChannel.c.operation_id == op.id).count()
+    assert links == len(channel_ids)
+
+
+def _run_confirm_only(channel_ids: list[int]) -> None:
+    async def _confirm() -> None:
+        state = _new_state()
+        with session_scope() as s:
+            cat_id = s.query(Category.id).filter(Category.code == "ad_purchase").scalar()
+        await state.set_state(AddOpStates.confirming)
+        await state.update_data(
+            op_type=OperationType.EXPENSE.value,
+            category_id=cat_id,
+            amount_kop=777,
+            channel_ids=channel_ids,
+            is_general=False,
+        )
+        await _handle(confirm, FakeCallback("confirm"), state)
+
+    asyncio.run(_confirm())
+    with session_scope() as s:
+        op = s.query(Operation).filter(Operation.amount_kop == 777).one()
+        links = s.query(OperationChannel).filter(OperationChannel.c.operation_id == op.id).count()
+    assert links == len(channel_ids)
+
+
+@pytest.mark.parametrize(
+    "run",
+    [
+        pytest.param(lambda ids: asyncio.run(build_stats_report_text()), id="stats_report"),
+        pytest.param(lambda ids: asyncio.run(cmd_cashflow(FakeMessage())), id="cashflow"),
+        pytest.param(
+            lambda ids: asyncio.run(inline_operations_history(FakeCallback("operations:history"))),
+            id="operations_history",
+        ),
+        pytest.param(lambda ids: _run_confirm_only(ids), id="confirm"),
+        pytest.param(lambda ids: _run_add_operation_flow(ids), id="add_operation_flow"),
+    ],
+)
+def test_query_count_does_not_depend_on_channels(db_engine, count_queries, run) -> None:
+    counts: list[int] = []
+    for n_channels in (2, 12):
+        with db_engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+        channel_ids = _seed(n_channels)
+        with count_queries() as counter:
+            run(channel_ids)
+        counts.append(counter.count)
+    assert counts[0] == counts[1], f"query count grows with channels: {counts}\n{counter}"
+    assert counts[1] <= QUERY_BUDGET, str(counter)
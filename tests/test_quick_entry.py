@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from bot.db.base import session_scope
+from bot.db.models import Category, Channel, Operation, OperationChannel, User
+from bot.services.catalog import catalog_snapshot
+from bot.services.quick_entry import (
+    QuickEntryError,
+    QuickOperation,
+    batch_collisions,
+    insert_operations,
+    parse_quick_entry,
+    parse_quick_line,
+)
+from bot.services.time import now_msk
+from bot.types.enums import DEFAULT_CATEGORY_SEED, OperationType
+
+OUT = OperationType.EXPENSE.value
+
+
+def _seed() -> dict[str, int]:
+    now = now_msk()
+    with session_scope() as s:
+        s.add(User(tg_user_id=1, created_at=now))
+        for code, name in DEFAULT_CATEGORY_SEED:
+            s.add(Category(code=code, name=name, is_active=True))
+        for i, (title, username) in enumerate((("News", "news"), ("Memes", "memes"), ("Old", "old"))):
+            s.add(Channel(tg_chat_id=-100 - i, title=title, username=username, created_at=now, is_active=title != "Old"))
+        s.flush()
+        return {ch.title: ch.id for ch in s.query(Channel).all()}
+
+
+def test_parse_quick_line(db_engine) -> None:
+    ids = _seed()
+    catalog = asyncio.run(catalog_snapshot())
+
+    op = parse_quick_line("1 200,50 ad_purchase @news @Mem https://r.example/1 #весна # 2", OUT, catalog)
+    assert op.amount_kop == 120050
+    assert catalog.categories_by_id[op.category_id].code == "ad_purchase"
+    assert op.channel_ids == (ids["News"], ids["Memes"])
+    assert op.receipt_url == "https://r.example/1"
+    assert op.comment == "весна # 2"
+    assert QuickOperation.from_dict(op.to_dict()) == op
+
+    # "#" inside a token is part of it (receipt URL fragments)
+    frag = parse_quick_line("100 ad_purchase https://r.example/check#p=2 #note", OUT, catalog)
+    assert frag.receipt_url == "https://r.example/check#p=2" and frag.comment == "note"
+
+    general = parse_quick_line("300 Закупка", OUT, catalog)
+    assert general.is_general and general.category_code == "ad_purchase"
+    custom = parse_quick_line("10 custom #налог", OUT, catalog)
+    assert custom.free_text_reason == "налог" and custom.comment is None
+
+    for bad in ("ad_purchase 100", "100", "100 ad_revenue", "100 затраты", "100 ad_purchase @old", "100 ad_purchase news", "10 custom"):
+        with pytest.raises(QuickEntryError):
+            parse_quick_line(bad, OUT, catalog)
+
+
+def test_parse_quick_entry_reports_line_numbers(db_engine) -> None:
+    _seed()
+    catalog = asyncio.run(catalog_snapshot())
+    ops, errors = parse_quick_entry("100 ad_purchase @news\n\n200 nope\n300 admins_pay", OUT, catalog)
+    assert [op.amount_kop for op in ops] == [10000, 30000]
+    assert len(errors) == 1 and errors[0].startswith("Строка 3:")
+
+
+def test_insert_operations_dedups_in_one_transaction(db_engine, count_queries) -> None:
+    ids = _seed()
+    catalog = asyncio.run(catalog_snapshot())
+    ops, _ = parse_quick_entry(
+        "100 ad_purchase @news @memes\n100 ad_purchase @memes @news #same hash\n200 admins_pay",
+        OUT,
+        catalog,
+    )
+    created_at = now_msk()
+    with session_scope() as s:
+        user_id = s.query(User.id).scalar()
+        with count_queries() as counter:
+            assert insert_operations(s, ops, tg_user_id=1, db_user_id=user_id, created_at=created_at) == (2, 1)
+        assert counter.count == 2
+    with session_scope() as s:
+        assert insert_operations(s, ops, tg_user_id=1, db_user_id=user_id, created_at=created_at) == (0, 3)
+        assert s.query(Operation).count() == 2
+        links = {r.channel_id for r in s.execute(OperationChannel.select())}
+    assert links == {ids["News"], ids["Memes"]}
+
+
+def test_batch_collisions_point_at_first_occurrence(db_engine) -> None:
+    _seed()
+    catalog = asyncio.run(catalog_snapshot())
+    ops, _ = parse_quick_entry(
+        "100 ad_purchase @news @memes\n200 admins_pay\n100 ad_purchase @memes @news #same hash\n200 admins_pay",
+        OUT,
+        catalog,
+    )
+    assert batch_collisions(ops, tg_user_id=1, created_at=now_msk()) == {2: 0, 3: 1}
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+
+from bot.middlewares.rate_limit import RateLimitMiddleware, TokenBucket
+from bot.services.metrics import RATE_LIMIT_BUCKETS, RATE_LIMIT_EVENTS
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket_allows_burst_then_refills() -> None:
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+    for _ in range(3):
+        assert bucket.wait_time(0.0) == 0.0
+        bucket.take()
+    assert bucket.wait_time(0.0) == 0.5
+    assert bucket.wait_time(0.5) == 0.0
+
+
+def test_drop_policy_rejects_without_reserving() -> None:
+    clock = FakeClock()
+    limiter = RateLimitMiddleware(user_rate=1.0, user_burst=2, policy="drop", clock=clock)
+    assert limiter.acquire(1, 1) == 0.0
+    assert limiter.acquire(1, 1) == 0.0
+    assert limiter.acquire(1, 1) < 0
+    # Another user has its own budget
+    assert limiter.acquire(2, 2) == 0.0
+    clock.now = 1.0
+    assert limiter.acquire(1, 1) == 0.0
+
+
+def test_delay_policy_reserves_slots_up_to_max_delay() -> None:
+    clock = FakeClock()
+    limiter = RateLimitMiddleware(user_rate=1.0, user_burst=1, policy="delay", max_delay=2.0, clock=clock)
+    assert limiter.acquire(1, 1) == 0.0
+    assert limiter.acquire(1, 1) == 1.0
+    assert limiter.acquire(1, 1) == 2.0
+    # Queue is full: further events are dropped instead of piling up
+    assert limiter.acquire(1, 1) < 0
+
+
+def test_global_budget_is_shared() -> None:
+    clock = FakeClock()
+    limiter = RateLimitMiddleware(global_rate=1.0, global_burst=2, policy="drop", clock=clock)
+    assert limiter.acquire(1, 1) == 0.0
+    assert limiter.acquire(2, 2) == 0.0
+    assert limiter.acquire(3, 3) < 0
+
+
+def test_idle_buckets_are_evicted() -> None:
+    clock = FakeClock()
+    limiter = RateLimitMiddleware(idle_ttl=60.0, clock=clock)
+    for user_id in range(100):
+        limiter.acquire(user_id, user_id)
+    assert RATE_LIMIT_BUCKETS.value() == 100
+    clock.now = 120.0
+    limiter.acquire(1000, 1000)
+    assert RATE_LIMIT_BUCKETS.value() == 1
+
+
+def test_outcomes_are_exported_as_metrics() -> None:
+    limiter = RateLimitMiddleware(global_rate=1.0, global_burst=1, policy="drop", clock=FakeClock())
+    passed = RATE_LIMIT_EVENTS.value(outcome="passed")
+    dropped = RATE_LIMIT_EVENTS.value(outcome="dropped")
+
+    async def handler(event, data):  # type: ignore[no-untyped-def]
+        return "ok"
+
+    async def _run() -> list:
+        return [await limiter(handler, object(), {}) for _ in range(2)]
+
+    assert asyncio.run(_run()) == ["ok", None]
+    assert RATE_LIMIT_EVENTS.value(outcome="passed") == passed + 1
+    assert RATE_LIMIT_EVENTS.value(outcome="dropped") == dropped + 1
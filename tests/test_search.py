@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import timedelta
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.db.base import session_scope
+from bot.db.models import Category, Operation, User
+from bot.handlers.channels import find_page
+from bot.services.search import escape_like, normalize_query, query_id, search_operations
+from bot.services.time import now_msk
+from bot.types.enums import OperationType
+
+
+def _seed() -> None:
+    now = now_msk()
+    texts = [
+        ("реклама у Ивана", None, None),
+        ("", "Возврат за рекламу", None),
+        (None, None, "https://receipts.example/реклама-42"),
+        ("Зарплата монтажёру", None, "https://Receipts.example/PAYROLL"),
+        ("скидка 50% на пост", None, None),
+    ] + [(f"реклама пачка {i}", None, None) for i in range(6)]
+    with session_scope() as s:
+        user = User(tg_user_id=1, created_at=now)
+        cat = Category(code="ad_purchase", name="Закупка рекламы", is_active=True)
+        s.add_all([user, cat])
+        s.flush()
+        for i, (comment, reason, receipt) in enumerate(texts):
+            s.add(
+                Operation(
+                    created_at=now - timedelta(minutes=i),
+                    op_type=OperationType.EXPENSE.value,
+                    category_id=cat.id,
+                    amount_kop=100 * i,
+                    created_by_user_id=user.id,
+                    comment=comment,
+                    free_text_reason=reason,
+                    receipt_url=receipt,
+                    dedup_hash=f"h{i}",
+                )
+            )
+
+
+def test_search_matches_comment_reason_and_receipt(db_engine) -> None:
+    _seed()
+    with session_scope() as s:
+        page = search_operations(s, "монтаж")
+        assert [int(r.amount_kop) for r in page.rows] == [300]
+        assert not page.has_more
+        assert [int(r.amount_kop) for r in search_operations(s, "payroll").rows] == [300]
+
+        first = search_operations(s, "реклам", size=5)
+        second = search_operations(s, "реклам", offset=5, size=5)
+    assert first.has_more and not second.has_more
+    amounts = [int(r.amount_kop) for r in first.rows + second.rows]
+    # Matches in all three fields, newest first, no duplicates between pages
+    assert amounts == [0, 100, 200] + [100 * i for i in range(5, 11)]
+
+
+def test_normalize_query() -> None:
+    assert normalize_query("  реклама   у\tИвана ") == "реклама у Ивана"
+    assert len(normalize_query("x" * 500)) == 100
+
+
+def test_like_wildcards_in_query_are_literal(db_engine) -> None:
+    _seed()
+    with session_scope() as s:
+        assert [int(r.amount_kop) for r in search_operations(s, "50%").rows] == [400]
+        # "_" and "%" would otherwise match any text
+        assert search_operations(s, "___").rows == []
+        assert search_operations(s, "%%%").rows == []
+    assert escape_like("a%b_c\\") == "a\\%b\\_c\\\\"
+
+
+def test_query_id_is_short_and_stable() -> None:
+    assert query_id("реклама") == query_id("реклама") != query_id("реклама 2")
+    assert len(f"find:{query_id('x' * 100)}:1000") <= 64
+
+
+class _Callback:
+    def __init__(self, data: str) -> None:
+        self.data = data
+        self.alerts: list[str] = []
+        self.edits: list[str] = []
+        self.message = self
+
+    async def answer(self, text: str | None = None, **kwargs) -> None:  # type: ignore[no-untyped-def]
+        if text:
+            self.alerts.append(text)
+
+    async def edit_text(self, text: str, **kwargs) -> None:  # type: ignore[no-untyped-def]
+        self.edits.append(text)
+
+
+def test_find_page_rejects_buttons_of_another_query(db_engine) -> None:
+    _seed()
+
+    async def _run() -> tuple[_Callback, _Callback]:
+        state = FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=1, chat_id=1, user_id=1))
+        await state.update_data(find_query="монтаж")
+        stale, current = _Callback(f"find:{query_id('реклам')}:5"), _Callback(f"find:{query_id('монтаж')}:0")
+        await find_page(stale, state)
+        await find_page(current, state)
+        return stale, current
+
+    stale, current = asyncio.run(_run())
+    assert stale.alerts and not stale.edits
+    assert current.edits and "монтаж" in current.edits[0]
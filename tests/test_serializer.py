@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+from bot.middlewares.serializer import KeyedSerializerMiddleware
+
+
+def _data(user_id: int) -> dict:
+    return {"event_from_user": SimpleNamespace(id=user_id), "event_chat": SimpleNamespace(id=user_id)}
+
+
+def test_same_user_runs_in_order_other_users_concurrently() -> None:
+    serializer = KeyedSerializerMiddleware(max_concurrent=8)
+    log: list[str] = []
+    running = 0
+    max_running = 0
+
+    async def handler(event: str, data: dict) -> None:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        log.append(f"start {event}")
+        await asyncio.sleep(0.01)
+        log.append(f"end {event}")
+        running -= 1
+
+    async def _run() -> None:
+        await asyncio.gather(
+            serializer(handler, "a1", _data(1)),
+            serializer(handler, "a2", _data(1)),
+            serializer(handler, "b1", _data(2)),
+        )
+
+    asyncio.run(_run())
+    assert log.index("end a1") < log.index("start a2")
+    assert max_running == 2
+    # Idle keys are forgotten
+    assert serializer._queues == {}
+
+
+def test_global_concurrency_limit() -> None:
+    serializer = KeyedSerializerMiddleware(max_concurrent=2)
+    running = 0
+    max_running = 0
+
+    async def handler(event: int, data: dict) -> None:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def _run() -> None:
+        await asyncio.gather(*(serializer(handler, i, _data(i)) for i in range(6)))
+
+    asyncio.run(_run())
+    assert max_running == 2
+
+
+def test_overflowing_key_is_shed() -> None:
+    serializer = KeyedSerializerMiddleware(max_per_key=2)
+    handled: list[int] = []
+
+    async def handler(event: int, data: dict) -> int:
+        await asyncio.sleep(0.01)
+        handled.append(event)
+        return event
+
+    async def _run() -> list:
+        return await asyncio.gather(*(serializer(handler, i, _data(1)) for i in range(4)))
+
+    results = asyncio.run(_run())
+    assert handled == [0, 1]
+    assert results == [0, 1, None, None]
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+
+from bot.cli.traces import SpanRecord, build_traces, critical_path, main, read_spans
+from bot.services import tracing
+
+
+def test_spans_are_exported_and_critical_path_is_found(tmp_path, capsys) -> None:
+    path = str(tmp_path / "traces.jsonl")
+
+    async def _update() -> None:
+        with tracing.span("update", update_id=1):
+            with tracing.span("middleware Fast"):
+                await asyncio.sleep(0.001)
+            with tracing.span("handler slow"):
+                with tracing.span("db.query"):
+                    await asyncio.sleep(0.02)
+                await asyncio.gather(_telethon(0.005), _telethon(0.03))
+
+    async def _telethon(delay: float) -> None:
+        with tracing.span("telethon GetFullChannelRequest"):
+            await asyncio.sleep(delay)
+
+    tracing.init_tracing(path)
+    try:
+        asyncio.run(_update())
+    finally:
+        tracing.shutdown_tracing()
+
+    roots = build_traces(read_spans([path]))
+    assert [r.name for r in roots] == ["update"]
+    names = [s.name for _, s in critical_path(roots[0])]
+    # Sequential spans all lie on the critical path, however short (the middleware);
+    # of the two parallel RPCs only the slower one does
+    assert names == ["update", "middleware Fast", "handler slow", "db.query", "telethon GetFullChannelRequest"]
+    assert [d for d, _ in critical_path(roots[0])] == [0, 1, 1, 2, 2]
+
+    assert main([path, "--top", "1"]) == 0
+    assert "handler slow" in capsys.readouterr().out
+
+
+def test_short_parallel_sibling_is_off_the_critical_path() -> None:
+    def _span(span_id: str, parent_id: str, name: str, start_ms: int, end_ms: int) -> SpanRecord:
+        return SpanRecord("t", span_id, parent_id, name, start_ms * 1_000_000, end_ms * 1_000_000)
+
+    roots = build_traces(
+        [
+            _span("1", "", "update", 0, 100),
+            # Runs alongside the handler and finishes first
+            _span("2", "1", "middleware Fast", 0, 5),
+            _span("3", "1", "handler slow", 0, 100),
+            _span("4", "3", "db.query", 10, 90),
+        ]
+    )
+    assert [s.name for _, s in critical_path(roots[0])] == ["update", "handler slow", "db.query"]
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from sqlalchemy import insert
+
+from bot.db.base import UnitOfWork
+from bot.db.models import User
+from bot.services.time import now_msk
+
+
+def test_release_keeps_pending_writes(db_engine) -> None:
+    uow = UnitOfWork()
+    try:
+        uow.session.query(User).count()
+        # Read-only transaction: safe to end before a Bot API call
+        assert uow.release() is True
+        assert not uow.session.in_transaction()
+
+        uow.session.add(User(tg_user_id=1, created_at=now_msk()))
+        uow.session.flush()
+        assert uow.release() is False
+        assert uow.session.in_transaction()
+        # The write still belongs to the update's transaction and goes away with it
+        uow.session.rollback()
+        assert uow.session.query(User).count() == 0
+    finally:
+        uow.close()
+
+
+def test_writes_inside_a_savepoint_stay_pending(db_engine) -> None:
+    uow = UnitOfWork()
+    try:
+        s = uow.session
+        with s.begin_nested():
+            s.add(User(tg_user_id=1, created_at=now_msk()))
+            s.flush()
+            s.execute(insert(User).values(tg_user_id=2, created_at=now_msk()))
+        # Releasing the savepoint is not the end of the update's transaction
+        assert uow.release() is False
+        s.rollback()
+        assert s.query(User).count() == 0
+    finally:
+        uow.close()
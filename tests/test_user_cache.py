@@ -0,0 +1,52 @@
+from bot.db.base import get_sessionmaker
+from bot.services import user_cache
+from bot.services.user_cache import KnownUserCache
+
+
+def test_lru_eviction():
+    cache = KnownUserCache(max_size=2)
+    cache.put(1, 10)
+    cache.put(2, 20)
+    assert cache.get(1) == 10  # 1 becomes most recently used
+    cache.put(3, 30)
+    assert cache.get(2) is None
+    assert cache.get(1) == 10
+    assert cache.get(3) == 30
+    assert len(cache) == 2
+
+
+def test_new_user_cached_only_after_commit(db_engine):
+    user_cache.get_known_user_cache().clear()
+    s = get_sessionmaker()()
+    try:
+        user_cache.ensure_user(s, 42, first_name="A")
+        assert user_cache.get_known_user_cache().get(42) is None
+        s.rollback()
+        assert user_cache.get_known_user_cache().get(42) is None
+
+        db_id = user_cache.ensure_user(s, 42, first_name="A")
+        s.commit()
+        assert user_cache.get_known_user_cache().get(42) == db_id
+    finally:
+        s.close()
+        user_cache.get_known_user_cache().clear()
+
+
+def test_savepoint_release_does_not_cache_before_outer_commit(db_engine):
+    user_cache.get_known_user_cache().clear()
+    s = get_sessionmaker()()
+    try:
+        # As in WhitelistMiddleware: upsert inside a savepoint, outer transaction decides
+        with s.begin_nested():
+            user_cache.ensure_user(s, 43)
+        assert user_cache.get_known_user_cache().get(43) is None
+        s.rollback()
+        assert user_cache.get_known_user_cache().get(43) is None
+
+        with s.begin_nested():
+            db_id = user_cache.ensure_user(s, 43)
+        s.commit()
+        assert user_cache.get_known_user_cache().get(43) == db_id
+    finally:
+        s.close()
+        user_cache.get_known_user_cache().clear()